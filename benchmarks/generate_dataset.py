@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from coordinate_map import find_gene_in_genome, read_single_sequence
+from fasta_io import write_fasta_record
+
+REFERENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "static", "reference_genes")
+METADATA_COLUMNS = ["IMS_ID", "DATE_DRAW", "SEQ_TYPE", "SEQ_REASON", "SAMPLE_TYPE", "OWN_FASTA_ID", "RECEIVE_DATE",
+                    "PROCESSING_DATE", "SENDING_LAB_PC", "SEQUENCING_LAB_PC", "GISAID_ACCESSION"]
+# sampling reasons: N (random sampling) and X (unknown) as in the DESH metadata, the rest count as suspect samples
+SEQ_REASONS = ["N", "X", "A", "Y"]
+SEQ_REASON_WEIGHTS = [0.6, 0.2, 0.1, 0.1]
+SAMPLE_TYPES = ["S001", "S002", "X"]
+BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+N = ord("N")
+# standard genetic code, codons in TCAG order
+GENETIC_CODE = "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"
+N_RUN_LENGTH = 100
+HAPLOTYPE_POOL = 10000
+
+
+# translate a nucleotide array codon by codon, codons with other characters than ACGT become X
+def translate(nucleotides):
+    lookup = np.full(256, 4, dtype=np.uint8)
+    for i, base in enumerate(b"TCAG"):
+        lookup[base] = i
+    codons = lookup[nucleotides[:len(nucleotides) - len(nucleotides) % 3]].reshape(-1, 3).astype(np.int64)
+    index = codons[:, 0]*16 + codons[:, 1]*4 + codons[:, 2]
+    index[(codons == 4).any(axis=1)] = 64
+    table = np.frombuffer((GENETIC_CODE + "X").encode(), dtype=np.uint8)
+    return table[index].tobytes().decode()
+
+
+# start (0-based) and end of each gene in the reference genome
+def locate_genes(genome, genes):
+    locations = {}
+    for gene in genes:
+        gene_sequence = read_single_sequence(os.path.join(REFERENCE_DIR, f"{gene}.fas"))
+        start = find_gene_in_genome(gene_sequence, genome)
+        if start < 0:
+            sys.exit(f"Gene {gene} not found in the reference genome")
+        locations[gene] = (start, start + len(gene_sequence) - len(gene_sequence) % 3)
+    return locations
+
+
+# Random genomes derived from the reference: every sequence descends from one of a
+# number of lineage founders and adds its own substitutions, codon insertions and
+# deletions in the genes and runs of N; a fraction of the sequences are exact copies
+# of an earlier haplotype.
+class SyntheticGenomes:
+
+    def __init__(self, reference, gene_locations, mutation_rate, indel_rate, n_content, duplicate_ratio, lineages, rng):
+        self.reference = np.frombuffer(reference.upper().encode(), dtype=np.uint8)
+        self.gene_locations = gene_locations
+        self.mutation_rate = mutation_rate
+        self.indel_rate = indel_rate
+        self.n_content = n_content
+        self.duplicate_ratio = duplicate_ratio
+        self.rng = rng
+        self.founders = [self.substitute(self.reference, 10*mutation_rate) for _ in range(max(1, lineages))]
+        self.pool = []
+        # codons of each gene after which an insertion occurred in any sequence
+        self.insertions = {gene: set() for gene in gene_locations}
+
+    def substitute(self, genome, rate):
+        genome = genome.copy()
+        positions = self.rng.integers(0, len(genome), self.rng.poisson(rate*len(genome)))
+        genome[positions] = self.rng.choice(BASES, len(positions))
+        return genome
+
+    # codon indels inside the genes, as (position, inserted bases or None for a deletion)
+    def indels(self):
+        events = []
+        for gene, (start, end) in self.gene_locations.items():
+            codons = (end - start) // 3
+            for _ in range(self.rng.poisson(self.indel_rate*(end - start))):
+                codon = int(self.rng.integers(1, codons))
+                if self.rng.random() < 0.5:
+                    events.append((start + 3*codon, self.rng.choice(BASES, 3)))
+                    self.insertions[gene].add(codon)
+                else:
+                    events.append((start + 3*codon, None))
+        return sorted(events, key=lambda event: event[0])
+
+    # a new genome and the (start, end) of every gene in it
+    def genome(self):
+        if self.pool and self.rng.random() < self.duplicate_ratio:
+            return self.pool[self.rng.integers(len(self.pool))]
+        genome = self.substitute(self.founders[self.rng.integers(len(self.founders))], self.mutation_rate)
+        for _ in range(int(round(self.n_content*len(genome) / N_RUN_LENGTH))):
+            start = int(self.rng.integers(0, len(genome) - N_RUN_LENGTH))
+            genome[start:start + N_RUN_LENGTH] = N
+        events = self.indels()
+        pieces, previous = [], 0
+        for position, inserted in events:
+            pieces.append(genome[previous:position])
+            if inserted is None:
+                previous = position + 3
+            else:
+                pieces.append(inserted)
+                previous = position
+        pieces.append(genome[previous:])
+        genome = np.concatenate(pieces)
+        locations = {}
+        for gene, (start, end) in self.gene_locations.items():
+            shift = lambda position: sum(3 if inserted is not None else -3 for p, inserted in events if p < position)
+            locations[gene] = (start + shift(start), end + shift(end))
+        haplotype = (genome.tobytes().decode(), locations)
+        if len(self.pool) < HAPLOTYPE_POOL:
+            self.pool.append(haplotype)
+        else:
+            self.pool[self.rng.integers(HAPLOTYPE_POOL)] = haplotype
+        return haplotype
+
+
+# write sequences.fasta and metadata.csv, plus the nucleotide and protein sequences of
+# every gene as extracted by EXTRACT_GENE and the reference protein mapped to the MSA columns
+def generate_dataset(output_dir, sequences, genes, mutation_rate, indel_rate, n_content, duplicate_ratio, lineages, start_date, end_date, seed):
+    rng = np.random.default_rng(seed)
+    genome = read_single_sequence(os.path.join(REFERENCE_DIR, "reference.fas"))
+    gene_locations = locate_genes(genome, genes)
+    generator = SyntheticGenomes(genome, gene_locations, mutation_rate, indel_rate, n_content, duplicate_ratio, lineages, rng)
+    first_day = datetime.date.fromisoformat(start_date)
+    days = (datetime.date.fromisoformat(end_date) - first_day).days + 1
+    os.makedirs(os.path.join(output_dir, "genes"), exist_ok=True)
+    gene_outputs = {gene: (open(os.path.join(output_dir, "genes", f"{gene}_nuc.fas"), "w"),
+                           open(os.path.join(output_dir, "genes", f"{gene}_protein.fas"), "w")) for gene in genes}
+    with open(os.path.join(output_dir, "sequences.fasta"), "w") as fasta, open(os.path.join(output_dir, "metadata.csv"), "w", newline="") as metadata:
+        writer = csv.writer(metadata)
+        writer.writerow(METADATA_COLUMNS)
+        for i in range(sequences):
+            sequence, locations = generator.genome()
+            identifier = f"IMS-{10000 + i % 90000}-CVDP-{hashlib.md5(str((seed, i)).encode()).hexdigest().upper()}"
+            write_fasta_record(fasta, identifier, sequence)
+            draw_date = first_day + datetime.timedelta(days=int(rng.integers(days)))
+            receive_date = draw_date + datetime.timedelta(days=int(rng.integers(1, 10)))
+            writer.writerow([identifier, draw_date.isoformat(), "ILLUMINA", rng.choice(SEQ_REASONS, p=SEQ_REASON_WEIGHTS),
+                             rng.choice(SAMPLE_TYPES), hashlib.sha256(sequence.encode()).hexdigest(), receive_date.isoformat(),
+                             receive_date.isoformat(), f"{rng.integers(10000, 99999)}.0", f"{rng.integers(10000, 99999)}.0",
+                             f"hCoV-19/Germany/SYN-{i}/{draw_date.year}"])
+            for gene, (start, end) in locations.items():
+                nuc_output, protein_output = gene_outputs[gene]
+                gene_sequence = sequence[start:end]
+                write_fasta_record(nuc_output, identifier, gene_sequence, width=0)
+                write_fasta_record(protein_output, identifier, translate(np.frombuffer(gene_sequence.encode(), dtype=np.uint8)), width=0)
+    for nuc_output, protein_output in gene_outputs.values():
+        nuc_output.close()
+        protein_output.close()
+    # reference protein with a gap column after every codon that received an insertion
+    reference = np.frombuffer(genome.upper().encode(), dtype=np.uint8)
+    for gene, (start, end) in gene_locations.items():
+        protein = translate(reference[start:end]).rstrip("*")
+        mapped = "".join(residue + ("-" if codon + 1 in generator.insertions[gene] else "") for codon, residue in enumerate(protein))
+        with open(os.path.join(output_dir, "genes", f"{gene}_mapped_reference.fas"), "w") as output:
+            write_fasta_record(output, f"reference_{gene}", mapped)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Generate a synthetic SARS-CoV-2 dataset (sequences.fasta, metadata.csv) from the bundled reference genome')
+    arguments.add_argument('-o', '--output_dir', help = 'Output directory', required = True, type = str)
+    arguments.add_argument('-n', '--sequences', help = 'Number of sequences [default: 10000]', default = 10000, type = int)
+    arguments.add_argument('-g', '--genes', help = 'Genes to write the extracted nucleotide and protein sequences of [default: S]', default = ["S"], type = str, nargs='+')
+    arguments.add_argument('-m', '--mutation_rate', help = 'Substitutions per site and sequence, lineage founders get ten times as many [default: 0.0005]', default = 0.0005, type = float)
+    arguments.add_argument('-i', '--indel_rate', help = 'Codon insertions and deletions per gene site and sequence [default: 0.00002]', default = 0.00002, type = float)
+    arguments.add_argument('-N', '--n_content', help = 'Fraction of every genome masked by runs of N [default: 0.01]', default = 0.01, type = float)
+    arguments.add_argument('-d', '--duplicate_ratio', help = 'Fraction of sequences that are exact copies of an earlier haplotype [default: 0.5]', default = 0.5, type = float)
+    arguments.add_argument('-l', '--lineages', help = 'Number of lineage founders the sequences descend from [default: 50]', default = 50, type = int)
+    arguments.add_argument('-s', '--start_date', help = 'First sampling date (DATE_DRAW) [default: 2021-01-01]', default = "2021-01-01", type = str)
+    arguments.add_argument('-e', '--end_date', help = 'Last sampling date (DATE_DRAW) [default: 2022-12-31]', default = "2022-12-31", type = str)
+    arguments.add_argument('-r', '--seed', help = 'Seed of the random number generator [default: 1]', default = 1, type = int)
+    args = arguments.parse_args()
+
+    parameters = {k: v for k, v in vars(args).items() if k != "output_dir"}
+    generate_dataset(args.output_dir, args.sequences, args.genes, args.mutation_rate, args.indel_rate, args.n_content,
+                     args.duplicate_ratio, args.lineages, args.start_date, args.end_date, args.seed)
+    with open(os.path.join(args.output_dir, "dataset.json"), "w") as output:
+        json.dump(parameters, output, indent=4)
+    print(f"Generated {args.sequences} sequences in {args.output_dir}")
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# Small helper that runs one stage and writes its resource usage (JSON) to a file:
+#   measure_stage.py <usage.json> <program> [arguments...]
+# A child inherits the resident memory of the process it is forked from in its
+# ru_maxrss, so the stages are started from this process, which only imports
+# modules that are loaded at interpreter startup anyway, instead of from the
+# benchmark runner with its datasets and libraries.
+import json
+import os
+import sys
+import time
+
+if __name__ == "__main__":
+    usage_path, program = sys.argv[1], sys.argv[2:]
+    start = time.perf_counter()
+    pid = os.posix_spawn(program[0], program, os.environ)
+    _, status, usage = os.wait4(pid, 0)
+    wall = time.perf_counter() - start
+    with open(usage_path, "w") as output:
+        json.dump({"returncode": os.waitstatus_to_exitcode(status), "wall_seconds": wall, "user_seconds": usage.ru_utime,
+                   "system_seconds": usage.ru_stime, "max_rss": usage.ru_maxrss}, output)
\ No newline at end of file
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import numpy as np
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS, "..")
+MEASURE_STAGE = os.path.join(BENCHMARKS, "measure_stage.py")
+SCRIPTS = os.path.join(ROOT, "scripts")
+STATIC = os.path.join(ROOT, "data", "static")
+sys.path.insert(0, SCRIPTS)
+from fasta_io import iter_fasta
+
+FEL_HEADERS = ["alpha", "beta", "alpha=beta", "LRT", "p-value", "Total branch length", "p-asmp"]
+# results of a real pipeline run on the synthetic data that summarize_selection_analysis.py needs (--hyphy_results)
+HYPHY_RESULTS = ["slac_results.json", "fel_results.json", "meme_results.json", "nuc_msa_filtered.fas", "nuc_msa_variants_duplicates.json"]
+
+
+# run a Python stage and measure its wall time, CPU time and peak RSS; the stage is
+# started by measure_stage.py, so its peak RSS does not include the memory of this process
+def run_stage(name, arguments, work_dir, log_dir):
+    log_path = os.path.join(log_dir, f"{name}.log")
+    usage_path = os.path.join(log_dir, f"{name}.usage.json")
+    with open(log_path, "w") as log:
+        subprocess.run([sys.executable, MEASURE_STAGE, usage_path, sys.executable] + arguments, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT, check=True)
+    with open(usage_path) as handle:
+        usage = json.load(handle)
+    returncode = usage["returncode"]
+    return {"stage": name, "status": "ok" if returncode == 0 else "failed", "returncode": returncode,
+            "wall_seconds": round(usage["wall_seconds"], 3), "user_seconds": round(usage["user_seconds"], 3), "system_seconds": round(usage["system_seconds"], 3),
+            # ru_maxrss is in KB on Linux and in bytes on macOS
+            "max_rss_mb": round(usage["max_rss"] / (1024**2 if sys.platform == "darwin" else 1024), 1), "log": log_path}
+
+
+def skipped(name, reason):
+    return {"stage": name, "status": "skipped", "reason": reason}
+
+
+# FEL result with random rates for every MSA column of the mapped reference, the
+# input of visualize_results.py when no real result is given
+def write_synthetic_fel(mapped_reference, output, rng):
+    with open(mapped_reference) as handle:
+        columns = sum(len(sequence) for _, sequence in iter_fasta(handle))
+    alpha = rng.gamma(0.5, 1, columns)
+    beta = rng.gamma(0.5, 1, columns)
+    p_value = np.where(rng.random(columns) < 0.3, 1, rng.random(columns))
+    rows = np.column_stack([alpha, beta, (alpha + beta) / 2, rng.chisquare(1, columns), p_value, rng.gamma(2, 0.01, columns), p_value])
+    with open(output, "w") as handle:
+        json.dump({"MLE": {"headers": [[h, h] for h in FEL_HEADERS], "content": {"0": rows.tolist()}}}, handle)
+
+
+# sequence database in the format of summarize_selection_analysis.py (collection date and location per sequence)
+def write_database(metadata_path, output):
+    import pandas as pd
+    metadata = pd.read_csv(metadata_path, usecols=["IMS_ID", "DATE_DRAW"])
+    database = {identifier: {"collected": date.replace("-", ""), "location": {"country": "Germany", "subregion": "Europe"}}
+                for identifier, date in zip(metadata["IMS_ID"], metadata["DATE_DRAW"])}
+    with open(output, "w") as handle:
+        json.dump(database, handle)
+
+
+# run every Python stage of the pipeline on one synthetic dataset, each stage reads the
+# outputs of the previous ones; stages that need HyPhy results are only run with hyphy_results
+def run_stages(data_dir, log_dir, gene, start_date, end_date, hyphy_results, rng):
+    work_dir = os.path.join(data_dir, "stages")
+    os.makedirs(work_dir, exist_ok=True)
+    os.makedirs(log_dir, exist_ok=True)
+    genes_dir = os.path.join(data_dir, "genes")
+    script = lambda name: os.path.join(SCRIPTS, name)
+    results = []
+
+    results.append(run_stage("create_data_subset", [script("create_data_subset.py"), "--csv", os.path.join(data_dir, "metadata.csv"),
+        "--fasta", os.path.join(data_dir, "sequences.fasta"), "--start_date", start_date, "--end_date", end_date, "--no-separate"], work_dir, log_dir))
+
+    results.append(run_stage("extract_gene_windows", [script("extract_gene_windows.py"), "--input", os.path.join(data_dir, "sequences.fasta"),
+        "--intervals", os.path.join(STATIC, "padded_gene_intervals.json"), "--genes", gene], work_dir, log_dir))
+
+    results.append(run_stage("compress_duplicates", [script("compress_duplicates.py"),
+        "--protein-input", os.path.join(genes_dir, f"{gene}_protein.fas"), "--nuc-input", os.path.join(genes_dir, f"{gene}_nuc.fas"),
+        "--protein-output", f"{gene}_protein_compressed.fas", "--nuc-output", f"{gene}_nuc_compressed.fas",
+        "--protein-duplicates", f"{gene}_protein_duplicates.dups", "--nuc-duplicates", f"{gene}_nuc_duplicates.dups"], work_dir, log_dir))
+
+    # the nucleotide duplicates of compress_duplicates.py stand in for the post-MSA duplicates of CREATE_NUC_MSA
+    results.append(run_stage("merge_duplicates", [script("merge_duplicates.py"),
+        "--protein-duplicates", f"{gene}_protein_duplicates.dups", "--nuc-duplicates", f"{gene}_nuc_duplicates.dups",
+        "--output", f"{gene}_nuc_msa_merged_duplicates.dups", "--msa", f"{gene}_nuc_compressed.fas",
+        "--msa-output", f"{gene}_nuc_msa_merged.fas", "--map", f"{gene}_nuc_msa_name_map.json"], work_dir, log_dir))
+
+    results.append(run_stage("create_position_map_table", [script("create_position_map_table.py"),
+        "--ref_from_msa", os.path.join(genes_dir, f"{gene}_mapped_reference.fas"), "--pos_map_table", f"{gene}_position_map.tsv",
+        "--coordinate_map", f"{gene}_coordinate_map.npz", "--gene_reference", os.path.join(STATIC, "reference_genes", f"{gene}.fas"),
+        "--genome", os.path.join(STATIC, "reference_genes", "reference.fas")], work_dir, log_dir))
+
+    fel = os.path.join(hyphy_results, f"{gene}_fel_results.json") if hyphy_results else os.path.join(work_dir, f"{gene}_fel_results.json")
+    if not hyphy_results:
+        write_synthetic_fel(os.path.join(genes_dir, f"{gene}_mapped_reference.fas"), fel, rng)
+    results.append(run_stage("visualize_results", [script("visualize_results.py"), "--gene", gene, "--fel", fel,
+        "--position_map", f"{gene}_position_map.tsv"], work_dir, log_dir))
+
+    missing = [name for name in HYPHY_RESULTS if not hyphy_results or not os.path.exists(os.path.join(hyphy_results, f"{gene}_{name}"))]
+    if missing:
+        results.append(skipped("summarize_selection_analysis", f"needs the HyPhy results of a pipeline run (--hyphy_results): {', '.join(missing)}"))
+    else:
+        result = lambda name: os.path.join(hyphy_results, f"{gene}_{name}")
+        write_database(os.path.join(data_dir, "metadata.csv"), os.path.join(work_dir, "database.json"))
+        results.append(run_stage("summarize_selection_analysis", [script("summarize_selection_analysis.py"), "--output", f"{gene}.json",
+            "--slac", result("slac_results.json"), "--fel", result("fel_results.json"), "--meme", result("meme_results.json"),
+            "--coordinates", result("nuc_msa_filtered.fas"), "--coordinate-map", f"{gene}_coordinate_map.npz",
+            "--database", "database.json", "--duplicates", result("nuc_msa_variants_duplicates.json")], work_dir, log_dir))
+    return results
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+# wall time and peak RSS of every stage relative to an earlier results file
+def compare_results(baseline, current):
+    index = {(run["sequences"], stage["stage"]): stage for run in baseline["runs"] for stage in run["stages"] if stage["status"] == "ok"}
+    print(f"{'sequences':>10} {'stage':<30} {'wall':>10} {'ratio':>7} {'RSS (MB)':>10} {'ratio':>7}")
+    for run in current["runs"]:
+        for stage in run["stages"]:
+            old = index.get((run["sequences"], stage["stage"]))
+            if stage["status"] != "ok" or old is None:
+                continue
+            print(f"{run['sequences']:>10} {stage['stage']:<30} {stage['wall_seconds']:>10.2f} {stage['wall_seconds'] / max(old['wall_seconds'], 1e-3):>7.2f}"
+                  f" {stage['max_rss_mb']:>10.1f} {stage['max_rss_mb'] / max(old['max_rss_mb'], 1e-3):>7.2f}")
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Time and memory-profile the Python stages of the pipeline on synthetic datasets of increasing size')
+    arguments.add_argument('-n', '--sizes', help = 'Numbers of sequences to benchmark [default: 10000 100000 1000000]', default = [10000, 100000, 1000000], type = int, nargs='+')
+    arguments.add_argument('-g', '--gene', help = 'Gene the per-gene stages are run for [default: S]', default = "S", type = str)
+    arguments.add_argument('-w', '--work_dir', help = 'Directory for the datasets, stage outputs and stage logs [default: benchmark_work]', default = "benchmark_work", type = str)
+    arguments.add_argument('-o', '--output', help = 'Results file (JSON) [default: benchmark_results.json]', default = "benchmark_results.json", type = str)
+    arguments.add_argument('-k', '--keep', help = 'Keep the datasets and stage outputs after each size', action = 'store_true')
+    arguments.add_argument('-H', '--hyphy_results', help = 'Directory with <gene>_slac_results.json, <gene>_fel_results.json, <gene>_meme_results.json, <gene>_nuc_msa_filtered.fas and <gene>_nuc_msa_variants_duplicates.json of a pipeline run; summarize_selection_analysis.py is skipped without them', required = False, type = str)
+    arguments.add_argument('-c', '--compare', help = 'Print the wall time and peak RSS relative to this earlier results file', required = False, type = argparse.FileType('r'))
+    arguments.add_argument('-m', '--mutation_rate', help = 'Substitutions per site and sequence [default: 0.0005]', default = 0.0005, type = float)
+    arguments.add_argument('-i', '--indel_rate', help = 'Codon insertions and deletions per gene site and sequence [default: 0.00002]', default = 0.00002, type = float)
+    arguments.add_argument('-N', '--n_content', help = 'Fraction of every genome masked by runs of N [default: 0.01]', default = 0.01, type = float)
+    arguments.add_argument('-d', '--duplicate_ratio', help = 'Fraction of sequences that are exact copies of an earlier haplotype [default: 0.5]', default = 0.5, type = float)
+    arguments.add_argument('-l', '--lineages', help = 'Number of lineage founders [default: 50]', default = 50, type = int)
+    arguments.add_argument('-r', '--seed', help = 'Seed of the random number generator [default: 1]', default = 1, type = int)
+    args = arguments.parse_args()
+
+    start_date, end_date = "2021-01-01", "2022-12-31"
+    generator = {"mutation_rate": args.mutation_rate, "indel_rate": args.indel_rate, "n_content": args.n_content,
+                 "duplicate_ratio": args.duplicate_ratio, "lineages": args.lineages, "seed": args.seed}
+    commit, dirty = git_commit()
+    results = {"commit": commit, "dirty": dirty, "date": datetime.datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+               "gene": args.gene, "generator": generator, "runs": []}
+
+    for size in args.sizes:
+        data_dir = os.path.join(args.work_dir, str(size))
+        start = time.perf_counter()
+        # generated in a subprocess, so the memory of the generator is not held by this process
+        subprocess.run([sys.executable, os.path.join(BENCHMARKS, "generate_dataset.py"), "--output_dir", data_dir, "--sequences", str(size),
+                        "--genes", args.gene, "--start_date", start_date, "--end_date", end_date] +
+                       [f"--{key}={value}" for key, value in generator.items()], stdout=subprocess.DEVNULL, check=True)
+        run = {"sequences": size, "generate_seconds": round(time.perf_counter() - start, 3),
+               "input_bytes": os.path.getsize(os.path.join(data_dir, "sequences.fasta"))}
+        run["stages"] = run_stages(os.path.abspath(data_dir), os.path.abspath(os.path.join(args.work_dir, "logs", str(size))), args.gene, start_date, end_date,
+                                   os.path.abspath(args.hyphy_results) if args.hyphy_results else None, np.random.default_rng(args.seed))
+        results["runs"].append(run)
+        for stage in run["stages"]:
+            if stage["status"] == "skipped":
+                print(f"{size:>10} {stage['stage']:<30} skipped: {stage['reason']}")
+            else:
+                print(f"{size:>10} {stage['stage']:<30} {stage['status']:<7} {stage['wall_seconds']:>10.2f} s {stage['max_rss_mb']:>10.1f} MB")
+        if not args.keep:
+            shutil.rmtree(data_dir)
+        # written after every size, so the smaller sizes are kept if a larger one is interrupted
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=4)
+
+    if args.compare:
+        compare_results(json.load(args.compare), results)
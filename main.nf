@@ -29,16 +29,15 @@ if (!params.data_dir){
   exit 1, "No data directory specified. Please provide a folder containing a file named sequences.fasta and metadata.csv using the --data_dir argument!"
 }
 data_dir = params.data_dir.replaceAll("/\\z", "") // remove trailing slash if it exist
-sequences_file = new File("$data_dir/sequences.fasta")
-metadata_file = new File("$data_dir/metadata.csv")
-if (!sequences_file.exists() || !metadata_file.exists()) {
-  exit 1, "The provided data directory $params.data_dir must contain a file called sequences.fasta and a file called metadata.csv!"
+sequences_file = find_input_file(data_dir, "sequences.fasta")
+metadata_file = find_input_file(data_dir, "metadata.csv")
+if (!sequences_file || !metadata_file) {
+  exit 1, "The provided data directory $params.data_dir must contain a file called sequences.fasta and a file called metadata.csv (optionally compressed as .gz, .bgz or .zst)!"
 } else {
-  sequences_ch = Channel.value("$projectDir/$data_dir/sequences.fasta")
-  metadata_ch = Channel.value("$projectDir/$data_dir/metadata.csv")
+  sequences_ch = Channel.value("$projectDir/$data_dir/${sequences_file.name}")
+  metadata_ch = Channel.value("$projectDir/$data_dir/${metadata_file.name}")
 }
 // TODO Add a check for required columns in metadata
-// TODO Add the possibility to use compressed input files (e.g. sequences.fasta.gz)
 // --gene_list
 gene_file = new File(params.gene_list)
 if (!gene_file.exists()){
@@ -53,6 +52,7 @@ if (!trim_file.exists()){
   exit 1, "File $params.gene_trim_intervals provided for --gene_trim_intervals does not exist."
 } else {
   trim_intervals = get_gene_trim_intervals(trim_file, genes)
+  gene_trim_intervals_ch = Channel.value("$projectDir/$params.gene_trim_intervals")
   trim_from_ch = Channel.from(trim_intervals*.get(0))
   trim_to_ch = Channel.from(trim_intervals*.get(1))
   n_frac_ch = Channel.from(trim_intervals*.get(2))
@@ -72,25 +72,59 @@ if (!sites_file.exists()){
   sites = get_genes_from_file(sites_file)
   single_sites_ch = Channel.from(sites)
 }
+// --state_dir
+if (params.state_dir) {
+  state_dir = "$projectDir/" + params.state_dir.replaceAll("/\\z", "")
+  incremental = new File("$state_dir/sequence_ids.txt").exists()
+  // the stored files are process inputs, so they are staged and part of the task hash
+  state_ids_ch = incremental ? Channel.value(file("$state_dir/sequence_ids.txt")) : Channel.value([])
+  stored_clusters_ch = Channel.from(genes).map { gene -> tuple(gene,
+    file("$state_dir/$gene/${gene}_protein_compressed.fas"), file("$state_dir/$gene/${gene}_nuc_compressed.fas"),
+    file("$state_dir/$gene/${gene}_protein_duplicates.dups"), file("$state_dir/$gene/${gene}_nuc_duplicates.dups")) }
+  stored_msa_ch = Channel.from(genes).map { gene -> tuple(gene,
+    file("$state_dir/$gene/${gene}_protein_msa.fas"), file("$state_dir/$gene/${gene}_mapped_reference.fas")) }
+} else {
+  state_dir = null
+  incremental = false
+}
+// --resource_dir
+resource_dir = "$projectDir/" + params.resource_dir.replaceAll("/\\z", "")
+resource_history = "$resource_dir/resource_history.tsv"
+// staged into MEASURE_ALIGNMENT, so the predictions are redone when the history changed
+resource_history_ch = new File(resource_history).exists() ? Channel.value(file(resource_history)) : Channel.value([])
 
 /**************************
 * PROCESSES
 **************************/
+include { SELECT_NEW_SEQUENCES } from "./processes/select_new_sequences.nf"
+include { EXTRACT_GENE_WINDOWS } from "./processes/extract_gene_windows.nf"
 include { EXTRACT_GENE } from "./processes/extract_gene.nf"
 include { COMPRESS_DUPLICATES } from "./processes/compress_duplicates.nf"
+include { UPDATE_CLUSTERS } from "./processes/update_clusters.nf"
 include { CREATE_PROTEIN_MSA } from './processes/create_protein_msa.nf'
+include { ADD_TO_PROTEIN_MSA } from "./processes/add_to_protein_msa.nf"
 include { CREATE_NUC_MSA } from "./processes/create_nuc_msa.nf"
 include { MERGE_DUPLICATES } from "./processes/merge_duplicates.nf"
+include { SAVE_STATE } from "./processes/save_state.nf"
+include { SAVE_SEQUENCE_IDS } from "./processes/save_sequence_ids.nf"
 include { FILTER_NUC_MSA } from "./processes/filter_nuc_msa.nf"
+include { MEASURE_ALIGNMENT } from "./processes/measure_alignment.nf"
 include { BUILD_TREE } from "./processes/build_tree.nf"
+include { FIT_GLOBAL_MODEL } from "./processes/fit_global_model.nf"
 include { SLAC_ANALYSIS } from "./processes/slac_analysis.nf"
 include { FEL_ANALYSIS } from "./processes/fel_analysis.nf"
 include { MEME_ANALYSIS } from "./processes/meme_analysis.nf"
+include { SPLIT_CODON_ALIGNMENT } from "./processes/split_codon_alignment.nf"
+include { SITE_BLOCK_ANALYSIS as FEL_BLOCK_ANALYSIS; SITE_BLOCK_ANALYSIS as MEME_BLOCK_ANALYSIS } from "./processes/site_block_analysis.nf"
+include { MERGE_SITE_BLOCKS as MERGE_FEL_BLOCKS; MERGE_SITE_BLOCKS as MERGE_MEME_BLOCKS } from "./processes/merge_site_blocks.nf"
 include { FUBAR_ANALYSIS } from "./processes/fubar_analysis.nf"
 include { PRIME_ANALYSIS } from "./processes/prime_analysis.nf"
-include { GET_POSITIONS_UNDER_PS_PER_GENE } from "./processes/get_positions_under_ps_per_gene.nf"
+include { CONVERT_RESULTS as CONVERT_SLAC_RESULTS; CONVERT_RESULTS as CONVERT_FEL_RESULTS; CONVERT_RESULTS as CONVERT_MEME_RESULTS; CONVERT_RESULTS as CONVERT_FUBAR_RESULTS } from "./processes/convert_results.nf"
+include { SELECT_SITES_UNDER_PS } from "./processes/select_sites_under_ps.nf"
 include { VISUALIZE_PS_GENOMEWIDE } from"./processes/visualize_ps_genomewide.nf"
 include { VISUALIZE_RESULTS } from "./processes/visualize_results.nf"
+include { BUILD_RESULTS_SITE } from "./processes/build_results_site.nf"
+include { COUNT_RESIDUES } from "./processes/count_residues.nf"
 include { TEMPORAL_EVOLUTION_PLOT } from "./processes/temporal_evolution_plot.nf"
 include { PIPELINE_REPORT } from "./processes/pipeline_report.nf"
 include { EXTRACT_EVOLUTIONARY_ANNOTATION } from "./processes/extract_evolutionary_annotation.nf"
@@ -102,7 +136,18 @@ include { SUMMARIZE_SELECTION_ANALYSIS } from "./processes/summarize_selection_a
 * MAIN WORKFLOW 
 **************************/
 workflow {
-  EXTRACT_GENE(sequences_ch, metadata_ch, genes_ch, trim_from_ch, trim_to_ch, n_frac_ch)
+  // in incremental mode only the sequences that are not part of the stored state are extracted and compressed
+  if (state_dir) {
+    SELECT_NEW_SEQUENCES(sequences_ch, state_ids_ch, incremental)
+    input_sequences_ch = SELECT_NEW_SEQUENCES.out.new_sequences_ch
+  } else {
+    input_sequences_ch = sequences_ch
+  }
+
+  EXTRACT_GENE_WINDOWS(input_sequences_ch, Channel.value(genes), gene_trim_intervals_ch)
+  gene_windows_ch = EXTRACT_GENE_WINDOWS.out.gene_windows_ch.collect()
+
+  EXTRACT_GENE(gene_windows_ch, metadata_ch, genes_ch, trim_from_ch, trim_to_ch, n_frac_ch)
   protein_seqs_ch = EXTRACT_GENE.out.protein_seqs_ch
   nuc_seqs_ch = EXTRACT_GENE.out.nuc_seqs_ch
   copies_ch = EXTRACT_GENE.out.copies_ch
@@ -112,10 +157,28 @@ workflow {
   nuc_seqs_compressed_ch = COMPRESS_DUPLICATES.out.nuc_seqs_compressed_ch
   protein_duplicates_ch = COMPRESS_DUPLICATES.out.protein_duplicates_ch
   nuc_duplicates_ch = COMPRESS_DUPLICATES.out.nuc_duplicates_ch
-
-  CREATE_PROTEIN_MSA(genes_ch, protein_seqs_compressed_ch)
-  protein_msa_ch = CREATE_PROTEIN_MSA.out.protein_msa_ch
-  position_map_table_ch = CREATE_PROTEIN_MSA.out.position_map_table
+  clusters_state_ch = COMPRESS_DUPLICATES.out.clusters_state_ch
+
+  if (incremental) {
+    UPDATE_CLUSTERS(clusters_state_ch.join(stored_clusters_ch))
+    protein_seqs_compressed_ch = UPDATE_CLUSTERS.out.protein_seqs_compressed_ch
+    nuc_seqs_compressed_ch = UPDATE_CLUSTERS.out.nuc_seqs_compressed_ch
+    protein_duplicates_ch = UPDATE_CLUSTERS.out.protein_duplicates_ch
+    nuc_duplicates_ch = UPDATE_CLUSTERS.out.nuc_duplicates_ch
+    clusters_state_ch = UPDATE_CLUSTERS.out.clusters_state_ch
+    // the extracted nucleotide sequences only cover the new sequences, the unique haplotypes cover all of them
+    nuc_seqs_ch = nuc_seqs_compressed_ch
+
+    ADD_TO_PROTEIN_MSA(UPDATE_CLUSTERS.out.protein_seqs_added_ch.join(stored_msa_ch))
+    protein_msa_out = ADD_TO_PROTEIN_MSA.out
+  } else {
+    CREATE_PROTEIN_MSA(genes_ch, protein_seqs_compressed_ch)
+    protein_msa_out = CREATE_PROTEIN_MSA.out
+  }
+  protein_msa_ch = protein_msa_out.protein_msa_ch
+  gene_coordinate_map_ch = protein_msa_out.gene_coordinate_map_ch
+  gene_position_map_ch = protein_msa_out.gene_position_map_ch
+  mapped_reference_ch = protein_msa_out.mapped_reference_ch
 
   CREATE_NUC_MSA(genes_ch, protein_msa_ch, nuc_seqs_ch)
   nuc_msa_compressed_ch = CREATE_NUC_MSA.out.nuc_msa_compressed_ch
@@ -125,46 +188,145 @@ workflow {
   nuc_msa_merged_ch = MERGE_DUPLICATES.out.nuc_msa_merged_ch
   nuc_msa_merged_duplicates_ch = MERGE_DUPLICATES.out.nuc_msa_merged_duplicates_ch
 
+  if (state_dir) {
+    // the files of a gene are joined on its name instead of being paired by their order
+    SAVE_STATE(clusters_state_ch.join(protein_msa_out.msa_state_ch))
+    SAVE_SEQUENCE_IDS(SELECT_NEW_SEQUENCES.out.sequence_ids_ch, SAVE_STATE.out.state_ch.collect())
+  }
+
+  // residues of every MSA column per collection date, the temporal plots of any site are created from them;
+  // the MSA, duplicates and coordinate map of a gene are joined on the gene
+  residue_inputs_ch = protein_msa_out.msa_state_ch.map { gene, msa, mapped_reference -> [gene, msa] }
+    .join(clusters_state_ch.map { gene, protein_compressed, nuc_compressed, protein_dups, nuc_dups -> [gene, protein_dups] })
+    .join(gene_coordinate_map_ch)
+  COUNT_RESIDUES(residue_inputs_ch, metadata_ch, params.residue_counts_bin)
+  residue_counts_ch = COUNT_RESIDUES.out.residue_counts_ch
+
   FILTER_NUC_MSA(genes_ch, nuc_msa_merged_ch, nuc_msa_merged_duplicates_ch)
   nuc_msa_filtered_ch = FILTER_NUC_MSA.out.nuc_msa_filtered_ch
   nuc_msa_variants_duplicates_ch = FILTER_NUC_MSA.out.nuc_msa_variants_duplicates_ch
 
-  BUILD_TREE(genes_ch, nuc_msa_filtered_ch)
+  // CPU, memory and time requests of the tree and HyPhy processes, predicted from the alignment and the resource history
+  // the requests are joined on the gene they were predicted for
+  MEASURE_ALIGNMENT(FILTER_NUC_MSA.out.gene_msa_filtered_ch, resource_history_ch, params.site_block_size)
+  resources_ch = MEASURE_ALIGNMENT.out.resources_ch.map { def measured = new JsonSlurper().parse(it.toFile()); [measured.gene, measured.requests] }
+
+  // the alignment, tree and global fit of a gene travel together as one tuple from here on
+  BUILD_TREE(FILTER_NUC_MSA.out.gene_msa_filtered_ch.join(resources_ch))
   newick_tree_ch = BUILD_TREE.out.newick_tree_ch
 
-  SLAC_ANALYSIS(genes_ch, nuc_msa_filtered_ch, newick_tree_ch)
-  slac_results_ch = SLAC_ANALYSIS.out.slac_results_ch
+  FIT_GLOBAL_MODEL(newick_tree_ch.join(resources_ch))
+  global_fit_ch = FIT_GLOBAL_MODEL.out.global_fit_ch
 
-  FEL_ANALYSIS(genes_ch, nuc_msa_filtered_ch, newick_tree_ch)
-  fel_results_ch = FEL_ANALYSIS.out.fel_results_ch
+  SLAC_ANALYSIS(global_fit_ch.join(resources_ch))
+  slac_results_ch = SLAC_ANALYSIS.out.slac_results_ch
 
-  MEME_ANALYSIS(genes_ch, nuc_msa_filtered_ch, newick_tree_ch)
-  meme_results_ch = MEME_ANALYSIS.out.meme_results_ch
+  // FEL and MEME are site-independent, so with --site_block_size they run per block of sites and are merged afterwards
+  if (params.site_block_size) {
+    SPLIT_CODON_ALIGNMENT(global_fit_ch.join(resources_ch), params.site_block_size)
+    // the key carries the number of blocks of the gene, so groupTuple emits a gene as soon as all of its blocks are done
+    site_blocks_ch = SPLIT_CODON_ALIGNMENT.out.site_blocks_ch.flatMap { gene, tree, fit, resources, blocks ->
+      def gene_blocks = blocks instanceof List ? blocks : [blocks]
+      gene_blocks.collect { [groupKey(gene, gene_blocks.size()), it, tree, fit, resources] }
+    }
+
+    FEL_BLOCK_ANALYSIS("fel", "--branches Internal", site_blocks_ch)
+    MERGE_FEL_BLOCKS("fel", FEL_BLOCK_ANALYSIS.out.block_results_ch.groupTuple())
+    // back from the group key to the gene name, so the merged results join with the other channels of the gene
+    fel_results_ch = MERGE_FEL_BLOCKS.out.results_ch.map { gene, results -> [gene.toString(), results] }
+
+    MEME_BLOCK_ANALYSIS("meme", "--branches Internal", site_blocks_ch)
+    MERGE_MEME_BLOCKS("meme", MEME_BLOCK_ANALYSIS.out.block_results_ch.groupTuple())
+    meme_results_ch = MERGE_MEME_BLOCKS.out.results_ch.map { gene, results -> [gene.toString(), results] }
+  } else {
+    FEL_ANALYSIS(global_fit_ch.join(resources_ch))
+    fel_results_ch = FEL_ANALYSIS.out.fel_results_ch
+
+    MEME_ANALYSIS(global_fit_ch.join(resources_ch))
+    meme_results_ch = MEME_ANALYSIS.out.meme_results_ch
+  }
 
-  FUBAR_ANALYSIS(genes_ch, nuc_msa_filtered_ch, newick_tree_ch)
+  FUBAR_ANALYSIS(global_fit_ch.join(resources_ch))
   fubar_results_ch = FUBAR_ANALYSIS.out.fubar_results_ch
 
   // PRIME_ANALYSIS(genes_ch, nuc_msa_filtered_ch, newick_tree_ch)
   // prime_results_ch = PRIME_ANALYSIS.out.prime_results_ch
 
-  GET_POSITIONS_UNDER_PS_PER_GENE(genes_ch, fel_results_ch)
-  fel_sites_under_ps_ch = GET_POSITIONS_UNDER_PS_PER_GENE.out.fel_sites_under_ps
-  total_sites_ch = GET_POSITIONS_UNDER_PS_PER_GENE.out.total_sites
-
-  VISUALIZE_PS_GENOMEWIDE(fel_sites_under_ps_ch.collect(), total_sites_ch.collect(), gene_lengths_ch)
+  // columnar results stores (site, branch and fit tables), read column by column by the downstream scripts;
+  // the results of a gene are joined with its coordinate map on the gene
+  CONVERT_SLAC_RESULTS("slac", slac_results_ch.join(gene_coordinate_map_ch))
+  slac_store_ch = CONVERT_SLAC_RESULTS.out.results_store_ch
+  CONVERT_FEL_RESULTS("fel", fel_results_ch.join(gene_coordinate_map_ch))
+  fel_store_ch = CONVERT_FEL_RESULTS.out.results_store_ch
+  CONVERT_MEME_RESULTS("meme", meme_results_ch.join(gene_coordinate_map_ch))
+  meme_store_ch = CONVERT_MEME_RESULTS.out.results_store_ch
+  CONVERT_FUBAR_RESULTS("fubar", fubar_results_ch.join(gene_coordinate_map_ch))
+  fubar_store_ch = CONVERT_FUBAR_RESULTS.out.results_store_ch
+
+  // sites under positive selection of all genes and methods in one table
+  SELECT_SITES_UNDER_PS(slac_store_ch.mix(fel_store_ch, meme_store_ch, fubar_store_ch).map { gene, store -> store }.collect())
+  sites_under_ps_ch = SELECT_SITES_UNDER_PS.out.sites_under_ps_ch
+  site_selection_summary_ch = SELECT_SITES_UNDER_PS.out.site_selection_summary_ch
+
+  VISUALIZE_PS_GENOMEWIDE(sites_under_ps_ch, site_selection_summary_ch, gene_lengths_ch)
   genomewide_ps = VISUALIZE_PS_GENOMEWIDE.out.genomewide_ps
 
-  PIPELINE_REPORT(genes_ch, copies_ch, newick_tree_ch, nuc_msa_filtered_ch)
+  VISUALIZE_RESULTS(fel_store_ch.join(gene_position_map_ch), params.results_site as boolean)//, meme_results_ch)
+
+  // one results site for all genes instead of standalone HTML files that each embed plotly.js
+  if (params.results_site) {
+    BUILD_RESULTS_SITE(Channel.value(genes), VISUALIZE_RESULTS.out.site_data_ch.collect())
+  }
 
-  VISUALIZE_RESULTS(genes_ch, fel_results_ch, position_map_table_ch)//, meme_results_ch)
+  // performance metrics of the stages; the trace is added to the report when the run is complete
+  metrics_ch = EXTRACT_GENE_WINDOWS.out.metrics_ch.mix(EXTRACT_GENE.out.metrics_ch, COMPRESS_DUPLICATES.out.metrics_ch, protein_msa_out.metrics_ch,
+    CREATE_NUC_MSA.out.metrics_ch, MERGE_DUPLICATES.out.metrics_ch, FILTER_NUC_MSA.out.metrics_ch, COUNT_RESIDUES.out.metrics_ch,
+    CONVERT_SLAC_RESULTS.out.metrics_ch, CONVERT_FEL_RESULTS.out.metrics_ch, CONVERT_MEME_RESULTS.out.metrics_ch, CONVERT_FUBAR_RESULTS.out.metrics_ch,
+    SELECT_SITES_UNDER_PS.out.metrics_ch, VISUALIZE_PS_GENOMEWIDE.out.metrics_ch, VISUALIZE_RESULTS.out.metrics_ch)
+  if (state_dir) {
+    metrics_ch = metrics_ch.mix(SELECT_NEW_SEQUENCES.out.metrics_ch)
+  }
+  if (incremental) {
+    metrics_ch = metrics_ch.mix(UPDATE_CLUSTERS.out.metrics_ch)
+  }
+  if (params.site_block_size) {
+    metrics_ch = metrics_ch.mix(SPLIT_CODON_ALIGNMENT.out.metrics_ch, MERGE_FEL_BLOCKS.out.metrics_ch, MERGE_MEME_BLOCKS.out.metrics_ch)
+  }
+  if (params.results_site) {
+    metrics_ch = metrics_ch.mix(BUILD_RESULTS_SITE.out.metrics_ch)
+  }
+  PIPELINE_REPORT(Channel.value(genes), copies_ch.collect(), metrics_ch.collect())
 
-  // TEMPORAL_EVOLUTION_PLOT(genes_ch.collect(), single_sites_ch.collect(), protein_msa_ch.collect(), metadata_ch, protein_duplicates_ch.collect())
+  // TEMPORAL_EVOLUTION_PLOT(genes_ch.collect(), single_sites_ch.collect(), residue_counts_ch.collect())
 
   // EXTRACT_EVOLUTIONARY_ANNOTATION(genes_ch, prime_results_ch, nuc_msa_merged_ch)
 
   // SUMMARIZE_SELECTION_ANALYSIS(genes_ch, slac_results_ch, fel_results_ch, meme_results_ch, fubar_results_ch, nuc_msa_filtered_ch, nuc_msa_variants_duplicates_ch)
 }
 
+/**************************
+* COMPLETION
+**************************/
+// add the peak memory and runtime of the tree and HyPhy tasks to the resource history of the cost model,
+// and the slowest stages and the critical path of all tasks of the run to the pipeline report
+workflow.onComplete {
+  def trace_file = new File("$resource_dir/trace.tsv")
+  if (trace_file.exists()) {
+    def record = ["python3", "$projectDir/scripts/resource_model.py", "record", "--trace", trace_file.path,
+                  "--features_dir", "$resource_dir/features", "--history", resource_history].execute()
+    record.waitFor()
+    log.info record.text.trim()
+    def report_file = new File("$resource_dir/performance_report.json")
+    if (report_file.exists()) {
+      def report = (["python3", "$projectDir/scripts/pipeline_report.py", "--genes"] + genes +
+                    ["--report", report_file.path, "--trace", trace_file.path,
+                     "--output_file", "$resource_dir/pipeline_report.txt", "--json", report_file.path]).execute()
+      report.waitFor()
+      log.info report.exitValue() == 0 ? "Added the trace to $resource_dir/pipeline_report.txt" : report.err.text.trim()
+    }
+  }
+}
+
 /**************************
 * DEFAULT MESSAGE
 **************************/
@@ -179,6 +341,10 @@ def default_message() {
     Session ID:             $workflow.sessionId
         --data_dir          $params.data_dir
         --cpus              $params.cpus
+        --state_dir         $params.state_dir
+        --cache_dir         $params.cache_dir
+        --resource_dir      $params.resource_dir
+        --results_site      $params.results_site
     ______________________________________
     """.stripIndent()
 }
@@ -196,6 +362,7 @@ def help_message() {
 
     Mandatory arguments:
     --data_dir                  Path to directory containing the sequences in FASTA format and the metadata in CSV format
+                                (sequences.fasta and metadata.csv, both may be gzip, BGZF or zstd compressed)
 
     Optional arguments:
     --gene_list                 Path to file containing a list of genes and products to be analyzed
@@ -208,6 +375,37 @@ def help_message() {
     --single_sites              Path to file containing a list of single sites to investigate (e.g. S:501).
                                 Note that the respective genes need to be activated in the gene_list.
                                 [default: configs/single_sites.txt]
+    --state_dir                 Path to directory where the unique haplotypes, duplicates and protein MSAs of the run
+                                are stored. If it already contains a previous run, only the new sequences are
+                                extracted, compressed and added to the stored protein MSAs (incremental mode).
+                                [default: not set]
+    --cache_dir                 Path to directory of the persistent result cache shared between runs. Trees and HyPhy
+                                results are reused if the filtered MSA, the tree and the method arguments are unchanged.
+                                [default: not set]
+    --cache_max_size            Maximal size of the result cache in GB, least recently used results are evicted first
+                                [default: 50]
+    --site_block_size           Run FEL and MEME on blocks of this many codons as independent tasks and merge the
+                                results afterwards (0 analyses every gene in a single task)
+                                [default: 0]
+    --resource_dir              Path to directory with the resource history of previous runs. The CPU, memory and time
+                                requests of the tree and HyPhy processes are predicted from it (hpc profile) and the
+                                peak memory and runtime of every run are added to it
+                                [default: data/resources]
+    --fel_pvalue                Maximal p-value of the sites under positive selection (beta > alpha) found by FEL
+                                [default: 0.1]
+    --meme_pvalue               Maximal p-value of the sites under positive selection found by MEME
+                                [default: 0.1]
+    --slac_pvalue               Maximal p-value (P [dN/dS > 1]) of the sites under positive selection found by SLAC
+                                [default: 0.1]
+    --fubar_posterior           Minimal posterior probability (Prob[alpha<beta]) of the sites under positive selection
+                                found by FUBAR
+                                [default: 0.9]
+    --results_site              Path to directory of the results site. The figures of all genes are written into one
+                                site with a single copy of plotly.js, whose index page loads the figures of a gene
+                                when it is selected, instead of one standalone HTML file per figure
+                                [default: not set]
+    --residue_counts_bin        Count the residues of every MSA column per collection day or ISO week (day, week)
+                                [default: day]
 
     Note: Paths of listed folders need to be relative to location of main.nf
 
@@ -218,6 +416,15 @@ def help_message() {
 /**************************
 * FUNCTIONS
 **************************/
+def find_input_file(dir, name){
+  for (extension in ["", ".gz", ".bgz", ".zst"]) {
+    def input_file = new File("$dir/$name$extension")
+    if (input_file.exists()) {
+      return input_file
+    }
+  }
+  return null
+}
 def get_genes_from_file(file){
   genes = file.readLines()
   genes.removeAll{it.startsWith('#')}
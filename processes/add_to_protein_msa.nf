@@ -0,0 +1,46 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Incremental mode: add the new unique protein haplotypes to the
+ * protein MSA stored by the previous run using MAFFT --add with
+ * --keeplength, so the alignment columns (and with them the position
+ * map) stay the same. The outputs match CREATE_PROTEIN_MSA.
+ * The stored MSA is staged into stored/, its name matches the output.
+ */
+
+process ADD_TO_PROTEIN_MSA {
+
+    tag "${gene}"
+    conda "${projectDir}/envs/create_protein_msa.yaml"
+
+    input:
+    tuple val(gene), path(protein_seqs_added_ch), path(stored_protein_msa, stageAs: 'stored/*'), path(stored_mapped_reference, stageAs: 'stored/*')
+
+    output:
+    path "${gene}_protein_msa.fas", emit: protein_msa_ch
+    path "${gene}_position_map_table.tsv", emit: position_map_table
+    path "${gene}_coordinate_map.npz", emit: coordinate_map_ch
+    tuple val(gene), path("${gene}_coordinate_map.npz"), emit: gene_coordinate_map_ch
+    tuple val(gene), path("${gene}_position_map_table.tsv"), emit: gene_position_map_ch
+    path "${gene}_protein_msa_columns.tsv", emit: protein_msa_columns_ch
+    path "${gene}_mapped_reference.fas", emit: mapped_reference_ch
+    path "${gene}_protein_msa_metrics.json", emit: metrics_ch
+    tuple val(gene), path("${gene}_protein_msa.fas"), path("${gene}_mapped_reference.fas"), emit: msa_state_ch
+
+    script:
+    REFERENCE="${projectDir}/data/static/reference_genes/reference.${gene}_protein.fas"
+    GENE_REFERENCE="${projectDir}/data/static/reference_genes/${gene}.fas"
+    GENOME="${projectDir}/data/static/reference_genes/reference.fas"
+    """
+    set -o pipefail
+    cat ${stored_protein_msa} ${stored_mapped_reference} > ${gene}_previous_msa.fas
+    if [ -s ${protein_seqs_added_ch} ]; then
+        mafft --thread ${task.cpus} --keeplength --add ${protein_seqs_added_ch} ${gene}_previous_msa.fas
+    else
+        cat ${gene}_previous_msa.fas
+    fi | \
+    python ${projectDir}/scripts/process_protein_msa.py -i - -r ${REFERENCE} -o ${gene}_protein_msa.fas -s ${gene}_mapped_reference.fas \
+    -p ${gene}_position_map_table.tsv -m ${gene}_coordinate_map.npz -c ${gene}_protein_msa_columns.tsv -n ${GENE_REFERENCE} -g ${GENOME} --metrics ${gene}_protein_msa_metrics.json
+    rm ${gene}_previous_msa.fas
+    """
+}
\ No newline at end of file
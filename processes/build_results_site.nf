@@ -0,0 +1,31 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Combine the figures of all genes into one results site: a single copy of plotly.js,
+ * one data file per gene and an index page that loads the figures of a gene on demand.
+ */
+
+process BUILD_RESULTS_SITE {
+
+    conda "${projectDir}/envs/visualize_results.yaml"
+    publishDir "${projectDir}/${params.results_site}", mode: "copy"
+
+    input:
+    val genes
+    path site_data_ch
+
+    output:
+    path "index.html", emit: results_site_index
+    path "plotly.min.js"
+    path "data"
+    path "build_results_site_metrics.json", emit: metrics_ch
+    
+    script:
+    """
+    python ${projectDir}/scripts/build_results_site.py \
+    --genes ${genes.join(' ')} \
+    --site_data ${site_data_ch} \
+    --output_dir . \
+    --metrics build_results_site_metrics.json
+    """
+}
\ No newline at end of file
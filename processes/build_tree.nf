@@ -2,27 +2,31 @@
 
 /*
  * Build a Newick tree by applying canonical neighbour-joining
- * using the software RapidNJ.
+ * using the software RapidNJ. The tree is emitted together with
+ * its gene and alignment.
  */
 
 process BUILD_TREE {
 
+    tag "${gene}"
     conda "${projectDir}/envs/build_tree.yaml"
 
     input:
-    val gene
-    path nuc_msa_filtered_ch
+    // cpus, memory and time predicted by MEASURE_ALIGNMENT for the gene (see the hpc profile)
+    tuple val(gene), path(nuc_msa_filtered_ch), val(resources)
 
     output:
-    path "${gene}_newick.tree", emit: newick_tree_ch
+    tuple val(gene), path(nuc_msa_filtered_ch, includeInputs: true), path("${gene}_newick.tree"), emit: newick_tree_ch
     
     
     script:
     STO="${gene}_nuc_msa_filtered.sto"
     TREE="${gene}_newick.tree"
+    // the tree is reused from the persistent cache if the alignment is unchanged (--cache_dir)
+    CACHE_DIR = params.cache_dir ? "${projectDir}/${params.cache_dir}" : ""
     """
-    seqmagick convert ${nuc_msa_filtered_ch} ${STO}
-    rapidnj ${STO} -i sth > ${TREE}
-    sed -i "s/'//g" ${TREE}
+    python ${projectDir}/scripts/result_cache.py --cache_dir "${CACHE_DIR}" --max_size ${params.cache_max_size} \\
+    --method rapidnj --args="-i sth" --inputs ${nuc_msa_filtered_ch} --output ${TREE} -- \\
+    bash -c "set -o pipefail; seqmagick convert ${nuc_msa_filtered_ch} ${STO} && rapidnj ${STO} -i sth | tr -d '\\047' > ${TREE}"
     """
 }
\ No newline at end of file
@@ -8,6 +8,7 @@
 
 process COMPRESS_DUPLICATES {
 
+    tag "${gene}"
     conda "${projectDir}/envs/compress_duplicates.yaml"
 
     input:
@@ -18,17 +19,23 @@ process COMPRESS_DUPLICATES {
     output:
     path "${gene}_protein_compressed.fas", emit: protein_seqs_compressed_ch
     path "${gene}_nuc_compressed.fas", emit: nuc_seqs_compressed_ch
-    path "${gene}_protein_duplicates.json", emit: protein_duplicates_ch
-    path "${gene}_nuc_duplicates.json", emit: nuc_duplicates_ch
+    path "${gene}_protein_duplicates.dups", emit: protein_duplicates_ch
+    path "${gene}_nuc_duplicates.dups", emit: nuc_duplicates_ch
+    path "${gene}_compress_duplicates_metrics.json", emit: metrics_ch
+    tuple val(gene), path("${gene}_protein_compressed.fas"), path("${gene}_nuc_compressed.fas"), path("${gene}_protein_duplicates.dups"), path("${gene}_nuc_duplicates.dups"), emit: clusters_state_ch
 
     script:
+    // keep at most half of the task memory as unique sequences before spilling to disk
+    MEMORY_BUDGET = task.memory ? task.memory.toMega().intdiv(2) : 2048
     """
     python ${projectDir}/scripts/compress_duplicates.py \
     --protein-input ${gene_protein_ch} \
     --nuc-input ${gene_nuc_ch} \
     --protein-output ${gene}_protein_compressed.fas \
     --nuc-output ${gene}_nuc_compressed.fas \
-    --protein-duplicates ${gene}_protein_duplicates.json \
-    --nuc-duplicates ${gene}_nuc_duplicates.json
+    --protein-duplicates ${gene}_protein_duplicates.dups \
+    --nuc-duplicates ${gene}_nuc_duplicates.dups \
+    --memory-budget ${MEMORY_BUDGET} \
+    --metrics ${gene}_compress_duplicates_metrics.json
     """
 }
\ No newline at end of file
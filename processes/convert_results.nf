@@ -0,0 +1,29 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Convert the HyPhy results (JSON) of a gene into a columnar results
+ * store (.npz): one row per site with its reference and genome
+ * coordinates, plus the branch and fit tables and the tree.
+ * Included once per method.
+ */
+
+process CONVERT_RESULTS {
+
+    tag "${gene}"
+    conda "${projectDir}/envs/results_store.yaml"
+
+    input:
+    val method
+    // results and coordinate map of the same gene, joined on the gene
+    tuple val(gene), path(results_ch), path(coordinate_map_ch)
+
+    output:
+    tuple val(gene), path("${gene}_${method}_results.npz"), emit: results_store_ch
+    path "${gene}_${method}_results_store_metrics.json", emit: metrics_ch
+
+    script:
+    """
+    python ${projectDir}/scripts/results_store.py --input ${results_ch} --method ${method} --coordinate_map ${coordinate_map_ch} --output ${gene}_${method}_results.npz \
+    --gene ${gene} --metrics ${gene}_${method}_results_store_metrics.json
+    """
+}
\ No newline at end of file
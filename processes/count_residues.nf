@@ -0,0 +1,31 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Count the residues of every protein MSA column per collection date (or ISO week),
+ * weighted by the duplicates, into a sparse site x date x residue count cube keyed
+ * by reference position. Temporal plots and frequency tables of any site are
+ * created from it without reading the MSA and the metadata again.
+ */
+
+process COUNT_RESIDUES {
+
+    tag "${gene}"
+    conda "${projectDir}/envs/residue_counts.yaml"
+
+    input:
+    // protein MSA, protein duplicates and coordinate map of the same gene, joined on the gene
+    tuple val(gene), path(protein_msa_ch), path(protein_duplicates_ch), path(coordinate_map_ch)
+    val metadata_ch
+    val date_bin
+
+    output:
+    path "${gene}_residue_counts.npz", emit: residue_counts_ch
+    path "${gene}_residue_counts_metrics.json", emit: metrics_ch
+    
+    script:
+    """
+    python ${projectDir}/scripts/residue_counts.py --gene ${gene} --msa ${protein_msa_ch} --duplicates ${protein_duplicates_ch} \
+    --metadata ${metadata_ch} --coordinate_map ${coordinate_map_ch} --date_bin ${date_bin} --output ${gene}_residue_counts.npz \
+    --metrics ${gene}_residue_counts_metrics.json
+    """
+}
\ No newline at end of file
@@ -11,6 +11,7 @@
 
 process CREATE_NUC_MSA {
 
+    tag "${gene}"
     conda "${projectDir}/envs/extract_gene.yaml"
 
     input:
@@ -21,10 +22,13 @@ process CREATE_NUC_MSA {
     output:
     path "${gene}_nuc_msa_compressed.fas", emit: nuc_msa_compressed_ch
     path "${gene}_nuc_msa_duplicates.json", emit: nuc_msa_duplicates_ch
+    path "${gene}_nuc_msa_metrics.json", emit: metrics_ch
 
     script:
     POSTMSA="${projectDir}/ressources/adjusted-hyphy-analyses/post-msa.bf"
     """
+    python ${projectDir}/scripts/stage_metrics.py --stage nuc_msa --gene ${gene} --inputs ${nuc_seqs_ch} --outputs ${gene}_nuc_msa_compressed.fas \
+    --metrics ${gene}_nuc_msa_metrics.json -- \
     hyphy ${POSTMSA} --protein-msa ${protein_msa_ch} --nucleotide-sequences ${nuc_seqs_ch} --output ${gene}_nuc_msa_compressed.fas --duplicates ${gene}_nuc_msa_duplicates.json --compress Yes
     sed -i '/^>/! s/[^ACTG-]/N/g' ${gene}_nuc_msa_compressed.fas
     """
@@ -4,11 +4,15 @@
  * Create a codon-aware Multiple Sequence Alignment (MSA) for
  * the compressed protein sequences using MAFFT. Additionally create 
  * a position table where MSA positions are mapped to the respective 
- * reference positions.
+ * reference positions, a coordinate map between MSA columns,
+ * reference codons and genome nucleotides and the residue/gap counts
+ * of every MSA column. The MAFFT output is processed in a single
+ * streaming pass.
  */
 
 process CREATE_PROTEIN_MSA {
 
+    tag "${gene}"
     conda "${projectDir}/envs/create_protein_msa.yaml"
 
     input:
@@ -18,14 +22,23 @@ process CREATE_PROTEIN_MSA {
     output:
     path "${gene}_protein_msa.fas", emit: protein_msa_ch
     path "${gene}_position_map_table.tsv", emit: position_map_table
+    path "${gene}_coordinate_map.npz", emit: coordinate_map_ch
+    tuple val(gene), path("${gene}_coordinate_map.npz"), emit: gene_coordinate_map_ch
+    tuple val(gene), path("${gene}_position_map_table.tsv"), emit: gene_position_map_ch
+    path "${gene}_protein_msa_columns.tsv", emit: protein_msa_columns_ch
+    path "${gene}_mapped_reference.fas", emit: mapped_reference_ch
+    path "${gene}_protein_msa_metrics.json", emit: metrics_ch
+    tuple val(gene), path("${gene}_protein_msa.fas"), path("${gene}_mapped_reference.fas"), emit: msa_state_ch
 
     script:
     REFERENCE="${projectDir}/data/static/reference_genes/reference.${gene}_protein.fas"
+    GENE_REFERENCE="${projectDir}/data/static/reference_genes/${gene}.fas"
+    GENOME="${projectDir}/data/static/reference_genes/reference.fas"
     """
-    mafft --auto --thread ${task.cpus} --add ${protein_seqs_compressed_ch} ${REFERENCE} >| ${gene}_protein_msa.fas.tmp
-    python ${projectDir}/scripts/remove_reference_from_msa.py -i ${gene}_protein_msa.fas.tmp -r ${REFERENCE} -o ${gene}_protein_msa.fas -s ${gene}_mapped_reference.fas
-    python ${projectDir}/scripts/create_position_map_table.py -r ${gene}_mapped_reference.fas -p ${gene}_position_map_table.tsv
-    rm ${gene}_protein_msa.fas.tmp
+    set -o pipefail
+    mafft --auto --thread ${task.cpus} --add ${protein_seqs_compressed_ch} ${REFERENCE} | \
+    python ${projectDir}/scripts/process_protein_msa.py -i - -r ${REFERENCE} -o ${gene}_protein_msa.fas -s ${gene}_mapped_reference.fas \
+    -p ${gene}_position_map_table.tsv -m ${gene}_coordinate_map.npz -c ${gene}_protein_msa_columns.tsv -n ${GENE_REFERENCE} -g ${GENOME} --metrics ${gene}_protein_msa_metrics.json
     """
     // DIE RICHTIGEN NEUEN OUPUTS IN main.NF bearbeiten und testen!!!
 }
\ No newline at end of file
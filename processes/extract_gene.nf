@@ -1,17 +1,18 @@
 #!/usr/bin/env nextflow
 
 /*
- * Extract the appropriate gene segment from input genomes 
- * using codon-aware alignment, filter based on N content 
+ * Extract the appropriate gene segment from the padded gene
+ * windows using codon-aware alignment, filter based on N content 
  * and translate to amino-acids.
  */
 
 process EXTRACT_GENE {
 
+    tag "${gene}"
     conda "${projectDir}/envs/extract_gene.yaml"
 
     input:
-    val sequences_ch
+    path gene_windows_ch
     val metadata_ch
     val gene
     val trim_from
@@ -22,14 +23,18 @@ process EXTRACT_GENE {
     path "${gene}_protein.fas", emit: protein_seqs_ch
     path "${gene}_nuc.fas", emit: nuc_seqs_ch
     path "${gene}_copies.json", emit: copies_ch
+    path "${gene}_extract_gene_metrics.json", emit: metrics_ch
 
     script:
     PREMSA="${projectDir}/ressources/hyphy-analyses/codon-msa/pre-msa.bf"
     REFERENCE="${projectDir}/data/static/reference_genes/${gene}.fas"
     TMP_FILE="${gene}"
+    // the windows already start at trim_from, so only the window length is left to trim
     """
-    cp ${sequences_ch} ${TMP_FILE}
-    HYPHYMPI ${PREMSA} --input ${TMP_FILE} --reference ${REFERENCE} --trim-from ${trim_from} --trim-to ${trim_to} --E 0.01 --N-fraction ${n_frac} --remove-stop-codons Yes
+    ln -s ${gene}_window.fas ${TMP_FILE}
+    python ${projectDir}/scripts/stage_metrics.py --stage extract_gene --gene ${gene} --inputs ${gene}_window.fas --outputs ${gene}_nuc.fas --unique \
+    --metrics ${gene}_extract_gene_metrics.json -- \
+    HYPHYMPI ${PREMSA} --input ${TMP_FILE} --reference ${REFERENCE} --trim-from 0 --trim-to ${trim_to - trim_from} --E 0.01 --N-fraction ${n_frac} --remove-stop-codons Yes
     rm ${TMP_FILE}
     """
-}
\ No newline at end of file
+}
@@ -0,0 +1,32 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Cut the padded window of every selected gene out of the input
+ * genomes in a single pass over the sequences. The input is read
+ * in place (compressed input is decompressed as a stream) and only
+ * the much smaller gene windows are written.
+ */
+
+process EXTRACT_GENE_WINDOWS {
+
+    conda "${projectDir}/envs/extract_gene_windows.yaml"
+
+    input:
+    path sequences_ch
+    val genes
+    path gene_trim_intervals
+
+    output:
+    path "*_window.fas", emit: gene_windows_ch
+    path "extract_gene_windows_metrics.json", emit: metrics_ch
+
+    script:
+    """
+    python ${projectDir}/scripts/extract_gene_windows.py \
+    --input ${sequences_ch} \
+    --threads ${task.cpus} \
+    --intervals ${gene_trim_intervals} \
+    --genes ${genes.join(' ')} \
+    --metrics extract_gene_windows_metrics.json
+    """
+}
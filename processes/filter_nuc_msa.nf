@@ -9,6 +9,7 @@
 
 process FILTER_NUC_MSA {
 
+    tag "${gene}"
     conda "${projectDir}/envs/extract_gene.yaml"
 
     input:
@@ -19,6 +20,8 @@ process FILTER_NUC_MSA {
     output:
     path "${gene}_nuc_msa_filtered.fas", emit: nuc_msa_filtered_ch
     path "${gene}_nuc_msa_variants_duplicates.json", emit: nuc_msa_variants_duplicates_ch
+    path "${gene}_filter_nuc_msa_metrics.json", emit: metrics_ch
+    tuple val(gene), path("${gene}_nuc_msa_filtered.fas"), emit: gene_msa_filtered_ch
     
     script:
     COMPRESSOR="compressor.bf"
@@ -28,6 +31,7 @@ process FILTER_NUC_MSA {
     cp ${projectDir}/scripts/${COMPRESSOR2} .
     hyphy ${COMPRESSOR} --msa ${nuc_msa_merged_ch} --duplicates ${nuc_msa_merged_duplicates_ch} --output ${gene}_nuc_msa_variants.csv --json ${gene}_nuc_msa_variants.json --duplicate-out ${gene}_nuc_msa_variants_duplicates.json
     hyphy ${COMPRESSOR2} --msa ${nuc_msa_merged_ch} --duplicates ${nuc_msa_merged_duplicates_ch} --csv ${gene}_nuc_msa_variants.csv --byseq ${gene}_nuc_msa_variants.json --p 0.95 --output ${gene}_nuc_msa_filtered.fas --json ${gene}_nuc_msa_filtered.json --output-edits ${gene}_nuc_msa_filtered_edits.json
+    python ${projectDir}/scripts/stage_metrics.py --stage filter_nuc_msa --gene ${gene} --inputs ${nuc_msa_merged_ch} --outputs ${gene}_nuc_msa_filtered.fas --unique --metrics ${gene}_filter_nuc_msa_metrics.json
     rm ${COMPRESSOR}
     rm ${COMPRESSOR2}
     """
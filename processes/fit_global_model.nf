@@ -0,0 +1,32 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Fit the nucleotide GTR and the global MG94xREV codon model
+ * once per gene. The saved parameter estimates and branch lengths
+ * are the starting point of SLAC, FEL, MEME and FUBAR, which get
+ * them together with the gene, alignment and tree they belong to.
+ */
+
+process FIT_GLOBAL_MODEL {
+
+    tag "${gene}"
+    conda "${projectDir}/envs/positive_selection_analysis.yaml"
+
+    input:
+    // cpus, memory and time predicted by MEASURE_ALIGNMENT for the gene (see the hpc profile)
+    tuple val(gene), path(nuc_msa_filtered_ch), path(newick_tree_ch), val(resources)
+
+    output:
+    tuple val(gene), path(nuc_msa_filtered_ch, includeInputs: true), path(newick_tree_ch, includeInputs: true), path("${gene}_global_fit.json"), emit: global_fit_ch
+    
+    script:
+    FIT_GLOBAL_MODEL="${projectDir}/ressources/adjusted-hyphy-analyses/fit-global-model.bf"
+    HYPHY_ARGS="--branches All"
+    // the fit is reused from the persistent cache if the alignment and tree are unchanged (--cache_dir)
+    CACHE_DIR = params.cache_dir ? "${projectDir}/${params.cache_dir}" : ""
+    """
+    python ${projectDir}/scripts/result_cache.py --cache_dir "${CACHE_DIR}" --max_size ${params.cache_max_size} \\
+    --method global-fit --args="${HYPHY_ARGS}" --inputs ${nuc_msa_filtered_ch} ${newick_tree_ch} --output ${gene}_global_fit.json -- \\
+    hyphy CPU=${task.cpus} ${FIT_GLOBAL_MODEL} --alignment ${nuc_msa_filtered_ch} --tree ${newick_tree_ch} ${HYPHY_ARGS} --intermediate-fits ${gene}_global_fit.json --output ${gene}_global_fit_results.json
+    """
+}
\ No newline at end of file
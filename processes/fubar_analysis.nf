@@ -7,18 +7,27 @@
 
 process FUBAR_ANALYSIS {
 
+    tag "${gene}"
     conda "${projectDir}/envs/positive_selection_analysis.yaml"
 
     input:
-    val gene
-    path nuc_msa_filtered_ch
-    path newick_tree_ch
+    // gene, alignment, tree and global model fit of FIT_GLOBAL_MODEL, with the cpus, memory
+    // and time predicted by MEASURE_ALIGNMENT for the gene (see the hpc profile)
+    tuple val(gene), path(nuc_msa_filtered_ch), path(newick_tree_ch), path(global_fit_ch), val(resources)
 
     output:
-    path "${gene}_fubar_results.json", emit: fubar_results_ch
+    tuple val(gene), path("${gene}_fubar_results.json"), emit: fubar_results_ch
     
     script:
+    HYPHY_ARGS="--grid 40"
+    // results are reused from the persistent cache if the alignment, tree and arguments are unchanged (--cache_dir)
+    CACHE_DIR = params.cache_dir ? "${projectDir}/${params.cache_dir}" : ""
+    // start from the global model fit of FIT_GLOBAL_MODEL; HyPhy may add to the fits file, so use a copy
+    FITS="${gene}_fubar_fits.json"
     """
-    hyphy CPU=${task.cpus} fubar --grid 40 --alignment ${nuc_msa_filtered_ch} --tree ${newick_tree_ch} --output ${gene}_fubar_results.json
+    cp -L ${global_fit_ch} ${FITS}
+    python ${projectDir}/scripts/result_cache.py --cache_dir "${CACHE_DIR}" --max_size ${params.cache_max_size} \\
+    --method fubar --args="${HYPHY_ARGS}" --inputs ${nuc_msa_filtered_ch} ${newick_tree_ch} --output ${gene}_fubar_results.json -- \\
+    hyphy CPU=${task.cpus} fubar --alignment ${nuc_msa_filtered_ch} --tree ${newick_tree_ch} ${HYPHY_ARGS} --intermediate-fits ${FITS} --output ${gene}_fubar_results.json
     """
 }
\ No newline at end of file
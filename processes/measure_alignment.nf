@@ -0,0 +1,31 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Measure the filtered codon alignment of a gene (haplotypes, codons,
+ * site patterns, tips) and predict the CPU, memory and time requests
+ * of the tree and HyPhy processes from the resource history of
+ * previous runs. Processes without enough history keep the requests
+ * of the profile. The history is a path input, so a changed history
+ * invalidates the cached task on -resume; it is empty before the
+ * first recorded run.
+ */
+
+process MEASURE_ALIGNMENT {
+
+    conda "${projectDir}/envs/site_blocks.yaml"
+    publishDir "${projectDir}/${params.resource_dir}/features", mode: 'copy', overwrite: true
+
+    input:
+    tuple val(gene), path(nuc_msa_filtered_ch)
+    path history
+    val block_size
+
+    output:
+    path "${gene}_resources.json", emit: resources_ch
+    
+    script:
+    HISTORY = history ? "--history ${history}" : ""
+    """
+    python ${projectDir}/scripts/resource_model.py measure --gene ${gene} --msa ${nuc_msa_filtered_ch} ${HISTORY} --site_block_size ${block_size} --output ${gene}_resources.json
+    """
+}
\ No newline at end of file
@@ -1,11 +1,14 @@
 #!/usr/bin/env nextflow
 
 /*
- * Merge duplicates from post-msa and prior.
+ * Merge duplicates from post-msa and prior, rename the merged
+ * representatives and update the headers of the nucleotide MSA
+ * accordingly in a single run.
  */
 
 process MERGE_DUPLICATES {
 
+    tag "${gene}"
     conda "${projectDir}/envs/merge_duplicates.yaml"
 
     input:
@@ -17,13 +20,12 @@ process MERGE_DUPLICATES {
     output:
     path "${gene}_nuc_msa_merged.fas", emit: nuc_msa_merged_ch
     path "${gene}_nuc_msa_merged_duplicates.json", emit: nuc_msa_merged_duplicates_ch
+    path "${gene}_merge_duplicates_metrics.json", emit: metrics_ch
 
     script:
     MERGED_DUPLICATES="${gene}_nuc_msa_merged_duplicates.json"
-    MAPPING="${gene}_nuc_msa_merged_duplicates_map.json"
     """
-    python ${projectDir}/scripts/merge_duplicates.py -p ${nuc_duplicates_ch} -n ${nuc_msa_duplicates_ch} -o ${MERGED_DUPLICATES}
-    python ${projectDir}/scripts/fix_duplicates.py -d ${MERGED_DUPLICATES} -m ${MAPPING} -o
-    python ${projectDir}/scripts/update_fasta_duplicates.py -f ${nuc_msa_compressed_ch} -m ${MAPPING} -o ${gene}_nuc_msa_merged.fas
+    python ${projectDir}/scripts/merge_duplicates.py -p ${nuc_duplicates_ch} -n ${nuc_msa_duplicates_ch} -o ${MERGED_DUPLICATES} --msa ${nuc_msa_compressed_ch} --msa-output ${gene}_nuc_msa_merged.fas \
+    --metrics ${gene}_merge_duplicates_metrics.json
     """
 }
\ No newline at end of file
@@ -0,0 +1,26 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Merge the results of all site blocks of a gene into one result
+ * with global site indices, as written by the unsplit analysis.
+ * Included once per method.
+ */
+
+process MERGE_SITE_BLOCKS {
+
+    tag "${gene}"
+    conda "${projectDir}/envs/site_blocks.yaml"
+
+    input:
+    val method
+    tuple val(gene), path(block_results)
+
+    output:
+    tuple val(gene), path("${gene}_${method}_results.json"), emit: results_ch
+    path "${gene}_merge_${method}_blocks_metrics.json", emit: metrics_ch
+
+    script:
+    """
+    python ${projectDir}/scripts/merge_site_blocks.py --input ${block_results} --output ${gene}_${method}_results.json --metrics ${gene}_merge_${method}_blocks_metrics.json
+    """
+}
\ No newline at end of file
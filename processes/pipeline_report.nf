@@ -1,30 +1,33 @@
 #!/usr/bin/env nextflow
 
 /*
- * Create a report file for the pipeline run.
+ * Create a report file for the pipeline run: duplicates and sequence attrition per gene
+ * and the metrics of every stage. The slowest stage per gene and the critical path are
+ * added from the Nextflow trace in workflow.onComplete, once every task has finished.
  */
 
 process PIPELINE_REPORT {
 
     conda "${projectDir}/envs/pipeline_report.yaml"
+    publishDir "${projectDir}/${params.resource_dir}", mode: "copy"
 
     input:
-    val gene
+    val genes
     path copies_ch
-    path newick_tree_ch
-    path nuc_msa_filtered_ch
+    path metrics_ch
 
     output:
     path "pipeline_report.txt", emit: pipeline_report
+    path "performance_report.json", emit: performance_report
     
     script:
     """
     python ${projectDir}/scripts/pipeline_report.py \
-    --gene ${gene} \
+    --genes ${genes.join(' ')} \
     --pipeline_dir ${projectDir} \
     --duplicated_seqs ${copies_ch} \
-    --tree ${newick_tree_ch} \
-    --msa ${nuc_msa_filtered_ch} \
-    --output_file pipeline_report.txt
+    --metrics ${metrics_ch} \
+    --output_file pipeline_report.txt \
+    --json performance_report.json
     """
 }
\ No newline at end of file
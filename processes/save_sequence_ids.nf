@@ -0,0 +1,24 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Store the IDs of all processed sequences in the state directory.
+ * This runs after the state of every gene was saved, so an aborted
+ * run never marks sequences as processed.
+ */
+
+process SAVE_SEQUENCE_IDS {
+
+    publishDir "${projectDir}/${params.state_dir}", mode: 'copy'
+
+    input:
+    path sequence_ids_ch
+    val saved_states
+
+    output:
+    path "sequence_ids.txt", emit: sequence_ids_ch, includeInputs: true
+
+    script:
+    """
+    touch sequence_ids.txt
+    """
+}
\ No newline at end of file
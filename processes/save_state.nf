@@ -0,0 +1,30 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Store the unique haplotypes, duplicates and the protein MSA of a
+ * gene in the state directory, so the next run can add new sequences
+ * to them (--state_dir). The files of a gene arrive as one tuple,
+ * joined on the gene name.
+ */
+
+process SAVE_STATE {
+
+    publishDir "${projectDir}/${params.state_dir}", mode: 'copy'
+
+    input:
+    tuple val(gene), path(protein_seqs_compressed_ch), path(nuc_seqs_compressed_ch), path(protein_duplicates_ch), path(nuc_duplicates_ch), path(protein_msa_ch), path(mapped_reference_ch)
+
+    output:
+    path "${gene}/*", emit: state_ch
+
+    script:
+    """
+    mkdir ${gene}
+    cp -L ${protein_msa_ch} ${gene}/${gene}_protein_msa.fas
+    cp -L ${mapped_reference_ch} ${gene}/${gene}_mapped_reference.fas
+    cp -L ${protein_seqs_compressed_ch} ${gene}/${gene}_protein_compressed.fas
+    cp -L ${nuc_seqs_compressed_ch} ${gene}/${gene}_nuc_compressed.fas
+    cp -L ${protein_duplicates_ch} ${gene}/${gene}_protein_duplicates.dups
+    cp -L ${nuc_duplicates_ch} ${gene}/${gene}_nuc_duplicates.dups
+    """
+}
\ No newline at end of file
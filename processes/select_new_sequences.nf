@@ -0,0 +1,34 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Incremental mode: select the sequences that were not part of
+ * the previous run stored in the state directory and list the IDs
+ * of all sequences for the next run. Without a previous run all
+ * sequences are passed on unchanged and no stored IDs are staged.
+ */
+
+process SELECT_NEW_SEQUENCES {
+
+    conda "${projectDir}/envs/extract_gene_windows.yaml"
+
+    input:
+    val sequences_ch
+    path state_ids, stageAs: 'stored/*'
+    val incremental
+
+    output:
+    path "new_sequences.fasta", emit: new_sequences_ch
+    path "sequence_ids.txt", emit: sequence_ids_ch
+    path "select_new_sequences_metrics.json", emit: metrics_ch
+
+    script:
+    if (incremental)
+        """
+        python ${projectDir}/scripts/select_new_sequences.py --input ${sequences_ch} --state_ids ${state_ids} --output new_sequences.fasta --ids sequence_ids.txt --threads ${task.cpus} --metrics select_new_sequences_metrics.json
+        """
+    else
+        """
+        python ${projectDir}/scripts/select_new_sequences.py --input ${sequences_ch} --ids sequence_ids.txt --threads ${task.cpus} --metrics select_new_sequences_metrics.json
+        ln -s ${sequences_ch} new_sequences.fasta
+        """
+}
\ No newline at end of file
@@ -0,0 +1,27 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Select the sites under positive selection of all genes and
+ * methods (SLAC, FEL, MEME, FUBAR) in a single pass over the
+ * results stores, with a threshold per method.
+ */
+
+process SELECT_SITES_UNDER_PS {
+
+    conda "${projectDir}/envs/select_sites_under_ps.yaml"
+
+    input:
+    path results_store_ch
+
+    output:
+    path "sites_under_ps.tsv", emit: sites_under_ps_ch
+    path "site_selection_summary.tsv", emit: site_selection_summary_ch
+    path "select_sites_under_ps_metrics.json", emit: metrics_ch
+
+    script:
+    """
+    python ${projectDir}/scripts/select_sites_under_ps.py --results ${results_store_ch} \
+    --fel_pvalue ${params.fel_pvalue} --meme_pvalue ${params.meme_pvalue} --slac_pvalue ${params.slac_pvalue} --fubar_posterior ${params.fubar_posterior} \
+    --output sites_under_ps.tsv --summary site_selection_summary.tsv --metrics select_sites_under_ps_metrics.json
+    """
+}
\ No newline at end of file
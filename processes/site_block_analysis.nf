@@ -0,0 +1,33 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Analyze a block of sites with a site-independent HyPhy method
+ * (FEL, MEME), starting from the global model fit of the whole
+ * gene. Included once per method.
+ */
+
+process SITE_BLOCK_ANALYSIS {
+
+    tag "${gene}"
+    conda "${projectDir}/envs/positive_selection_analysis.yaml"
+
+    input:
+    val method
+    val hyphy_args
+    tuple val(gene), path(site_block), path(newick_tree), path(global_fit), val(resources)
+
+    output:
+    tuple val(gene), path("${site_block.baseName}_${method}.json"), emit: block_results_ch
+    
+    script:
+    OUTPUT="${site_block.baseName}_${method}.json"
+    // results are reused from the persistent cache if the block, tree and arguments are unchanged (--cache_dir)
+    CACHE_DIR = params.cache_dir ? "${projectDir}/${params.cache_dir}" : ""
+    FITS="${site_block.baseName}_${method}_fits.json"
+    """
+    cp -L ${global_fit} ${FITS}
+    python ${projectDir}/scripts/result_cache.py --cache_dir "${CACHE_DIR}" --max_size ${params.cache_max_size} \\
+    --method ${method}-block --args="${hyphy_args}" --inputs ${site_block} ${newick_tree} --output ${OUTPUT} -- \\
+    hyphy CPU=${task.cpus} ${method} --alignment ${site_block} --tree ${newick_tree} ${hyphy_args} --intermediate-fits ${FITS} --output ${OUTPUT}
+    """
+}
\ No newline at end of file
@@ -0,0 +1,27 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Split the filtered codon alignment of a gene into blocks of
+ * sites that are analysed as independent tasks (--site_block_size).
+ * The tree, the global model fit and the predicted resources are
+ * passed along with the blocks.
+ */
+
+process SPLIT_CODON_ALIGNMENT {
+
+    tag "${gene}"
+    conda "${projectDir}/envs/site_blocks.yaml"
+
+    input:
+    tuple val(gene), path(nuc_msa_filtered_ch), val(newick_tree), val(global_fit), val(resources)
+    val block_size
+
+    output:
+    tuple val(gene), val(newick_tree), val(global_fit), val(resources), path("${gene}_block_*.fas"), emit: site_blocks_ch
+    path "${gene}_split_codon_alignment_metrics.json", emit: metrics_ch
+
+    script:
+    """
+    python ${projectDir}/scripts/split_codon_alignment.py --input ${nuc_msa_filtered_ch} --prefix ${gene} --block_size ${block_size} --metrics ${gene}_split_codon_alignment_metrics.json
+    """
+}
\ No newline at end of file
@@ -1,7 +1,8 @@
 #!/usr/bin/env nextflow
 
 /*
- * Create a figure showing the evolution of a single site over the time.
+ * Create a figure showing the evolution of a single site over the time
+ * from the residue counts of its gene.
  */
 
 process TEMPORAL_EVOLUTION_PLOT {
@@ -11,17 +12,13 @@ process TEMPORAL_EVOLUTION_PLOT {
     input:
     val genes_ch
     val single_sites_ch
-    val protein_msa_ch
-    val metadata_ch
-    val protein_duplicates_ch
+    path residue_counts_ch
     
     script:
     """
     python ${projectDir}/scripts/temporal_evolution_plot.py \
     --genes ${genes_ch} \
     --sites ${single_sites_ch} \
-    --msa ${protein_msa_ch} \
-    --metadata ${metadata_ch} \
-    --duplicates ${protein_duplicates_ch}
+    --counts ${residue_counts_ch}
     """
 }
\ No newline at end of file
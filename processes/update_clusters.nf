@@ -0,0 +1,47 @@
+#!/usr/bin/env nextflow
+
+/*
+ * Incremental mode: add the unique haplotypes of the new sequences
+ * to the unique haplotypes and duplicates stored by the previous run.
+ * Only haplotypes that were not seen before are passed on to be added
+ * to the stored protein MSA. The stored files are staged into stored/,
+ * their names match the new ones.
+ */
+
+process UPDATE_CLUSTERS {
+
+    tag "${gene}"
+    conda "${projectDir}/envs/compress_duplicates.yaml"
+
+    input:
+    tuple val(gene), path(protein_seqs_compressed_ch), path(nuc_seqs_compressed_ch), path(protein_duplicates_ch), path(nuc_duplicates_ch),
+        path(stored_protein_seqs, stageAs: 'stored/*'), path(stored_nuc_seqs, stageAs: 'stored/*'), path(stored_protein_duplicates, stageAs: 'stored/*'), path(stored_nuc_duplicates, stageAs: 'stored/*')
+
+    output:
+    path "${gene}_protein_compressed_all.fas", emit: protein_seqs_compressed_ch
+    path "${gene}_nuc_compressed_all.fas", emit: nuc_seqs_compressed_ch
+    path "${gene}_protein_duplicates_all.dups", emit: protein_duplicates_ch
+    path "${gene}_nuc_duplicates_all.dups", emit: nuc_duplicates_ch
+    tuple val(gene), path("${gene}_protein_added.fas"), emit: protein_seqs_added_ch
+    path "${gene}_update_clusters_metrics.json", emit: metrics_ch
+    tuple val(gene), path("${gene}_protein_compressed_all.fas"), path("${gene}_nuc_compressed_all.fas"), path("${gene}_protein_duplicates_all.dups"), path("${gene}_nuc_duplicates_all.dups"), emit: clusters_state_ch
+
+    script:
+    """
+    python ${projectDir}/scripts/update_clusters.py \
+    --stored-protein-duplicates ${stored_protein_duplicates} \
+    --stored-nuc-duplicates ${stored_nuc_duplicates} \
+    --stored-protein-sequences ${stored_protein_seqs} \
+    --stored-nuc-sequences ${stored_nuc_seqs} \
+    --protein-duplicates ${protein_duplicates_ch} \
+    --nuc-duplicates ${nuc_duplicates_ch} \
+    --protein-sequences ${protein_seqs_compressed_ch} \
+    --nuc-sequences ${nuc_seqs_compressed_ch} \
+    --protein-output ${gene}_protein_compressed_all.fas \
+    --nuc-output ${gene}_nuc_compressed_all.fas \
+    --protein-duplicates-output ${gene}_protein_duplicates_all.dups \
+    --nuc-duplicates-output ${gene}_nuc_duplicates_all.dups \
+    --added-proteins ${gene}_protein_added.fas \
+    --metrics ${gene}_update_clusters_metrics.json
+    """
+}
\ No newline at end of file
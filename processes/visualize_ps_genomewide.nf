@@ -1,8 +1,8 @@
 #!/usr/bin/env nextflow
 
 /*
- * Create a list of positions under positive selection 
- * for a single gene.
+ * Visualize the sites under positive selection of all genes
+ * in the entire genome (FEL).
  */
 
 process VISUALIZE_PS_GENOMEWIDE {
@@ -10,15 +10,17 @@ process VISUALIZE_PS_GENOMEWIDE {
     conda "${projectDir}/envs/visualize_ps_genomewide.yaml"
 
     input:
-    val fel_sites_under_ps_ch
-    val total_sites_ch
+    path sites_under_ps_ch
+    path site_selection_summary_ch
     val gene_lengths_ch
 
     output:
     path "fel_genomewide_positive_selection.html", emit: genomewide_ps
+    path "visualize_ps_genomewide_metrics.json", emit: metrics_ch
     
     script:
     """
-    python ${projectDir}/scripts/visualize_ps_genomewide.py --sites_ps ${fel_sites_under_ps_ch} --sites_total ${total_sites_ch} --gene_lengths ${projectDir}/${gene_lengths_ch}
+    python ${projectDir}/scripts/visualize_ps_genomewide.py --sites ${sites_under_ps_ch} --summary ${site_selection_summary_ch} --method fel --gene_lengths ${projectDir}/${gene_lengths_ch} \
+    --metrics visualize_ps_genomewide_metrics.json
     """
 }
\ No newline at end of file
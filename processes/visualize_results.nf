@@ -1,7 +1,8 @@
 #!/usr/bin/env nextflow
 
 /*
- * Create figures and tables of the selection analysis results.
+ * Create figures and tables of the selection analysis results. For the results site the
+ * figures are written into one data file per gene instead of standalone HTML files.
  */
 
 process VISUALIZE_RESULTS {
@@ -9,16 +10,22 @@ process VISUALIZE_RESULTS {
     conda "${projectDir}/envs/visualize_results.yaml"
 
     input:
-    val gene
-    path fel_results_ch
-    path position_map_table_ch
+    // FEL results store and position map table of the same gene, joined on the gene
+    tuple val(gene), path(fel_results_ch), path(position_map_table_ch)
+    val results_site
     //path meme_results_ch
+
+    output:
+    path "${gene}_figures.js", optional: true, emit: site_data_ch
+    path "${gene}_visualize_results_metrics.json", emit: metrics_ch
     
     script:
+    def site_data = results_site ? "--site_data ${gene}_figures.js" : ""
     // """
     // python ${projectDir}/scripts/visualize_results.py --gene ${gene} --fel ${fel_results_ch} --meme ${meme_results_ch}
     // """
     """
-    python ${projectDir}/scripts/visualize_results.py --gene ${gene} --fel ${fel_results_ch} --position_map ${position_map_table_ch}
+    python ${projectDir}/scripts/visualize_results.py --gene ${gene} --fel ${fel_results_ch} --position_map ${position_map_table_ch} ${site_data} \
+    --metrics ${gene}_visualize_results_metrics.json
     """
 }
\ No newline at end of file
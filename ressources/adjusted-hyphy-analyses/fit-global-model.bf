@@ -0,0 +1,71 @@
+RequireVersion ("2.5.21");
+
+
+LoadFunctionLibrary     ("libv3/all-terms.bf");
+LoadFunctionLibrary     ("libv3/UtilityFunctions.bf");
+LoadFunctionLibrary     ("libv3/IOFunctions.bf");
+LoadFunctionLibrary     ("libv3/tasks/estimators.bf");
+LoadFunctionLibrary     ("libv3/tasks/alignments.bf");
+LoadFunctionLibrary     ("libv3/models/codon.bf");
+LoadFunctionLibrary     ("libv3/tasks/trees.bf");
+LoadFunctionLibrary     ("libv3/tasks/genetic_code.bf");
+LoadFunctionLibrary     ("libv3/models/codon/MG_REV.bf");
+LoadFunctionLibrary     ("libv3/convenience/math.bf");
+LoadFunctionLibrary     ("SelectionAnalyses/modules/io_functions.bf");
+LoadFunctionLibrary     ("SelectionAnalyses/modules/selection_lib.bf");
+
+global_fit.analysis_description = {terms.io.info :
+                            "
+                            Fit the nucleotide GTR and the global MG94xREV codon model
+                            once per alignment and tree. The estimates are saved with
+                            --intermediate-fits, so SLAC, FEL, MEME and FUBAR can start
+                            from them instead of re-optimising the baseline models
+                            ",
+                            terms.io.version :          "0.01",
+                            terms.io.reference :        "TBD",
+                            terms.io.authors :          "Sergei L Kosakovsky Pond",
+                            terms.io.contact :          "spond@temple.edu",
+                            terms.io.requirements :     "in-frame codon alignment and a phylogenetic tree"
+                          };
+
+io.DisplayAnalysisBanner (global_fit.analysis_description);
+
+global_fit.json = {
+    terms.json.analysis: global_fit.analysis_description,
+    terms.json.input: {},
+    terms.json.fits: {},
+    terms.json.timers: {}
+};
+
+global_fit.scaler_prefix = "GLOBAL_FIT.scaler";
+
+selection.io.startTimer (global_fit.json [terms.json.timers], "Total time", 0);
+
+KeywordArgument ("code",      "Which genetic code should be used", "Universal");
+KeywordArgument ("alignment", "An in-frame codon alignment in one of the formats supported by HyPhy");
+KeywordArgument ("tree",      "A phylogenetic tree (optionally annotated with {})", null, "Please select a tree file for the data:");
+KeywordArgument ("branches",  "Branches to test", "All");
+
+// load_file also handles --intermediate-fits; doGTR and doPartitionedMG save their estimates there
+namespace global_fit {
+    LoadFunctionLibrary ("SelectionAnalyses/modules/shared-load-file.bf");
+    load_file ("global_fit");
+}
+
+KeywordArgument ("output", "Write the resulting JSON to this file (default is to save to the same path as the alignment file + 'GLOBAL_FIT.json')", global_fit.codon_data_info [terms.json.json]);
+global_fit.codon_data_info [terms.json.json] = io.PromptUserForFilePath ("Save the resulting JSON file to");
+
+namespace global_fit {
+    doGTR ("global_fit");
+}
+
+estimators.fixSubsetOfEstimates (global_fit.gtr_results, global_fit.gtr_results[terms.global]);
+
+namespace global_fit {
+    doPartitionedMG ("global_fit", FALSE);
+}
+
+selection.io.stopTimer (global_fit.json [terms.json.timers], "Total time");
+io.SpoolJSON (global_fit.json, global_fit.codon_data_info [terms.json.json]);
+
+return global_fit.json;
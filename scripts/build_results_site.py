@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import shutil
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+from stage_metrics import StageMetrics
+
+# index page of the results site: the genes are listed, the data file of a gene is only loaded
+# (with a script tag, so that the site also opens from the file system) when the gene is selected
+# and only the selected figure is drawn
+INDEX = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Positive selection results</title>
+<script src="plotly.min.js"></script>
+<style>
+body { font-family: sans-serif; margin: 0; display: flex; height: 100vh; }
+nav { width: 12em; overflow-y: auto; border-right: 1px solid #ddd; padding: 0.5em; }
+nav a { display: block; padding: 0.2em 0.4em; color: #333; cursor: pointer; }
+nav a.selected { background: #e8eef9; }
+main { flex: 1; overflow-y: auto; padding: 0.5em 1em; }
+#figures button { margin: 0 0.3em 0.3em 0; }
+</style>
+</head>
+<body>
+<nav id="genes"></nav>
+<main><h2 id="gene"></h2><div id="figures"></div><div id="figure"></div></main>
+<script>
+const GENES = __GENES__;
+const TEMPLATE = __TEMPLATE__;
+const resultsSite = {
+  genes: {},
+  callbacks: {},
+  // called by data/<gene>.js
+  addGene(gene, figures) {
+    this.genes[gene] = figures;
+    (this.callbacks[gene] || []).forEach(callback => callback(figures));
+    delete this.callbacks[gene];
+  },
+  load(gene, callback) {
+    if (gene in this.genes) return callback(this.genes[gene]);
+    if (!(gene in this.callbacks)) {
+      this.callbacks[gene] = [];
+      const script = document.createElement("script");
+      script.src = "data/" + encodeURIComponent(gene) + ".js";
+      document.head.appendChild(script);
+    }
+    this.callbacks[gene].push(callback);
+  }
+};
+let selectedGene = null;
+function showFigure(figure) {
+  Plotly.react("figure", figure.data, Object.assign({}, figure.layout, {template: TEMPLATE}), {responsive: true});
+}
+function showGene(gene) {
+  selectedGene = gene;
+  document.getElementById("gene").textContent = gene;
+  document.querySelectorAll("#genes a").forEach(link => link.classList.toggle("selected", link.textContent === gene));
+  resultsSite.load(gene, figures => {
+    if (gene !== selectedGene) return;
+    document.getElementById("figures").replaceChildren(...figures.map(({name, figure}) => {
+      const button = document.createElement("button");
+      button.textContent = name.replace(/_/g, " ");
+      button.onclick = () => showFigure(figure);
+      return button;
+    }));
+    if (figures.length) showFigure(figures[0].figure);
+  });
+}
+for (const gene of GENES) {
+  const link = document.createElement("a");
+  link.textContent = gene;
+  link.onclick = () => showGene(gene);
+  document.getElementById("genes").appendChild(link);
+}
+if (GENES.length) showGene(GENES[0]);
+</script>
+</body>
+</html>"""
+
+
+# gene of a data file written by visualize_results.py (<gene>_figures.js)
+def gene_of_file(path):
+    return os.path.basename(path)[:-len("_figures.js")]
+
+# JSON that can be placed into a script element
+def script_json(value):
+    return json.dumps(value, separators=(",", ":")).replace("</", "<\\/")
+
+# results site of all genes: one copy of plotly.js, the plotly template, one data file per
+# gene (data/<gene>.js) and the index page; genes are in the order of the gene list, returns the files written
+def build_results_site(genes, data_files, output_dir):
+    os.makedirs(os.path.join(output_dir, "data"), exist_ok=True)
+    files = {gene_of_file(path): path for path in data_files}
+    site_genes = [gene for gene in genes if gene in files] + sorted(set(files) - set(genes))
+    written = [os.path.join(output_dir, "data", gene + ".js") for gene in site_genes]
+    for gene, path in zip(site_genes, written):
+        shutil.copyfile(files[gene], path)
+    with open(os.path.join(output_dir, "plotly.min.js"), "w") as handle:
+        handle.write(get_plotlyjs())
+    template = pio.templates[pio.templates.default].to_plotly_json()
+    with open(os.path.join(output_dir, "index.html"), "w") as handle:
+        handle.write(INDEX.replace("__GENES__", script_json(site_genes)).replace("__TEMPLATE__", script_json(template)))
+    return written + [os.path.join(output_dir, "plotly.min.js"), os.path.join(output_dir, "index.html")]
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Combine the figures of all genes into one results site with a single copy of plotly.js')
+    arguments.add_argument('-g', '--genes', help = 'Names of the genes, in the order of the site', type = str, nargs='+', required = True)
+    arguments.add_argument('-d', '--site_data', help = 'Data files of the genes written by visualize_results.py (<gene>_figures.js)', type = str, nargs='*', default = [])
+    arguments.add_argument('-o', '--output_dir', help = 'Output directory of the results site', required = True, type = str)
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("build_results_site")
+    written = build_results_site(args.genes, args.site_data, args.output_dir)
+
+    if args.metrics:
+        metrics.records_in = len(args.site_data)
+        metrics.records_out = len(written) - 2
+        metrics.read(*args.site_data)
+        metrics.wrote(*written)
+        metrics.write(args.metrics)
\ No newline at end of file
@@ -1,76 +1,157 @@
-import csv
-import json
-import sys
 import argparse
-import copy
-import itertools
-from datetime import date, timedelta
-from operator import itemgetter
-from Bio import SeqIO
-
-arguments = argparse.ArgumentParser(description='Create unique sets of protein and nucleotide haplotypes while keeping track of what other sequences are being represented by the retained unique sequences')
-arguments.add_argument('--protein-input', help = 'protein fasta to filter for duplicates', required = True, type = argparse.FileType('r'))
-arguments.add_argument('--nuc-input', help='nucleotide fasta to filter for duplicates', required = True, type = argparse.FileType('r'))
-arguments.add_argument('--protein-output', help = 'compressed protein fasta output file', required = True, type = argparse.FileType('w'))
-arguments.add_argument('--nuc-output', help = 'compressed nucleotide fasta output file', required = True, type = argparse.FileType('w'))
-arguments.add_argument('--protein-duplicates', help='protein duplicates lookup JSON output file', required = True, type = argparse.FileType('w'))
-arguments.add_argument('--nuc-duplicates', help='nucleotide protein duplicates lookup JSON output file', required = True, type = argparse.FileType('w'))
-args = arguments.parse_args()
-
-
-def get_duplicates(seqs):
-    seqs = sorted(seqs, key=lambda x: x.seq)
-    duplicates = {}
-    for rec in seqs:
-        if(rec.seq not in duplicates):  
-            duplicates[rec.seq] = [rec]
+import hashlib
+import heapq
+import os
+import tempfile
+from fasta_io import FastaIndex, iter_fasta, record_name, write_fasta_record
+from duplicates_io import write_duplicates
+from stage_metrics import StageMetrics
+
+
+# digest used as cluster key instead of the full sequence
+def sequence_digest(sequence):
+    return hashlib.blake2b(sequence.encode(), digest_size=16).digest()
+
+
+# Streaming clustering of identical sequences. Only the digest of every unique
+# sequence, the member IDs and (optionally) the representative sequences are kept.
+# Once the representative sequences exceed the memory budget they are spilled to
+# hash-partitioned bucket files on disk.
+class SequenceClusters:
+
+    def __init__(self, keep_sequences=False, memory_budget=1024**3, spill_dir=".", buckets=64):
+        self.keep_sequences = keep_sequences
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.buckets = buckets
+        self.cluster_ids = {}
+        self.members = []
+        self.sequences = {}
+        self.held_bytes = 0
+        self.spill = None
+
+    def add(self, name, sequence):
+        digest = sequence_digest(sequence)
+        cluster = self.cluster_ids.get(digest)
+        if cluster is not None:
+            self.members[cluster].append(name)
+            return
+        cluster = len(self.members)
+        self.cluster_ids[digest] = cluster
+        self.members.append([name])
+        if self.keep_sequences:
+            self._store_sequence(cluster, digest, sequence)
+
+    def add_fasta(self, handle):
+        records = 0
+        for header, sequence in iter_fasta(handle):
+            self.add(record_name(header), sequence)
+            records += 1
+        return records
+
+    def _store_sequence(self, cluster, digest, sequence):
+        if self.spill is None:
+            self.sequences[cluster] = sequence
+            self.held_bytes += len(sequence)
+            if self.held_bytes > self.memory_budget:
+                self._start_spilling()
         else:
-            duplicates[rec.seq].append(rec)
-    return duplicates
-
-
-protein_seqs = list(SeqIO.parse(args.protein_input, 'fasta'))
-protein_duplicates = get_duplicates(protein_seqs)
-
-nuc_seqs = list(SeqIO.parse(args.nuc_input, 'fasta'))
-nuc_duplicates = get_duplicates(nuc_seqs)
-
-# Write new fasta from first index of each dupe, and duplicates file if provided
-vals = list(protein_duplicates.values())
-
-# Write fasta
-firsts = [val[0] for val in vals]
-
-# Write protein_duplicates
-dupe_names = {val[0].name : {"{0}".format(i): val[i].name for i in range(len(val))} for val in vals}
-json.dump(dupe_names, args.protein_duplicates, indent=4, sort_keys=True)
-
-# Write nuc_duplicates
-nuc_vals = list(nuc_duplicates.values())
-nuc_dupe_names = {val[0].name : {"{0}".format(i): val[i].name for i in range(len(val))} for val in nuc_vals}
-json.dump(nuc_dupe_names, args.nuc_duplicates, indent=4, sort_keys=True)
-
-for first in firsts:
-    first.id = first.name
-    first.description = first.name
-    # first.id = first.name + "_" + str(len(dupe_names[first.name].keys()))
-    # first.description = first.name + "_" + str(len(dupe_names[first.name].keys()))
-
-nuc_firsts = [val[0] for val in nuc_vals]
-filtered_seq_names = [seq.name for seq in nuc_firsts]
-
-for first in nuc_firsts:
-    first.id = first.name
-    first.description = first.name
-    # first.id = first.name + "_" + str(len(nuc_dupe_names[first.name].keys()))
-    # first.description = first.name + "_" + str(len(nuc_dupe_names[first.name].keys()))
-
-
-# Protein seq map
-prot_seq_map = {record.id : record for record in protein_seqs}
-prot_nuc_firsts = [prot_seq_map[nuc_first.id] for nuc_first in nuc_firsts]
-
-# Write protein sequences based on nucleotide dupes
-# Get protein_seqs based on nucleotide dupes
-SeqIO.write(prot_nuc_firsts, args.protein_output, "fasta")
-SeqIO.write(nuc_firsts, args.nuc_output, "fasta")
\ No newline at end of file
+            self._spill_sequence(cluster, digest, sequence)
+
+    def _start_spilling(self):
+        self.spill_tmp = tempfile.TemporaryDirectory(prefix="compress_duplicates_", dir=self.spill_dir)
+        self.spill = [open(os.path.join(self.spill_tmp.name, f"bucket_{i}.tsv"), "w") for i in range(self.buckets)]
+        digests = {cluster: digest for digest, cluster in self.cluster_ids.items() if cluster in self.sequences}
+        for cluster, sequence in self.sequences.items():
+            self._spill_sequence(cluster, digests[cluster], sequence)
+        self.sequences = {}
+        self.held_bytes = 0
+
+    def _spill_sequence(self, cluster, digest, sequence):
+        self.spill[digest[0] % self.buckets].write(f"{cluster}\t{sequence}\n")
+
+    def __len__(self):
+        return len(self.members)
+
+    def representative(self, cluster):
+        return self.members[cluster][0]
+
+    # (representative, member IDs) of all clusters, sorted by representative
+    def sorted_clusters(self):
+        for cluster in sorted(range(len(self.members)), key=self.representative):
+            yield self.members[cluster][0], self.members[cluster]
+
+    # (cluster, sequence) of all clusters sorted by sequence; spilled buckets are
+    # sorted one at a time and merged from disk
+    def sorted_sequences(self):
+        if self.spill is None:
+            yield from sorted(self.sequences.items(), key=lambda x: x[1])
+            return
+        runs = []
+        for bucket in self.spill:
+            bucket.close()
+            with open(bucket.name) as bucket_file:
+                entries = sorted((line.rstrip("\n").split("\t") for line in bucket_file), key=lambda x: x[1])
+            os.remove(bucket.name)
+            run_name = bucket.name + ".sorted"
+            with open(run_name, "w") as run:
+                run.writelines(f"{cluster}\t{sequence}\n" for cluster, sequence in entries)
+            del entries
+            runs.append(run_name)
+        run_files = [open(run_name) for run_name in runs]
+        try:
+            entries = (map(lambda line: line.rstrip("\n").split("\t"), run_file) for run_file in run_files)
+            for cluster, sequence in heapq.merge(*entries, key=lambda x: x[1]):
+                yield int(cluster), sequence
+        finally:
+            for run_file in run_files:
+                run_file.close()
+            self.spill_tmp.cleanup()
+
+
+# write the representatives ordered by their sequence, the protein sequence of
+# every nucleotide representative is looked up through the protein FASTA index
+def write_representatives(nuc_clusters, protein_path, protein_output, nuc_output):
+    with FastaIndex(protein_path) as protein_index:
+        for cluster, sequence in nuc_clusters.sorted_sequences():
+            name = nuc_clusters.representative(cluster)
+            write_fasta_record(nuc_output, name, sequence)
+            write_fasta_record(protein_output, name, protein_index.fetch(name))
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Create unique sets of protein and nucleotide haplotypes while keeping track of what other sequences are being represented by the retained unique sequences')
+    arguments.add_argument('--protein-input', help = 'protein fasta to filter for duplicates', required = True, type = str)
+    arguments.add_argument('--nuc-input', help='nucleotide fasta to filter for duplicates', required = True, type = str)
+    arguments.add_argument('--protein-output', help = 'compressed protein fasta output file', required = True, type = argparse.FileType('w'))
+    arguments.add_argument('--nuc-output', help = 'compressed nucleotide fasta output file', required = True, type = argparse.FileType('w'))
+    arguments.add_argument('--protein-duplicates', help='protein duplicates lookup output file (JSON if it ends with .json, binary duplicates store otherwise)', required = True, type = str)
+    arguments.add_argument('--nuc-duplicates', help='nucleotide protein duplicates lookup output file (JSON if it ends with .json, binary duplicates store otherwise)', required = True, type = str)
+    arguments.add_argument('--memory-budget', help='MB of unique nucleotide sequences kept in memory before they are spilled to disk [default: 2048]', default = 2048, type = int)
+    arguments.add_argument('--spill-dir', help='Directory for the spilled sequence buckets [default: working directory]', default = ".", type = str)
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("compress_duplicates")
+    protein_clusters = SequenceClusters()
+    with open(args.protein_input) as protein_input:
+        metrics.records_in = metrics.total = protein_clusters.add_fasta(protein_input)
+    metrics.extra["unique_proteins"] = len(protein_clusters)
+    write_duplicates(args.protein_duplicates, protein_clusters.sorted_clusters())
+    del protein_clusters
+
+    nuc_clusters = SequenceClusters(keep_sequences=True, memory_budget=args.memory_budget*1024**2, spill_dir=args.spill_dir)
+    with open(args.nuc_input) as nuc_input:
+        nuc_clusters.add_fasta(nuc_input)
+    write_duplicates(args.nuc_duplicates, nuc_clusters.sorted_clusters())
+
+    # Write protein sequences based on nucleotide dupes
+    write_representatives(nuc_clusters, args.protein_input, args.protein_output, args.nuc_output)
+
+    if args.metrics:
+        args.protein_output.close()
+        args.nuc_output.close()
+        metrics.unique = metrics.records_out = len(nuc_clusters)
+        metrics.read(args.protein_input, args.nuc_input)
+        metrics.wrote(args.protein_output.name, args.nuc_output.name, args.protein_duplicates, args.nuc_duplicates)
+        metrics.write(args.metrics)
@@ -0,0 +1,108 @@
+import numpy as np
+from fasta_io import iter_fasta
+
+
+# index of every unit (residue or codon) of an aligned sequence among the ungapped
+# units, -1 for units that consist of gaps only; a trailing partial unit counts
+# as ungapped
+def aligned_to_ungapped(aligned, unit=1, gap="-"):
+    residues = np.frombuffer(aligned.encode(), dtype=np.uint8)
+    if len(residues) % unit:
+        residues = np.concatenate([residues, np.zeros(unit - len(residues) % unit, dtype=np.uint8)])
+    gapped = (residues.reshape(-1, unit) == ord(gap)).all(axis=1)
+    ungapped_index = np.cumsum(~gapped) - 1
+    ungapped_index[gapped] = -1
+    return ungapped_index
+
+
+# 0-based start of a gene in the genome, -1 if it is not found contiguously
+def find_gene_in_genome(gene_sequence, genome_sequence):
+    return genome_sequence.upper().find(gene_sequence.upper()) if gene_sequence else -1
+
+
+# Lookups between protein MSA columns, reference codons (= protein residues of the
+# reference) and genome nucleotides, all 0-based. Columns inserted relative to the
+# reference map to -1, as do all genome positions if the gene start is unknown.
+class CoordinateMap:
+
+    def __init__(self, msa_to_reference, genome_start=-1):
+        self.msa_to_reference = np.asarray(msa_to_reference, dtype=np.int64)
+        self.reference_to_msa = np.flatnonzero(self.msa_to_reference >= 0)
+        self.genome_start = int(genome_start)
+
+    # build the map from the reference sequence as aligned in the protein MSA
+    @classmethod
+    def from_mapped_reference(cls, mapped_reference, genome_start=-1):
+        return cls(aligned_to_ungapped(mapped_reference), genome_start)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["msa_to_reference"], data["genome_start"])
+
+    def save(self, path):
+        with open(path, "wb") as output:
+            np.savez(output, msa_to_reference=self.msa_to_reference, genome_start=np.int64(self.genome_start))
+
+    def __len__(self):
+        return len(self.msa_to_reference)
+
+    @property
+    def reference_length(self):
+        return len(self.reference_to_msa)
+
+    # reference codon of MSA columns, -1 for insertions and columns out of range
+    def msa_to_codon(self, columns):
+        columns = np.asarray(columns, dtype=np.int64)
+        valid = (columns >= 0) & (columns < len(self))
+        return np.where(valid, self.msa_to_reference[np.where(valid, columns, 0)], -1)
+
+    # MSA column of reference codons, -1 for codons out of range
+    def codon_to_msa(self, codons):
+        codons = np.asarray(codons, dtype=np.int64)
+        valid = (codons >= 0) & (codons < self.reference_length)
+        return np.where(valid, self.reference_to_msa[np.where(valid, codons, 0)], -1)
+
+    # first genome nucleotide of reference codons
+    def codon_to_genome(self, codons):
+        codons = np.asarray(codons, dtype=np.int64)
+        valid = (codons >= 0) & (self.genome_start >= 0)
+        return np.where(valid, self.genome_start + 3*codons, -1)
+
+    # reference codon that covers genome nucleotides
+    def genome_to_codon(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        codons = (positions - self.genome_start) // 3
+        valid = (self.genome_start >= 0) & (positions >= self.genome_start) & (codons < self.reference_length)
+        return np.where(valid, codons, -1)
+
+    def msa_to_genome(self, columns):
+        return self.codon_to_genome(self.msa_to_codon(columns))
+
+    def genome_to_msa(self, positions):
+        return self.codon_to_msa(self.genome_to_codon(positions))
+
+    # 1-based reference position of every MSA column as used in the position map
+    # table; inserted columns are labelled "<previous position>.<n-th insertion>"
+    def reference_labels(self):
+        columns = np.arange(len(self))
+        ungapped = self.msa_to_reference >= 0
+        last_ungapped = np.maximum.accumulate(np.where(ungapped, columns, -1))
+        positions = np.cumsum(ungapped)
+        suffixes = columns - last_ungapped
+        return [str(p) if u else f"{p}.{s}" for p, u, s in zip(positions.tolist(), ungapped.tolist(), suffixes.tolist())]
+
+    # write the position map table (reference label, 1-based MSA column)
+    def write_position_table(self, output):
+        output.write("reference\tmsa\n")
+        for column, label in enumerate(self.reference_labels(), start=1):
+            output.write(f"{label}\t{column}\n")
+
+
+# read the (first) sequence of a FASTA file
+def read_single_sequence(path):
+    with open(path) as handle:
+        for _, sequence in iter_fasta(handle):
+            return sequence
+    return ""
+
@@ -1,40 +1,136 @@
 #!/usr/bin/env python
 import argparse
-import pandas as pd
-import screed
+import csv
+import datetime
+import os
 from pathlib import Path
+from fasta_io import iter_fasta, open_input, record_name
+from stage_metrics import StageMetrics
+
+# characters of metadata rows and sequences that are buffered before they are appended to the output files
+BUFFER_SIZE = 1 << 27
 
 
 def create_output_folder(sequences_path, start_date, end_date):
     root_folder = "/".join(sequences_path.split("/")[:-1])
-    output_folder = f"{root_folder}/{args.start_date}_{args.end_date}/"
+    output_folder = f"{root_folder}/{start_date}_{end_date}/"
     Path(output_folder).mkdir(parents=True, exist_ok=True)
     return output_folder
 
 
-def load_metadata(path, date_col):
-    df = pd.read_csv(path, low_memory=False).fillna("")
-    df.sort_values(by=date_col, inplace=True)
-    return df
+# (start, end) date windows from "yyyy-mm-dd:yyyy-mm-dd" strings and/or the period from start_date
+# to end_date, which is split into consecutive windows of window_days days if given
+def get_windows(windows, start_date, end_date, window_days):
+    date_windows = [tuple(window.split(":")) for window in windows or []]
+    if start_date and end_date:
+        if window_days:
+            start = datetime.date.fromisoformat(start_date)
+            end = datetime.date.fromisoformat(end_date)
+            while start <= end:
+                window_end = min(start + datetime.timedelta(days=window_days-1), end)
+                date_windows.append((start.isoformat(), window_end.isoformat()))
+                start = window_end + datetime.timedelta(days=1)
+        else:
+            date_windows.append((start_date, end_date))
+    return list(dict.fromkeys(date_windows))
+
+
+# random samples have SEQ_REASON N, suspect samples anything but N and X
+def sample_group(seq_reason):
+    if seq_reason == "N":
+        return "random"
+    if seq_reason != "X":
+        return "suspect"
+    return None
+
+
+# output files (metadata CSV and FASTA) of every window and group ("subset" or "random" and "suspect");
+# rows and records are buffered per file and appended in batches once buffer_size characters are
+# buffered, so only one output file is open at a time however many windows there are
+class SubsetOutputs:
 
+    def __init__(self, windows, sequences_path, header, separate, buffer_size=BUFFER_SIZE):
+        self.groups = ["random", "suspect"] if separate else ["subset"]
+        self.paths = []
+        self.rows = []
+        self.records = []
+        self.targets = {}
+        self.buffer_size = buffer_size
+        self.buffered = 0
+        for start_date, end_date in windows:
+            output_folder = create_output_folder(sequences_path, start_date, end_date)
+            for group in self.groups:
+                self.targets[(start_date, end_date, group)] = len(self.paths)
+                self.paths.append((f"{output_folder}{group}.csv", f"{output_folder}{group}.fasta"))
+                self.rows.append([])
+                self.records.append([])
+                with open(self.paths[-1][0], "w", newline="") as csv_file:
+                    csv.writer(csv_file).writerow(header)
+                open(self.paths[-1][1], "w").close()
+                print(f"New files: {output_folder}{group}.csv, {output_folder}{group}.fasta")
 
-def shrink_df_by_date(df, start_date, end_date, date_col):
-    subset = df[(df[date_col] >= start_date) & (df[date_col] <= end_date)]
-    return subset
+    def target(self, window, group):
+        return self.targets[window + (group,)]
 
+    def write_row(self, target, row):
+        self.rows[target].append(row)
+        self.buffered += sum(len(field) + 1 for field in row)
+        if self.buffered >= self.buffer_size:
+            self.flush()
 
-def separate_random_suspect(df):
-    random = df[df["SEQ_REASON"] == "N"]
-    suspect = df[~df["SEQ_REASON"].isin(["N","X"])]
-    return random, suspect
+    def write_sequence(self, target, identifier, sequence):
+        self.records[target].append((identifier, sequence))
+        self.buffered += len(identifier) + len(sequence)
+        if self.buffered >= self.buffer_size:
+            self.flush()
 
+    # append the buffered rows and records to their files, one file at a time
+    def flush(self):
+        for (csv_path, fasta_path), rows, records in zip(self.paths, self.rows, self.records):
+            if rows:
+                with open(csv_path, "a", newline="") as csv_file:
+                    csv.writer(csv_file).writerows(rows)
+                rows.clear()
+            if records:
+                with open(fasta_path, "a") as fasta_file:
+                    for identifier, sequence in records:
+                        write_sequence(fasta_file, identifier, sequence)
+                records.clear()
+        self.buffered = 0
 
-def load_sequences(path):
-    sequences = {}
-    with screed.open(path) as seqfile:
-        for record in seqfile:
-            sequences[record.name] = record.sequence
-    return sequences
+    def close(self):
+        self.flush()
+
+
+# stream the metadata once and write every row into the CSV of each window (and group) it belongs
+# to; returns the targets of every selected sequence identifier
+def route_metadata(path, windows, outputs, date_col, seq_id_col, separate):
+    windows = sorted(windows)
+    routes = {}
+    selected = {}
+    with open_input(path) as metadata:
+        reader = csv.reader(metadata)
+        header = next(reader)
+        date_index = header.index(date_col)
+        id_index = header.index(seq_id_col)
+        reason_index = header.index("SEQ_REASON") if separate else None
+        for row in reader:
+            group = sample_group(row[reason_index]) if separate else "subset"
+            if group is None or not row[date_index]:
+                continue
+            key = (row[date_index], group)
+            if key not in routes:
+                routes[key] = [outputs.target(window, group) for window in windows if window[0] <= row[date_index] <= window[1]]
+            if routes[key]:
+                for target in routes[key]:
+                    outputs.write_row(target, row)
+                selected.setdefault(row[id_index], []).extend(routes[key])
+    return selected
+
+
+def read_metadata_header(path):
+    with open_input(path) as metadata:
+        return next(csv.reader(metadata))
 
 
 def write_sequence(output, identifier, sequence):
@@ -49,53 +145,53 @@ def write_sequence(output, identifier, sequence):
     output.write(f"{formatted_sequence}")
     
     
-def create_sequence_subset_file(sequences, metadata_subset, output_file, output_folder, seq_id_col):
-    with open(output_folder+output_file, "w") as fasta:
-        for id in metadata_subset[seq_id_col]:
-            if id in sequences:
-                write_sequence(fasta, id, sequences[id])
-    print("New sequences file:", output_file)
-        
+# stream the sequences once and write every selected record into the FASTA of each of its windows,
+# the records are written in the order of the FASTA file; returns the number of records read and written
+def route_sequences(path, selected, outputs):
+    records_in = records_out = 0
+    with open_input(path, threads=os.cpu_count()) as seqfile:
+        for header, sequence in iter_fasta(seqfile):
+            identifier = record_name(header)
+            records_in += 1
+            for target in selected.get(identifier, ()):
+                outputs.write_sequence(target, identifier, sequence)
+                records_out += 1
+    return records_in, records_out
 
 
 if __name__ == "__main__":
-    arguments = argparse.ArgumentParser(description='Create a data subset of a specific time period')
-    arguments.add_argument('-c', '--csv', required=True, help = 'CSV file containing the metadata', type = str, metavar="PATH")
-    arguments.add_argument('-f', '--fasta', required=True, help = 'FASTA file containing the sequence data', type = str, metavar="PATH")
-    arguments.add_argument('-s', '--start_date', required=True, help = 'Start date of the time period in the format yyyy-mm-dd', type = str, metavar="DATE")
-    arguments.add_argument('-e', '--end_date', required=True, help = 'End date of the time period in the format yyyy-mm-dd', type = str, metavar="DATE")
+    arguments = argparse.ArgumentParser(description='Create data subsets of one or more time periods in a single pass over the metadata and the sequences',
+                                        epilog='Memory: the identifiers of all selected sequences and the subsets they belong to are held in memory between the two passes, so the memory grows with the number of selected sequences (and windows per sequence).')
+    arguments.add_argument('-c', '--csv', required=True, help = 'CSV file containing the metadata (optionally gzip/BGZF/zstd compressed)', type = str, metavar="PATH")
+    arguments.add_argument('-f', '--fasta', required=True, help = 'FASTA file containing the sequence data (optionally gzip/BGZF/zstd compressed)', type = str, metavar="PATH")
+    arguments.add_argument('-s', '--start_date', required=False, help = 'Start date of the time period in the format yyyy-mm-dd', type = str, metavar="DATE")
+    arguments.add_argument('-e', '--end_date', required=False, help = 'End date of the time period in the format yyyy-mm-dd', type = str, metavar="DATE")
+    arguments.add_argument('-n', '--window_days', required=False, help = 'Split the time period into consecutive windows of this many days (e.g. 7 for weekly subsets)', type = int, metavar="INT")
+    arguments.add_argument('-w', '--windows', required=False, help = 'Further time periods in the format yyyy-mm-dd:yyyy-mm-dd', type = str, nargs='+', metavar="WINDOW")
     arguments.add_argument('-d', '--date_col', required=False, help = 'Name of the column storing the sample date in the metadata [default: DATE_DRAW]', default = "DATE_DRAW", type = str, metavar="STR")
     arguments.add_argument('-i', '--seq_id_col', required=False, help = 'Name of the column storing the sequence identifier in the metadata [default: IMS_ID]', default = "IMS_ID", type = str, metavar="STR")
     arguments.add_argument('--separate', required=True, help = 'Set flag whether or not the output is supposed to be separated into "random" and "suspect" samples', action=argparse.BooleanOptionalAction)
+    arguments.add_argument('--metrics', required=False, help = 'Write the performance metrics of the stage (JSON) here', type = str, metavar="PATH")
     args = arguments.parse_args()
     
-    output_folder = create_output_folder(args.fasta, args.start_date, args.end_date)
-    print("Loading metadata...")
-    metadata = load_metadata(args.csv, args.date_col)
-    print(f"Creating subset based on time frame {args.start_date} to {args.end_date}...")
-    subset_time_frame = shrink_df_by_date(metadata, args.start_date, args.end_date, args.date_col)
-    del metadata
-    if args.separate:
-        print("Separating subset into 'random' and 'suspect' samples...")
-        subset_random, subset_suspect = separate_random_suspect(subset_time_frame)      
-    print("Loading sequences...")
-    sequences = load_sequences(args.fasta)
-    print(f"Creating output files in folder {output_folder}")
-    if args.separate:
-        csv_random = f"random.csv"
-        csv_suspect = f"suspect.csv"
-        subset_random.to_csv(f"{output_folder}{csv_random}", index=False)
-        subset_suspect.to_csv(f"{output_folder}{csv_suspect}", index=False)
-        print(f"New metadata file: {csv_random}")
-        print(f"New metadata file: {csv_suspect}")
-        fasta_random = f"random.fasta"
-        fasta_suspect = f"suspect.fasta"
-        create_sequence_subset_file(sequences, subset_random, fasta_random, output_folder, args.seq_id_col)
-        create_sequence_subset_file(sequences, subset_suspect, fasta_suspect, output_folder, args.seq_id_col)
-    else:
-        csv_subset = f"subset.csv"
-        subset_time_frame.to_csv(f"{output_folder}{csv_subset}", index=False)
-        print(f"New metadata file: {csv_subset}")
-        fasta_subset = f"subset.fasta"
-        create_sequence_subset_file(sequences, subset_time_frame, fasta_subset, output_folder, args.seq_id_col)
-        
\ No newline at end of file
+    windows = get_windows(args.windows, args.start_date, args.end_date, args.window_days)
+    if not windows:
+        arguments.error("provide a time period with --start_date and --end_date or --windows")
+    metrics = StageMetrics("create_data_subset")
+    print(f"Creating {len(windows)} subset(s) in the folder of {args.fasta}...")
+    outputs = SubsetOutputs(windows, args.fasta, read_metadata_header(args.csv), args.separate)
+    try:
+        print("Routing metadata...")
+        selected = route_metadata(args.csv, windows, outputs, args.date_col, args.seq_id_col, args.separate)
+        print("Routing sequences...")
+        records_in, records_out = route_sequences(args.fasta, selected, outputs)
+    finally:
+        outputs.close()
+
+    if args.metrics:
+        metrics.records_in, metrics.records_out = records_in, records_out
+        metrics.unique = len(selected)
+        metrics.extra["windows"] = len(windows)
+        metrics.read(args.csv, args.fasta)
+        metrics.wrote(*(path for paths in outputs.paths for path in paths))
+        metrics.write(args.metrics)
\ No newline at end of file
@@ -1,32 +1,25 @@
-from Bio import SeqIO
-import pandas as pd
 import argparse
+from coordinate_map import CoordinateMap, find_gene_in_genome, read_single_sequence
 
 
-def create_position_map_table(ref_from_msa_fn, pos_map_table_fn):
-    mapped_reference = SeqIO.read(ref_from_msa_fn, "fasta").seq
-    pos = 1
-    suffix = 1
-    pos_table = pd.DataFrame(columns=["reference", "msa"])
-    for i, base in enumerate(mapped_reference):
-        if base != "-": 
-            row = pd.DataFrame([[str(pos), i+1]],columns=["reference", "msa"])
-            pos_table = pd.concat([pos_table, pd.DataFrame(row, columns=["reference", "msa"])])
-            suffix = 1
-            pos += 1
+def create_position_map_table(ref_from_msa_fn, pos_map_table_fn, coordinate_map_fn=None, gene_reference_fn=None, genome_fn=None):
+    genome_start = -1
+    if gene_reference_fn and genome_fn:
+        genome_start = find_gene_in_genome(read_single_sequence(gene_reference_fn), read_single_sequence(genome_fn))
+    coordinate_map = CoordinateMap.from_mapped_reference(read_single_sequence(ref_from_msa_fn), genome_start)
 
-        else:
-            row = pd.DataFrame([[str(pos-1) + "." + str(suffix), i+1]],columns=["reference", "msa"])
-            pos_table = pd.concat([pos_table, pd.DataFrame(row, columns=["reference", "msa"])])
-            suffix += 1
-
-    pos_table.to_csv(pos_map_table_fn, sep="\t", index=False)
+    with open(pos_map_table_fn, "w") as pos_map_table:
+        coordinate_map.write_position_table(pos_map_table)
+    if coordinate_map_fn:
+        coordinate_map.save(coordinate_map_fn)
 
 if __name__ == "__main__":
     arguments = argparse.ArgumentParser(description='creates position table for convinient numbering of bases')
     arguments.add_argument('-r', '--ref_from_msa', type=str, help='Input FASTA file containing reference sequence mapped to MSA')
     arguments.add_argument('-p', '--pos_map_table', type=str, help='Output TSV file containing positions of reference and MSA')
+    arguments.add_argument('-m', '--coordinate_map', type=str, help='Output coordinate map (.npz) between MSA columns, reference codons and genome nucleotides')
+    arguments.add_argument('-n', '--gene_reference', type=str, help='Nucleotide FASTA file of the reference gene, used to locate the gene in the genome')
+    arguments.add_argument('-g', '--genome', type=str, help='FASTA file containing the reference genome')
     args = arguments.parse_args()
     
-    create_position_map_table(args.ref_from_msa, args.pos_map_table)
-
+    create_position_map_table(args.ref_from_msa, args.pos_map_table, args.coordinate_map, args.gene_reference, args.genome)
@@ -0,0 +1,180 @@
+import argparse
+import array
+import json
+import mmap
+import struct
+import sys
+
+
+# write duplicate clusters as {representative: {"0": id, "1": id, ...}} JSON
+# without building the nested dictionaries first; the output is identical to
+# json.dump(..., indent=4, sort_keys=True), so clusters have to be passed
+# sorted by representative
+def write_duplicates_json(output, clusters):
+    output.write("{")
+    first_cluster = True
+    for representative, members in clusters:
+        output.write("\n    " if first_cluster else ",\n    ")
+        first_cluster = False
+        output.write(json.dumps(representative) + ": ")
+        if not members:
+            output.write("{}")
+            continue
+        output.write("{")
+        keys = sorted(str(i) for i in range(len(members)))
+        output.write(",".join(f"\n        \"{k}\": {json.dumps(members[int(k)])}" for k in keys))
+        output.write("\n    }")
+    output.write("\n}" if not first_cluster else "}")
+
+
+# Compact binary duplicates store. All integers are little-endian int64:
+#   magic (8 bytes) | number of clusters C | number of IDs N | size of the ID string table S
+#   cluster offsets [C+1]  -> members of cluster c are IDs cluster_offsets[c]:cluster_offsets[c+1],
+#                             the first one is the representative
+#   cluster ids     [N]    -> cluster of every ID
+#   string offsets  [N+1]  -> ID i is strings[string_offsets[i]:string_offsets[i+1]] (UTF-8)
+#   strings         [S bytes]
+# The file is memory-mapped when loaded, so opening it does not depend on its size.
+DUPLICATES_MAGIC = b"PSDUPS01"
+
+
+# write (representative, [member IDs]) clusters into the binary store
+def write_duplicates_store(output, clusters):
+    cluster_offsets = array.array("q", [0])
+    cluster_ids = array.array("q")
+    string_offsets = array.array("q", [0])
+    strings = bytearray()
+    for cluster, (representative, members) in enumerate(clusters):
+        for name in members:
+            strings += name.encode()
+            string_offsets.append(len(strings))
+            cluster_ids.append(cluster)
+        cluster_offsets.append(len(cluster_ids))
+    for values in (cluster_offsets, cluster_ids, string_offsets):
+        if sys.byteorder != "little":
+            values.byteswap()
+    output.write(DUPLICATES_MAGIC)
+    output.write(struct.pack("<qqq", len(cluster_offsets) - 1, len(cluster_ids), len(strings)))
+    output.write(cluster_offsets.tobytes())
+    output.write(cluster_ids.tobytes())
+    output.write(string_offsets.tobytes())
+    output.write(strings)
+
+
+# read-only view of a binary duplicates store
+class DuplicatesStore:
+
+    def __init__(self, path):
+        with open(path, "rb") as handle:
+            self.buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:8] != DUPLICATES_MAGIC:
+            raise ValueError(f"{path} is not a duplicates store")
+        self.n_clusters, self.n_ids, n_strings = struct.unpack_from("<qqq", self.buffer, 8)
+        view = memoryview(self.buffer)
+        start = 32
+        self.cluster_offsets = view[start:start + 8*(self.n_clusters+1)].cast("q")
+        start += 8*(self.n_clusters+1)
+        self.cluster_ids = view[start:start + 8*self.n_ids].cast("q")
+        start += 8*self.n_ids
+        self.string_offsets = view[start:start + 8*(self.n_ids+1)].cast("q")
+        start += 8*(self.n_ids+1)
+        self.strings = view[start:start + n_strings]
+        self._lookup = None
+
+    def __len__(self):
+        return self.n_clusters
+
+    def name(self, i):
+        return str(self.strings[self.string_offsets[i]:self.string_offsets[i+1]], "utf-8")
+
+    def members(self, cluster):
+        return [self.name(i) for i in range(self.cluster_offsets[cluster], self.cluster_offsets[cluster+1])]
+
+    def representative(self, cluster):
+        return self.name(self.cluster_offsets[cluster])
+
+    def cluster_sizes(self):
+        return [self.cluster_offsets[c+1] - self.cluster_offsets[c] for c in range(self.n_clusters)]
+
+    def names(self):
+        return (self.name(i) for i in range(self.n_ids))
+
+    # cluster of an ID (the name -> ID lookup is built on first use)
+    def cluster_of(self, name):
+        if self._lookup is None:
+            self._lookup = {self.name(i): i for i in range(self.n_ids)}
+        return self.cluster_ids[self._lookup[name]]
+
+    def items(self):
+        for cluster in range(self.n_clusters):
+            members = self.members(cluster)
+            yield members[0], members
+
+    def as_dict(self):
+        return {representative: {str(i): name for i, name in enumerate(members)} for representative, members in self.items()}
+
+
+# duplicates JSON ({representative: {"0": id, ...}}) with the interface of DuplicatesStore
+class JsonDuplicates(DuplicatesStore):
+
+    def __init__(self, json_dict):
+        self.clusters = [(representative, [members[k] for k in sorted(members, key=int)]) for representative, members in json_dict.items()]
+        self.n_clusters = len(self.clusters)
+        self.n_ids = sum(len(members) for _, members in self.clusters)
+        self._lookup = None
+
+    def members(self, cluster):
+        return self.clusters[cluster][1]
+
+    def representative(self, cluster):
+        return self.clusters[cluster][0]
+
+    def cluster_sizes(self):
+        return [len(members) for _, members in self.clusters]
+
+    def names(self):
+        return (name for _, members in self.clusters for name in members)
+
+    def cluster_of(self, name):
+        if self._lookup is None:
+            self._lookup = {name: cluster for cluster, (_, members) in enumerate(self.clusters) for name in members}
+        return self._lookup[name]
+
+    def items(self):
+        return iter(self.clusters)
+
+
+# load duplicates from a path or an open file in either the binary or the JSON format;
+# HyPhy's non-standard inf tokens are not expected in duplicates files
+def load_duplicates(source):
+    path = source if isinstance(source, str) else source.name
+    with open(path, "rb") as handle:
+        magic = handle.read(len(DUPLICATES_MAGIC))
+    if magic == DUPLICATES_MAGIC:
+        return DuplicatesStore(path)
+    with open(path, "r") as handle:
+        try:
+            return JsonDuplicates(json.load(handle))
+        except json.JSONDecodeError:
+            return JsonDuplicates({})
+
+
+# write clusters sorted by representative, as JSON if the path ends with .json
+# and into the binary store otherwise
+def write_duplicates(path, clusters):
+    clusters = sorted(clusters, key=lambda x: x[0])
+    if path.endswith(".json"):
+        with open(path, "w") as output:
+            write_duplicates_json(output, clusters)
+    else:
+        with open(path, "wb") as output:
+            write_duplicates_store(output, clusters)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Convert duplicates between the binary store and the JSON format (chosen by the output file extension)')
+    arguments.add_argument('-i', '--input', help = 'duplicates file in the binary or the JSON format', required = True, type = str)
+    arguments.add_argument('-o', '--output', help = 'output duplicates file, written as JSON if it ends with .json', required = True, type = str)
+    args = arguments.parse_args()
+
+    write_duplicates(args.output, load_duplicates(args.input).items())
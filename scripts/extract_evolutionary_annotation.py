@@ -24,6 +24,8 @@ import os
 import math
 from   os import  path
 from   Bio import SeqIO
+from   coordinate_map import aligned_to_ungapped
+import numpy as np
 import operator
 
 
@@ -63,16 +65,9 @@ for seq_record in SeqIO.parse(import_settings.coordinates, "fasta"):
     seq_id   = seq_record.description
     ref_seq = str(seq_record.seq)
     ref_seq_id = seq_id.upper().upper()
-    i = 0
-    c = 0
-    ref_seq_map = {}
-    while i < len (ref_seq):
-        #ref_seq_map.append (c)
-        if ref_seq[i:i+3] != '---':
-            ref_seq_map[c] = ref_seq_p
-            ref_seq_p += 1
-        c += 1
-        i+=3
+    codon_map = aligned_to_ungapped(ref_seq, 3)
+    ungapped = np.flatnonzero(codon_map >= 0)
+    ref_seq_map = dict(zip(ungapped.tolist(), (ref_seq_p + codon_map[ungapped]).tolist()))
     break
         
 for k in prime["tested"]["0"]:
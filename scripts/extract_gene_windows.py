@@ -0,0 +1,52 @@
+import argparse
+import json
+from contextlib import ExitStack
+from fasta_io import iter_fasta, open_fasta, write_fasta_record
+from stage_metrics import StageMetrics
+
+
+# get the padded window (0-based, inclusive) of every requested gene
+def get_gene_windows(intervals_handle, genes):
+    intervals = json.load(intervals_handle)
+    windows = {}
+    for gene in genes:
+        windows[gene] = (intervals[gene]["trim_from"], intervals[gene]["trim_to"])
+    return windows
+
+
+# read the genomes once and write the window of every gene for each record
+def extract_gene_windows(sequences_handle, windows, output_suffix):
+    with ExitStack() as stack:
+        outputs = {gene: stack.enter_context(open(gene + output_suffix, "w")) for gene in windows}
+        records = 0
+        for header, sequence in iter_fasta(sequences_handle):
+            for gene, (trim_from, trim_to) in windows.items():
+                write_fasta_record(outputs[gene], header, sequence[trim_from:trim_to+1], width=0)
+            records += 1
+    return records
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Cut the padded gene windows out of all genomes in a single pass over the sequences')
+    arguments.add_argument('-i', '--input', required=True, help = 'FASTA file containing the genome sequences, optionally gzip/BGZF/zstd compressed ("-" for stdin)', type = str, metavar="PATH")
+    arguments.add_argument('-w', '--intervals', required=True, help = 'JSON file containing the padded gene intervals (trim_from, trim_to)', type = argparse.FileType('r'))
+    arguments.add_argument('-g', '--genes', required=True, help = 'List of genes to extract windows for', type = str, nargs='+')
+    arguments.add_argument('-t', '--threads', required=False, help = 'Number of threads used to decompress the input [default: 1]', default = 1, type = int)
+    arguments.add_argument('-s', '--suffix', required=False, help = 'Suffix of the window FASTA files written per gene [default: _window.fas]', default = "_window.fas", type = str)
+    arguments.add_argument('-m', '--metrics', required=False, help = 'Write the performance metrics of the stage (JSON) here', type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("extract_gene_windows")
+
+    windows = get_gene_windows(args.intervals, args.genes)
+    with open_fasta(args.input, args.threads) as sequences_handle:
+        records = extract_gene_windows(sequences_handle, windows, args.suffix)
+    print(f"Extracted {len(windows)} gene windows from {records} sequences")
+
+    if args.metrics:
+        metrics.records_in = records
+        metrics.records_out = records * len(windows)
+        metrics.extra["genes"] = list(windows)
+        metrics.read(args.input)
+        metrics.wrote(*[gene + args.suffix for gene in windows])
+        metrics.write(args.metrics)
@@ -0,0 +1,244 @@
+import argparse
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import sys
+
+
+# iterate over the records of a FASTA file as (header, sequence) tuples
+# without holding more than one record in memory
+def iter_fasta(handle):
+    header = None
+    lines = []
+    for line in handle:
+        if line.startswith(">"):
+            if header is not None:
+                yield header, "".join(lines)
+            header = line[1:].rstrip("\r\n")
+            lines = []
+        elif header is not None:
+            lines.append(line.strip())
+    if header is not None:
+        yield header, "".join(lines)
+
+
+# get the sequence identifier (first word) of a FASTA header
+def record_name(header):
+    return header.split(None, 1)[0] if header.strip() else header
+
+
+# write a single FASTA record, wrapping the sequence after width characters
+def write_fasta_record(output, header, sequence, width=60):
+    output.write(f">{header}\n")
+    if width:
+        for i in range(0, len(sequence), width):
+            output.write(f"{sequence[i:i + width]}\n")
+    else:
+        output.write(f"{sequence}\n")
+
+
+# open a FASTA path for reading, "-" refers to stdin; compressed files are
+# decompressed on the fly
+def open_fasta(path, threads=1):
+    if path == "-":
+        return sys.stdin
+    return open_input(path, threads)
+
+
+# detect the compression of a file from its magic bytes (gzip, bgzf, zstd or None)
+def detect_compression(path):
+    with open(path, "rb") as handle:
+        magic = handle.read(18)
+    if magic[:2] == b"\x1f\x8b":
+        # BGZF is gzip with a "BC" extra subfield in every block header
+        if len(magic) >= 14 and magic[3] & 4 and magic[12:14] == b"BC":
+            return "bgzf"
+        return "gzip"
+    if magic[:4] == b"\x28\xb5\x2f\xfd":
+        return "zstd"
+    return None
+
+
+# text stream over the stdout of a decompression command, the command is
+# waited for and checked when the stream is closed
+class _ProcessReader(io.TextIOWrapper):
+
+    def __init__(self, command):
+        self.command = command
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE)
+        super().__init__(self.process.stdout)
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        returncode = self.process.wait()
+        if returncode not in (0, -13):  # -13: SIGPIPE when the reader stopped early
+            raise OSError(f"Decompression failed ({' '.join(self.command)}) with exit code {returncode}")
+
+
+# open a plain, gzip, BGZF or zstd compressed file as a text stream; the
+# decompression is streamed and runs in parallel through bgzip/pigz/zstd if
+# they are installed, otherwise the python modules are used
+def open_input(path, threads=1):
+    compression = detect_compression(path)
+    threads = str(max(1, threads))
+    if compression is None:
+        return open(path, "r")
+    if compression == "bgzf" and shutil.which("bgzip"):
+        return _ProcessReader(["bgzip", "-dc", "-@", threads, path])
+    if compression in ("gzip", "bgzf"):
+        if shutil.which("pigz"):
+            return _ProcessReader(["pigz", "-dc", "-p", threads, path])
+        return gzip.open(path, "rt")
+    if shutil.which("zstd"):
+        return _ProcessReader(["zstd", "-dcq", "-T" + threads, path])
+    try:
+        import zstandard
+    except ImportError:
+        sys.exit(f"Cannot read {path}: zstd compressed input requires the zstd command or the zstandard module")
+    return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+
+
+# path of the .fai-style offset index stored next to a FASTA file
+def index_path_for(path):
+    return path + ".fai"
+
+
+# build a samtools-style .fai index (name, length, offset, line bases, line width)
+# in a single streaming pass; records with irregular line lengths get 0/0 line
+# geometry and are read up to the next header instead
+def build_fasta_index(path, index_path=None):
+    index_path = index_path or index_path_for(path)
+    with open(path, "rb") as fasta, open(index_path, "w") as index:
+        offset = 0
+        record = None
+        for line in fasta:
+            if line.startswith(b">"):
+                if record is not None:
+                    _write_index_entry(index, record)
+                name = line[1:].decode().split(None, 1)
+                record = {"name": name[0] if name else "", "offset": offset + len(line), "length": 0,
+                          "linebases": 0, "linewidth": 0, "regular": True, "last": None}
+            elif record is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if bases == 0 or (record["last"] is not None and record["last"] != record["linebases"]):
+                    record["regular"] = False  # only the last line of a record may be shorter
+                if record["linebases"] == 0:
+                    record["linebases"] = bases
+                    record["linewidth"] = len(line)
+                elif bases > record["linebases"] or (bases == record["linebases"] and len(line) != record["linewidth"]):
+                    record["regular"] = False
+                record["length"] += bases
+                record["last"] = bases
+            offset += len(line)
+        if record is not None:
+            _write_index_entry(index, record)
+    return index_path
+
+
+def _write_index_entry(index, record):
+    linebases, linewidth = (record["linebases"], record["linewidth"]) if record["regular"] else (0, 0)
+    index.write(f"{record['name']}\t{record['length']}\t{record['offset']}\t{linebases}\t{linewidth}\n")
+
+
+# random access to the records of a FASTA file through its .fai index
+class FastaIndex:
+
+    # load the index (only the entries for names, if given), building it if it
+    # is missing or older than the FASTA file; if the directory of the FASTA file
+    # is not writable the index is built in the working directory instead
+    def __init__(self, path, names=None):
+        if detect_compression(path):
+            raise ValueError(f"Cannot index the compressed file {path}, stream it with open_input instead")
+        self.path = path
+        self.index_path = self._get_index(path)
+        wanted = set(names) if names is not None else None
+        self.entries = {}
+        with open(self.index_path) as index:
+            for line in index:
+                name, length, offset, linebases, linewidth = line.rstrip("\n").split("\t")
+                if wanted is None or name in wanted:
+                    self.entries[name] = (int(length), int(offset), int(linebases), int(linewidth))
+        self.handle = open(path, "rb")
+
+    @staticmethod
+    def _get_index(path):
+        candidates = [index_path_for(path), os.path.basename(index_path_for(path))]
+        for candidate in candidates:
+            if os.path.exists(candidate) and os.path.getmtime(candidate) >= os.path.getmtime(path):
+                return candidate
+        for candidate in candidates:
+            try:
+                return build_fasta_index(path, candidate)
+            except OSError:
+                continue
+        raise OSError(f"Cannot write a FASTA index for {path}")
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        return self.entries.keys()
+
+    def close(self):
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # get the full sequence of a record
+    def fetch(self, name):
+        length, offset, linebases, linewidth = self.entries[name]
+        self.handle.seek(offset)
+        if linebases:
+            raw = self.handle.read((length // linebases) * linewidth + length % linebases)
+            return raw.replace(b"\n", b"").replace(b"\r", b"").decode()
+        lines = []
+        for line in self.handle:
+            if line.startswith(b">"):
+                break
+            lines.append(line.strip())
+        return b"".join(lines).decode()
+
+    # get several records as (name, sequence) tuples, skipping unknown names;
+    # with sort_by_offset the file is read front to back instead of in the given order
+    def fetch_many(self, names, sort_by_offset=False):
+        names = [name for name in names if name in self.entries]
+        if sort_by_offset:
+            names.sort(key=lambda name: self.entries[name][1])
+        for name in names:
+            yield name, self.fetch(name)
+
+    # get the residues at the given 1-based positions of a record without
+    # reading the rest of the sequence (if the record has regular line lengths)
+    def fetch_positions(self, name, positions):
+        length, offset, linebases, linewidth = self.entries[name]
+        if not linebases:
+            sequence = self.fetch(name)
+            return [sequence[p-1] if 0 < p <= length else None for p in positions]
+        residues = []
+        for p in positions:
+            if 0 < p <= length:
+                self.handle.seek(offset + ((p-1) // linebases) * linewidth + (p-1) % linebases)
+                residues.append(self.handle.read(1).decode())
+            else:
+                residues.append(None)
+        return residues
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Build .fai offset indices for FASTA files')
+    arguments.add_argument('fasta', help = 'FASTA file(s) to index', type = str, nargs='+')
+    args = arguments.parse_args()
+
+    for path in args.fasta:
+        print("New index file:", build_fasta_index(path))
@@ -2,46 +2,53 @@ import json
 import argparse
 import itertools
 import shutil
-
-arguments = argparse.ArgumentParser(description='')
-arguments.add_argument('-d', '--duplicates',   help = 'fasta to filter duplicates', required = True, type = argparse.FileType('r'))
-arguments.add_argument('-m', '--map', help='output map to old sequence names', type=argparse.FileType('w'), default=None)
-arguments.add_argument('-o', '--overwrite', help='overwrite duplicate file, otherwise write to stdout', action='store_true')
-args = arguments.parse_args()
+from duplicates_io import DuplicatesStore, load_duplicates, write_duplicates
 
 # If one fails, then copy the other to the output. If both fail, then throw an error
 def fix(k,v):
     old_key = k
     # chop off everything after null
     chopped_seq_name = list(itertools.takewhile(lambda x: x != 'null', k.split('_')))
-    new_key = '_'.join(chopped_seq_name) + '_null_' + str(len(v.values()))
+    new_key = '_'.join(chopped_seq_name) + '_null_' + str(len(v))
     transform = lambda x: x if x != old_key else new_key
-    new_vals = {k: transform(v) for k,v in v.items()}
+    new_vals = [transform(x) for x in v]
     return (new_key, new_vals, old_key)
 
-dupe_json = json.load(args.duplicates)
+# rename the representatives of all clusters, returns the fixed clusters and the map to the old names
+def fix_duplicates(dupes):
+    itemize = list(map(lambda x: fix(*x), dupes))
+    output_dupes = [(item[0], item[1]) for item in itemize]
+    old_name_map = {item[2]: item[0] for item in itemize}
+    return output_dupes, old_name_map
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='')
+    arguments.add_argument('-d', '--duplicates',   help = 'duplicates file (binary duplicates store or JSON)', required = True, type = str)
+    arguments.add_argument('-m', '--map', help='output map to old sequence names', type=argparse.FileType('w'), default=None)
+    arguments.add_argument('-o', '--overwrite', help='overwrite duplicate file, otherwise write to stdout', action='store_true')
+    args = arguments.parse_args()
 
-itemize = list(map(lambda x: fix(*x), dupe_json.items()))
-output_json = {item[0]: item[1] for item in itemize}
-old_name_map = {item[2]: item[0] for item in itemize}
+    dupes = load_duplicates(args.duplicates)
+    is_store = type(dupes) is DuplicatesStore
 
-# Overwrite files
-orig_fn = args.duplicates.name
-args.duplicates.close()
+    output_dupes, old_name_map = fix_duplicates(dupes.items())
+    del dupes
 
-tmp_fn = orig_fn + '.tmp'
+    # Overwrite files
+    orig_fn = args.duplicates
 
-if args.map:
-    json.dump(old_name_map, args.map, indent=4, sort_keys=True)
+    # keep the format of the input file
+    tmp_fn = orig_fn + '.tmp' + ('' if is_store else '.json')
 
-if args.overwrite:
+    if args.map:
+        json.dump(old_name_map, args.map, indent=4, sort_keys=True)
 
-    # Fix FASTA headers
-    with open(tmp_fn, 'w') as tmp_fp:
-        json.dump(output_json, tmp_fp, indent=4, sort_keys=True)
+    if args.overwrite:
 
-    shutil.move(tmp_fn, orig_fn)
+        # Fix FASTA headers
+        write_duplicates(tmp_fn, output_dupes)
 
-else:
-    print(output_json)
+        shutil.move(tmp_fn, orig_fn)
 
+    else:
+        print({k: {str(i): x for i, x in enumerate(v)} for k, v in output_dupes})
@@ -1,63 +1,83 @@
 import json
 import sys
 import argparse
-import copy
+from duplicates_io import load_duplicates, write_duplicates
+from fix_duplicates import fix_duplicates
+from update_fasta_duplicates import rename_fasta_records
+from stage_metrics import StageMetrics
 
-arguments = argparse.ArgumentParser(description='Merge duplicates from post-msa and prior')
-arguments.add_argument('-p', '--protein-duplicates',   help = 'fasta to filter duplicates', required = True, type = argparse.FileType('r'))
-arguments.add_argument('-n', '--nuc-duplicates',   help = 'duplicates file', required = True, type = argparse.FileType('r'))
-arguments.add_argument('-o', '--output', help = 'write compressed fasta here', type = argparse.FileType('w'), default = sys.stdout)
-args = arguments.parse_args()
+# Trim sequence names to the part shared by pre-MSA and post-MSA names
+def trim_name(name):
+    return '_'.join(name.split('_')[:3])
 
 # If one fails, then copy the other to the output. If both fail, then throw an error
-def merge(protein_json, nuc_json):
-    # For each key in nuc_json, get all values. If one of the values is in protein duplicates, then merge all values in the protein duplicate to nucleotide keys, and remove values from protein duplicates.
-
-    # Get all keys for nuc_json
-    protein_vals = [list(values.values()) for values in protein_json.values()]
-    new_nuc_json = copy.deepcopy(nuc_json)
-
-    # For each nuc_json, get intersection, if matches, take protein seqs and place them in key and remove
-    for k, v in nuc_json.items():
-        nuc_seq_names = ['_'.join(x.split('_')[:3]) for x in v.values()]
-
-        for prot_vals in protein_vals:
-            prot_vals_trim = ['_'.join(x.split('_')[:3]) for x in prot_vals]
-            prot_vals_trim_dict = {'_'.join(x.split('_')[:3]) : x for x in prot_vals}
-
-            # Need to collect *all* nuc_seq_names and intersect with prot_vals_trim
-            if(set(nuc_seq_names).intersection(set(prot_vals_trim))):
-                # Add copy number count
-                if(len(set(prot_vals_trim))):
-                    # Get difference between nuc_seq_names and prot_vals, then add diff to nuc_seq
-                    difference = set(prot_vals_trim).difference(set(nuc_seq_names))
-                    # Get greatest number in nuc_json, and increment from there
-                    cnt = max(int(x) for x in new_nuc_json[k].keys()) + 1
-                    for x in difference:
-                        # Update dictionary if it exists
-                        new_nuc_json[k][str(cnt)] = prot_vals_trim_dict[x]
-                        cnt+=1
+def merge(protein_dups, nuc_dups):
+    # For each key in nuc_json, get all values. If one of the values is in protein duplicates, then merge all values in the protein duplicate to nucleotide keys.
+
+    # Index every trimmed protein duplicate name to the clusters it occurs in once,
+    # instead of scanning all protein clusters for every nucleotide cluster
+    protein_vals = [members for _, members in protein_dups.items()]
+    trimmed_index = {}
+    for cluster, prot_vals in enumerate(protein_vals):
+        for x in prot_vals:
+            trimmed_index.setdefault(trim_name(x), []).append(cluster)
+
+    new_nuc_dups = []
+    for k, v in nuc_dups.items():
+        members = list(v)
+        nuc_seq_names = set(trim_name(x) for x in v)
+        # protein clusters that intersect with this nucleotide cluster, in their original order
+        clusters = sorted(set(cluster for name in nuc_seq_names for cluster in trimmed_index.get(name, ())))
+        for cluster in clusters:
+            prot_vals_trim_dict = {trim_name(x) : x for x in protein_vals[cluster]}
+            # Add the protein duplicates that are not yet part of the nucleotide cluster
+            for x in prot_vals_trim_dict:
+                if x not in nuc_seq_names:
+                    members.append(prot_vals_trim_dict[x])
+        new_nuc_dups.append((k, members))
 
     # Validate that all duplicates count up to original sequence count
-    return new_nuc_json
-
-try:
-    protein_json = json.load(args.protein_duplicates)
-except:
-    protein_json = False
-
-try:
-    nuc_json = json.load(args.nuc_duplicates)
-except:
-    nuc_json = False
-
-if not protein_json and not nuc_json:
-    output_json = {}
-elif not protein_json:
-    output_json = nuc_json
-elif not nuc_json:
-    output_json = protein_json
-else:
-    output_json = merge(protein_json, nuc_json)
-
-json.dump(output_json, args.output, indent=4, sort_keys=True)
+    return new_nuc_dups
+
+# merge the duplicates, or copy one of them if the other one is empty
+def merge_duplicates(protein_dups, nuc_dups):
+    if not len(protein_dups):
+        return list(nuc_dups.items())
+    elif not len(nuc_dups):
+        return list(protein_dups.items())
+    return merge(protein_dups, nuc_dups)
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Merge duplicates from post-msa and prior')
+    arguments.add_argument('-p', '--protein-duplicates',   help = 'duplicates from before the MSA (binary duplicates store or JSON)', required = True, type = str)
+    arguments.add_argument('-n', '--nuc-duplicates',   help = 'duplicates from post-msa (binary duplicates store or JSON)', required = True, type = str)
+    arguments.add_argument('-o', '--output', help = 'write merged duplicates here (JSON if it ends with .json, binary duplicates store otherwise)', required = True, type = str)
+    arguments.add_argument('-f', '--msa', help = 'compressed nucleotide MSA; if given, the merged duplicates are fixed and the MSA headers renamed in the same run', type = argparse.FileType('r'))
+    arguments.add_argument('-a', '--msa-output', help = 'write the MSA with renamed headers here (requires --msa)', type = argparse.FileType('w'))
+    arguments.add_argument('-m', '--map', help = 'output map to old sequence names (requires --msa)', type = argparse.FileType('w'))
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+    if args.msa and not args.msa_output:
+        arguments.error("--msa requires --msa-output")
+    if not args.msa and (args.msa_output or args.map):
+        arguments.error("--msa-output and --map require --msa")
+
+    metrics = StageMetrics("merge_duplicates")
+    output_dups = merge_duplicates(load_duplicates(args.protein_duplicates), load_duplicates(args.nuc_duplicates))
+
+    if args.msa:
+        # fix the duplicate names and rename the MSA headers in place of fix_duplicates.py and update_fasta_duplicates.py
+        output_dups, name_map = fix_duplicates(output_dups)
+        if args.map:
+            json.dump(name_map, args.map, indent=4, sort_keys=True)
+        rename_fasta_records(args.msa, args.msa_output, name_map)
+        args.msa_output.close()
+
+    write_duplicates(args.output, output_dups)
+
+    if args.metrics:
+        metrics.records_in = metrics.records_out = metrics.unique = len(output_dups)
+        metrics.total = sum(len(members) for _, members in output_dups)
+        metrics.read(args.protein_duplicates, args.nuc_duplicates, args.msa.name if args.msa else None)
+        metrics.wrote(args.output, args.msa_output.name if args.msa_output else None)
+        metrics.write(args.metrics)
@@ -0,0 +1,116 @@
+import argparse
+import json
+import re
+from subfuctions import load_json_file
+from stage_metrics import StageMetrics
+
+
+# index of a block from its file name (<prefix>_block_<n>...)
+def block_index(path):
+    match = re.search(r"_block_(\d+)", path)
+    if match is None:
+        raise ValueError(f"Cannot determine the block index of {path}")
+    return int(match.group(1))
+
+
+# load the HyPhy result of a block
+def load_block(path):
+    with open(path) as handle:
+        return load_json_file(handle)
+
+
+# attribute keys that name a site, e.g. "EBF site 12"
+SITE_KEY = re.compile(r"^(.* site )(\d+)$")
+
+
+# a list with one scalar per site
+def is_site_vector(value, n_sites):
+    return isinstance(value, list) and len(value) == n_sites and not any(isinstance(x, (list, dict)) for x in value)
+
+
+# a list of rows that each have one value per site, e.g. the posteriors of the rate classes by site
+def is_site_matrix(value, n_sites):
+    return isinstance(value, list) and len(value) > 0 and all(isinstance(row, list) and len(row) == n_sites for row in value)
+
+
+# merge a value of the next block into the merged value of the blocks before it:
+# values by site are concatenated and keys that name a site are shifted to global
+# site indices; values that do not depend on the sites are kept from the first block
+def merge_site_values(merged, value, offset, n_sites):
+    if isinstance(merged, dict) and isinstance(value, dict):
+        for key, item in value.items():
+            match = SITE_KEY.match(key)
+            if match is not None:
+                merged[f"{match.group(1)}{int(match.group(2)) + offset}"] = item
+            elif key in merged:
+                merged[key] = merge_site_values(merged[key], item, offset, n_sites)
+            else:
+                merged[key] = item
+    elif is_site_vector(merged, offset) and is_site_vector(value, n_sites):
+        merged.extend(value)
+    elif is_site_matrix(merged, offset) and is_site_matrix(value, n_sites) and len(merged) == len(value):
+        for merged_row, row in zip(merged, value):
+            merged_row.extend(row)
+    return merged
+
+
+# merge the HyPhy results (FEL, MEME) of consecutive site blocks into the result of
+# the full alignment. The site-indexed sections are merged:
+#   MLE.content             the site rows are concatenated
+#   other MLE members       values by site are concatenated
+#   data partitions         the site coverage is shifted to global site indices
+#   branch attributes       values by site (e.g. MEME's posteriors by site) are concatenated
+#                           and attributes that name a site (e.g. "EBF site 12") are re-indexed
+#   input.number of sites   the sum of the blocks
+#   timers                  the sum of the blocks
+# Everything that does not depend on the sites (analysis, tree, fits of the shared
+# model, tested branches) is taken from the first block.
+def merge_site_blocks(blocks):
+    merged = None
+    offset = 0
+    for block in blocks:
+        n_sites = block["input"]["number of sites"]
+        if merged is None:
+            merged = block
+        else:
+            for partition, rows in block["MLE"]["content"].items():
+                merged["MLE"]["content"].setdefault(partition, []).extend(rows)
+            for key, value in block["MLE"].items():
+                if key not in ("headers", "content"):
+                    merged["MLE"][key] = merge_site_values(merged["MLE"].get(key, {}), value, offset, n_sites)
+            for partition, info in block.get("data partitions", {}).items():
+                coverage = [[site + offset for site in sites] for sites in info["coverage"]]
+                merged_info = merged["data partitions"].setdefault(partition, {"name": info.get("name"), "coverage": [[] for _ in coverage]})
+                for merged_sites, sites in zip(merged_info["coverage"], coverage):
+                    merged_sites.extend(sites)
+            if "branch attributes" in block:
+                merged["branch attributes"] = merge_site_values(merged.get("branch attributes", {}), block["branch attributes"], offset, n_sites)
+            for step, timer in block.get("timers", {}).items():
+                if step in merged.get("timers", {}) and "timer" in timer:
+                    merged["timers"][step]["timer"] += timer["timer"]
+            merged["input"]["number of sites"] += n_sites
+        offset += n_sites
+    return merged
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Merge the HyPhy results of site blocks into one result with global site indices')
+    arguments.add_argument('-i', '--input', help = 'JSON results of the blocks (<prefix>_block_<n>...)', required = True, type = str, nargs='+')
+    arguments.add_argument('-o', '--output', help = 'merged JSON result', required = True, type = argparse.FileType('w'))
+    arguments.add_argument('-m', '--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("merge_site_blocks")
+    paths = sorted(args.input, key=block_index)
+    merged = merge_site_blocks(load_block(path) for path in paths)
+    json.dump(merged, args.output, indent=1)
+
+    if args.metrics:
+        args.output.close()
+        metrics.records_in = len(paths)
+        metrics.records_out = 1
+        metrics.extra["blocks"] = len(paths)
+        metrics.extra["sites"] = merged["input"]["number of sites"]
+        metrics.read(*paths)
+        metrics.wrote(args.output.name)
+        metrics.write(args.metrics)
@@ -1,14 +1,62 @@
 import argparse
+import csv
+import json
 import os
-from subfuctions import load_json_file
-from Bio import Phylo
-from Bio.Phylo.PAML import codeml
+from duplicates_io import load_duplicates
 
-def analyze_duplicates(duplicates_json):
+# per-gene processes of the analysis and the processes they wait for; tasks without a
+# gene (tag) are shared by all genes
+PROCESS_DEPENDENCIES = {
+    "SELECT_NEW_SEQUENCES": [],
+    "EXTRACT_GENE_WINDOWS": ["SELECT_NEW_SEQUENCES"],
+    "EXTRACT_GENE": ["EXTRACT_GENE_WINDOWS"],
+    "COMPRESS_DUPLICATES": ["EXTRACT_GENE"],
+    "UPDATE_CLUSTERS": ["COMPRESS_DUPLICATES"],
+    "CREATE_PROTEIN_MSA": ["COMPRESS_DUPLICATES"],
+    "ADD_TO_PROTEIN_MSA": ["UPDATE_CLUSTERS"],
+    "CREATE_NUC_MSA": ["CREATE_PROTEIN_MSA", "ADD_TO_PROTEIN_MSA"],
+    "MERGE_DUPLICATES": ["CREATE_NUC_MSA"],
+    "FILTER_NUC_MSA": ["MERGE_DUPLICATES"],
+    "COUNT_RESIDUES": ["CREATE_PROTEIN_MSA", "ADD_TO_PROTEIN_MSA", "UPDATE_CLUSTERS"],
+    "MEASURE_ALIGNMENT": ["FILTER_NUC_MSA"],
+    "BUILD_TREE": ["MEASURE_ALIGNMENT"],
+    "FIT_GLOBAL_MODEL": ["BUILD_TREE"],
+    "SLAC_ANALYSIS": ["FIT_GLOBAL_MODEL"],
+    "FEL_ANALYSIS": ["FIT_GLOBAL_MODEL"],
+    "MEME_ANALYSIS": ["FIT_GLOBAL_MODEL"],
+    "FUBAR_ANALYSIS": ["FIT_GLOBAL_MODEL"],
+    "SPLIT_CODON_ALIGNMENT": ["FIT_GLOBAL_MODEL"],
+    "FEL_BLOCK_ANALYSIS": ["SPLIT_CODON_ALIGNMENT"],
+    "MEME_BLOCK_ANALYSIS": ["SPLIT_CODON_ALIGNMENT"],
+    "MERGE_FEL_BLOCKS": ["FEL_BLOCK_ANALYSIS"],
+    "MERGE_MEME_BLOCKS": ["MEME_BLOCK_ANALYSIS"],
+    "CONVERT_SLAC_RESULTS": ["SLAC_ANALYSIS", "CREATE_PROTEIN_MSA", "ADD_TO_PROTEIN_MSA"],
+    "CONVERT_FEL_RESULTS": ["FEL_ANALYSIS", "MERGE_FEL_BLOCKS", "CREATE_PROTEIN_MSA", "ADD_TO_PROTEIN_MSA"],
+    "CONVERT_MEME_RESULTS": ["MEME_ANALYSIS", "MERGE_MEME_BLOCKS", "CREATE_PROTEIN_MSA", "ADD_TO_PROTEIN_MSA"],
+    "CONVERT_FUBAR_RESULTS": ["FUBAR_ANALYSIS", "CREATE_PROTEIN_MSA", "ADD_TO_PROTEIN_MSA"],
+    "SELECT_SITES_UNDER_PS": ["CONVERT_SLAC_RESULTS", "CONVERT_FEL_RESULTS", "CONVERT_MEME_RESULTS", "CONVERT_FUBAR_RESULTS"],
+    "VISUALIZE_PS_GENOMEWIDE": ["SELECT_SITES_UNDER_PS"],
+    "VISUALIZE_RESULTS": ["CONVERT_FEL_RESULTS"],
+    "BUILD_RESULTS_SITE": ["VISUALIZE_RESULTS"],
+    "PIPELINE_REPORT": ["COUNT_RESIDUES", "VISUALIZE_RESULTS", "VISUALIZE_PS_GENOMEWIDE", "BUILD_RESULTS_SITE"],
+}
+# steps of the sequence-attrition funnel: (label, stage of the metrics record, field)
+FUNNEL = [
+    ("input sequences", "extract_gene_windows", "records_in"),
+    ("new sequences (incremental)", "select_new_sequences", "records_out"),
+    ("extracted genes", "extract_gene", "records_out"),
+    ("unique proteins", "compress_duplicates", "unique_proteins"),
+    ("unique haplotypes", "compress_duplicates", "unique"),
+    ("unique haplotypes incl. stored", "update_clusters", "unique"),
+    ("aligned haplotypes", "nuc_msa", "records_out"),
+    ("filtered haplotypes", "filter_nuc_msa", "records_out"),
+]
+
+
+def analyze_duplicates(duplicates):
     number_of_duplicates = 0
     max_identical_seqs = 0
-    for seq in duplicates_json:
-        dups = len(duplicates_json[seq].keys())
+    for dups in duplicates.cluster_sizes():
         number_of_duplicates += dups if dups > 1 else 0
         max_identical_seqs = dups if dups > max_identical_seqs else max_identical_seqs
     return number_of_duplicates, max_identical_seqs
@@ -27,25 +75,169 @@ def convert_to_relative_path(path, root_dir):
 #     cml.run(verbose=True)
 
 #TODO Give statistics for phylogenetic tree
-#TODO Give statistics for filtered samples (low frequency variants, n-content, ...)
 
-def create_report(number_of_duplicates, max_identical_seqs, output_path):
+# gene of a per-gene file (<gene>_...), None for run-level files
+def gene_of_file(path, genes):
+    name = os.path.basename(path)
+    matches = [gene for gene in genes if name.startswith(gene + "_")]
+    return max(matches, key=len) if matches else None
+
+# metrics records by gene (None for the run-level stages) and stage; the stage is taken
+# from the file name <gene>_<stage>_metrics.json, which also tells apart the FEL and MEME merges
+def load_metrics(paths, genes):
+    metrics = {}
+    for path in paths:
+        with open(path) as handle:
+            record = json.load(handle)
+        gene = record.get("gene") or gene_of_file(path, genes)
+        name = os.path.basename(path)[len(gene) + 1 if gene else 0:]
+        stage = name[:-len("_metrics.json")] if name.endswith("_metrics.json") else record["stage"]
+        metrics.setdefault(gene, {})[stage] = dict(record, stage=stage)
+    return metrics
+
+# completed tasks of a raw Nextflow trace (realtime in ms, peak_rss in bytes)
+def load_trace(path):
+    if not path or not os.path.exists(path):
+        return []
+    tasks = []
+    with open(path) as handle:
+        for task in csv.DictReader(handle, delimiter="\t"):
+            if task.get("status") not in ("COMPLETED", "CACHED"):
+                continue
+            try:
+                realtime = float(task["realtime"]) / 1000
+                peak_rss = float(task["peak_rss"]) / 1024**2
+            except (KeyError, ValueError):
+                realtime, peak_rss = 0.0, 0.0
+            tasks.append({"process": task["name"].split(" (")[0], "gene": task.get("tag") if task.get("tag") not in (None, "", "-") else None, "status": task["status"],
+                          "wall_seconds": realtime if task["status"] == "COMPLETED" else 0.0, "peak_rss_mb": peak_rss})
+    return tasks
+
+# wall time of every process per gene; parallel tasks of a process (site blocks) count with the longest one
+def process_times(tasks):
+    times = {}
+    for task in tasks:
+        key = (task["process"], task["gene"])
+        times[key] = max(times.get(key, 0.0), task["wall_seconds"])
+    return times
+
+# longest chain of dependent processes, as (total seconds, [(process, gene, seconds)])
+def critical_path(times, genes):
+    best = (0.0, [])
+    for gene in genes:
+        finish = {}
+        def finish_of(process):
+            if process not in finish:
+                seconds = times.get((process, gene), times.get((process, None)))
+                previous = max((finish_of(dependency) for dependency in PROCESS_DEPENDENCIES.get(process, [])), key=lambda x: x[0], default=(0.0, []))
+                if seconds is None:
+                    finish[process] = previous
+                else:
+                    finish[process] = (previous[0] + seconds, previous[1] + [(process, gene if (process, gene) in times else None, seconds)])
+            return finish[process]
+        for process in PROCESS_DEPENDENCIES:
+            best = max(best, finish_of(process), key=lambda x: x[0])
+    return best
+
+# sequence counts along the funnel, steps without a metrics record are left out
+def attrition_funnel(gene_metrics, run_metrics):
+    funnel = []
+    for label, stage, field in FUNNEL:
+        record = gene_metrics.get(stage) or run_metrics.get(stage)
+        if record is not None and record.get(field) is not None:
+            funnel.append((label, record[field]))
+    return funnel
+
+# duplicates, stage metrics and sequence attrition per gene (PIPELINE_REPORT)
+def performance_report(genes, metrics, duplicates):
+    run_metrics = metrics.get(None, {})
+    report = {"genes": {}, "run_stages": list(run_metrics.values())}
+    for gene in genes:
+        number_of_duplicates, max_identical_seqs = duplicates.get(gene, (None, None))
+        report["genes"][gene] = {
+            "number_of_duplicates": number_of_duplicates,
+            "max_identical_seqs": max_identical_seqs,
+            "stages": list(metrics.get(gene, {}).values()),
+            "funnel": attrition_funnel(metrics.get(gene, {}), run_metrics),
+        }
+    return report
+
+# add the tasks, slowest stage per gene and the critical path of the finished run; this
+# runs in workflow.onComplete, when the trace holds every task of the run
+def add_trace(report, genes, tasks):
+    for gene in genes:
+        gene_tasks = [task for task in tasks if task["gene"] == gene]
+        slowest = max(gene_tasks, key=lambda task: task["wall_seconds"], default=None)
+        report["genes"].setdefault(gene, {}).update({
+            "tasks": gene_tasks,
+            "slowest_stage": slowest["process"] if slowest else None,
+            "slowest_stage_seconds": slowest["wall_seconds"] if slowest else None,
+        })
+    total, path = critical_path(process_times(tasks), genes)
+    report["critical_path"] = {"seconds": total, "processes": [{"process": p, "gene": g, "seconds": s} for p, g, s in path]}
+    report["slowest_tasks"] = sorted(tasks, key=lambda task: task["wall_seconds"], reverse=True)[:10]
+    return report
+
+def format_seconds(seconds):
+    return f"{seconds/3600:.1f} h" if seconds >= 3600 else f"{seconds/60:.1f} min" if seconds >= 60 else f"{seconds:.1f} s"
+
+# one line per stage: records in and out, bytes read and written and the peak RSS
+def write_stages(out_file, stages):
+    for stage in stages:
+        out_file.write(f"  {stage['stage']}: records {stage['records_in']} -> {stage['records_out']}, "
+                       f"{stage['bytes_read']/1024**2:.1f} MB read, {stage['bytes_written']/1024**2:.1f} MB written, "
+                       f"peak RSS {stage['peak_rss_mb']} MB\n")
+
+def create_report(report, output_path):
     with open(output_path, "w") as out_file:
-        out_file.write("Number of duplicates: " + str(number_of_duplicates) + "\n")
-        out_file.write("Max. Number of identical sequences: " + str(max_identical_seqs) + "\n")
+        if "critical_path" in report:
+            critical = report["critical_path"]
+            out_file.write("Critical path: " + format_seconds(critical["seconds"]) + "\n")
+            for step in critical["processes"]:
+                out_file.write(f"  {step['process']}" + (f" ({step['gene']})" if step["gene"] else "") + ": " + format_seconds(step["seconds"]) + "\n")
+        if report.get("run_stages"):
+            out_file.write("\nStages of all genes:\n")
+            write_stages(out_file, report["run_stages"])
+        for gene, gene_report in report["genes"].items():
+            out_file.write("\n" + gene + "\n")
+            if gene_report.get("number_of_duplicates") is not None:
+                out_file.write("Number of duplicates: " + str(gene_report["number_of_duplicates"]) + "\n")
+                out_file.write("Max. Number of identical sequences: " + str(gene_report["max_identical_seqs"]) + "\n")
+            if gene_report.get("slowest_stage"):
+                out_file.write("Slowest stage: " + gene_report["slowest_stage"] + " (" + format_seconds(gene_report["slowest_stage_seconds"]) + ")\n")
+            if gene_report.get("funnel"):
+                out_file.write("Sequence attrition:\n")
+                for label, count in gene_report["funnel"]:
+                    out_file.write(f"  {label}: {count}\n")
+            if gene_report.get("stages"):
+                out_file.write("Stages:\n")
+                write_stages(out_file, gene_report["stages"])
 
 if __name__ == "__main__":
-    arguments = argparse.ArgumentParser(description='Create a report file for the pipeline run of a single gene')
-    arguments.add_argument('-g', '--gene', help = 'Name of the gene', type = str,)
+    arguments = argparse.ArgumentParser(description='Create the report of a pipeline run: duplicates, sequence attrition and performance of the stages per gene')
+    arguments.add_argument('-g', '--genes', help = 'Names of the genes', type = str, nargs='+', required = True)
     arguments.add_argument('-p', '--pipeline_dir',   help = 'Root Directory of the pipeline', type = str)
-    arguments.add_argument('-d', '--duplicated_seqs',   help = 'Overview of duplicated sequences in JSON format', type = argparse.FileType('r'))
-    arguments.add_argument('-t', '--tree',   help = 'Phylogenetic tree in Newick format', type = str)
-    arguments.add_argument('-a', '--msa',   help = 'Multiple Sequence Alignment (MSA) on nucleotide level in FASTA format', type = str)
+    arguments.add_argument('-d', '--duplicated_seqs',   help = 'Overviews of duplicated sequences per gene (<gene>_..., JSON or binary duplicates store)', type = str, nargs='*', default = [])
+    arguments.add_argument('-m', '--metrics', help = 'Metrics records of the stages (<gene>_<stage>_metrics.json)', type = str, nargs='*', default = [])
+    arguments.add_argument('-r', '--trace', help = 'Raw Nextflow trace of the finished run; adds the slowest stage per gene and the critical path', type = str)
+    arguments.add_argument('-R', '--report', help = 'Performance report (JSON) written earlier without the trace; used instead of the duplicates and metrics', type = str)
     arguments.add_argument('-j', '--jones',   help = 'jones.dat file of the Codeml package [default: data/static/codeml/dat/jones.dat]', default = "data/static/codeml/dat/jones.dat", type = str)
     arguments.add_argument('-o', '--output_file', help = 'Path of the output report file', type = str,)
+    arguments.add_argument('-J', '--json', help = 'Path of the performance report in JSON format', type = str)
     args = arguments.parse_args()
-    
-    duplicates_json = load_json_file(args.duplicated_seqs)
-    number_of_duplicates, max_identical_seqs = analyze_duplicates(duplicates_json)
+
+    if args.report:
+        with open(args.report) as handle:
+            report = json.load(handle)
+    else:
+        duplicates = {}
+        for path in args.duplicated_seqs:
+            duplicates[gene_of_file(path, args.genes)] = analyze_duplicates(load_duplicates(path))
+        report = performance_report(args.genes, load_metrics(args.metrics, args.genes), duplicates)
+    if args.trace:
+        report = add_trace(report, args.genes, load_trace(args.trace))
     #analyze_tree(args.gene, args.pipeline_dir, args.tree, args.msa, args.jones)
-    create_report(number_of_duplicates, max_identical_seqs, args.output_file)
+    create_report(report, args.output_file)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=4)
@@ -0,0 +1,95 @@
+import argparse
+import numpy as np
+from fasta_io import iter_fasta, open_fasta, record_name, write_fasta_record
+from coordinate_map import CoordinateMap, find_gene_in_genome, read_single_sequence
+from stage_metrics import StageMetrics
+
+
+# per-column residue and gap counts of an MSA, accumulated record by record
+class ColumnStatistics:
+
+    def __init__(self):
+        self.residues = np.zeros(0, dtype=np.int64)
+        self.gaps = np.zeros(0, dtype=np.int64)
+        self.records = 0
+
+    def add(self, sequence):
+        gapped = np.frombuffer(sequence.encode(), dtype=np.uint8) == ord("-")
+        if len(gapped) > len(self.residues):
+            # records of differing length are counted up to their own end
+            self.residues = np.concatenate([self.residues, np.zeros(len(gapped) - len(self.residues), dtype=np.int64)])
+            self.gaps = np.concatenate([self.gaps, np.zeros(len(gapped) - len(self.gaps), dtype=np.int64)])
+        self.residues[:len(gapped)] += ~gapped
+        self.gaps[:len(gapped)] += gapped
+        self.records += 1
+
+    # write the statistics of every column together with its reference position
+    def write(self, output, reference_labels):
+        output.write("msa\treference\tresidues\tgaps\toccupancy\n")
+        for column in range(len(self.residues)):
+            label = reference_labels[column] if column < len(reference_labels) else ""
+            occupancy = self.residues[column] / self.records if self.records else 0
+            output.write(f"{column+1}\t{label}\t{self.residues[column]}\t{self.gaps[column]}\t{occupancy:g}\n")
+
+
+# split the reference sequence(s) from the MAFFT output and collect the column
+# statistics of the remaining records in a single pass; returns the first
+# reference sequence as aligned in the MSA
+def split_reference(msa_handle, reference_names, msa_output, reference_output, column_statistics):
+    mapped_reference = None
+    for header, sequence in iter_fasta(msa_handle):
+        if record_name(header) in reference_names:
+            if mapped_reference is None:
+                mapped_reference = sequence
+            if reference_output:
+                write_fasta_record(reference_output, header, sequence)
+        else:
+            write_fasta_record(msa_output, header, sequence)
+            column_statistics.add(sequence)
+    return mapped_reference
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Split the reference from the protein MSA and write the position map and column statistics in a single pass over the alignment')
+    arguments.add_argument('-i', '--input', help = 'protein MSA including the reference ("-" for stdin) [default: -]', default = "-", type = str)
+    arguments.add_argument('-r', '--reference', help = 'fasta of the reference sequence(s) to split from the MSA', required = True, type = str)
+    arguments.add_argument('-o', '--output', help = 'protein MSA without the reference', required = True, type = argparse.FileType('w'))
+    arguments.add_argument('-s', '--removed_seqs', help = 'write the reference as aligned in the MSA here', required = False, type = argparse.FileType('w'))
+    arguments.add_argument('-p', '--pos_map_table', help = 'Output TSV file containing positions of reference and MSA', required = True, type = argparse.FileType('w'))
+    arguments.add_argument('-m', '--coordinate_map', help = 'Output coordinate map (.npz) between MSA columns, reference codons and genome nucleotides', required = False, type = str)
+    arguments.add_argument('-c', '--column_stats', help = 'Output TSV file containing the residue/gap counts of every MSA column', required = False, type = argparse.FileType('w'))
+    arguments.add_argument('-n', '--gene_reference', help = 'Nucleotide FASTA file of the reference gene, used to locate the gene in the genome', required = False, type = str)
+    arguments.add_argument('-g', '--genome', help = 'FASTA file containing the reference genome', required = False, type = str)
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("protein_msa")
+
+    with open(args.reference) as reference_handle:
+        reference_names = {record_name(header) for header, _ in iter_fasta(reference_handle)}
+
+    column_statistics = ColumnStatistics()
+    with open_fasta(args.input) as msa_handle:
+        mapped_reference = split_reference(msa_handle, reference_names, args.output, args.removed_seqs, column_statistics)
+    args.output.close()
+    if mapped_reference is None:
+        raise Exception("Missing reference sequence in the MSA")
+
+    genome_start = -1
+    if args.gene_reference and args.genome:
+        genome_start = find_gene_in_genome(read_single_sequence(args.gene_reference), read_single_sequence(args.genome))
+    coordinate_map = CoordinateMap.from_mapped_reference(mapped_reference, genome_start)
+
+    coordinate_map.write_position_table(args.pos_map_table)
+    if args.coordinate_map:
+        coordinate_map.save(args.coordinate_map)
+    if args.column_stats:
+        column_statistics.write(args.column_stats, coordinate_map.reference_labels())
+
+    if args.metrics:
+        metrics.records_in = column_statistics.records + 1
+        metrics.records_out = column_statistics.records
+        metrics.extra["columns"] = len(coordinate_map)
+        metrics.read(args.input)
+        metrics.wrote(args.output.name)
+        metrics.write(args.metrics)
@@ -0,0 +1,193 @@
+import argparse
+import numpy as np
+import pandas as pd
+from coordinate_map import CoordinateMap
+from duplicates_io import load_duplicates
+from fasta_io import iter_fasta, open_input, record_name
+from stage_metrics import StageMetrics
+
+# residues that are counted (lower case is counted as upper case), other characters are skipped
+RESIDUES = "-*ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+RESIDUE_INDEX = np.full(256, -1, dtype=np.int64)
+for i, residue in enumerate(RESIDUES):
+    RESIDUE_INDEX[ord(residue)] = RESIDUE_INDEX[ord(residue.lower())] = i
+# labels of the date bins: collection day or ISO week
+DATE_BINS = {"day": "%Y-%m-%d", "week": "%G-W%V"}
+# cells (sequence x date bins times MSA columns) that are counted at once
+CHUNK_CELLS = 2**22
+
+
+# Sparse site x date x residue count cube of a gene, an uncompressed .npz file:
+#   column_offsets [C+1]    -> counts of MSA column c are entries column_offsets[c]:column_offsets[c+1]
+#   date, residue, count    one entry per observed (column, date bin, residue), indices into dates/residues
+#   dates, residues         labels of the date bins and the residue alphabet
+#   reference_codon [C]     reference codon of every MSA column (0-based, -1 for insertions)
+#   reference_label [C]     reference position of every MSA column as in the position map table
+#   gene, date_bin
+# Every sequence with a collection date is counted, duplicates through the residues of
+# their representative in the MSA.
+class ResidueCounts:
+
+    def __init__(self, path):
+        self.data = np.load(path)
+        self.arrays = {}
+        self.gene = str(self.data["gene"])
+        self.date_bin = str(self.data["date_bin"])
+        self.dates = self.data["dates"]
+        self.residues = self.data["residues"]
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # arrays are read from the archive on first use
+    def array(self, key):
+        if key not in self.arrays:
+            self.arrays[key] = self.data[key]
+        return self.arrays[key]
+
+    # MSA column (0-based) of a 1-based reference position or reference label (e.g. "501" or "214.1")
+    def column_of(self, site):
+        site = str(site)
+        if site.isdigit():
+            columns = np.flatnonzero(self.array("reference_codon") == int(site) - 1)
+        else:
+            columns = np.flatnonzero(self.array("reference_label") == site)
+        if not len(columns):
+            raise KeyError(f"{self.gene} has no reference position {site}")
+        return int(columns[0])
+
+    # counts of a site as a long table (date, residue, count, frequency within the date bin)
+    def site_table(self, site):
+        column = self.column_of(site)
+        start, end = self.array("column_offsets")[column:column+2]
+        df = pd.DataFrame({
+            "date": self.dates[self.array("date")[start:end]],
+            "residue": self.residues[self.array("residue")[start:end]],
+            "count": self.array("count")[start:end],
+        })
+        df["frequency"] = df["count"] / df.groupby("date")["count"].transform("sum")
+        return df
+
+    # counts of a site as a date x residue table
+    def site_counts(self, site):
+        return self.site_table(site).pivot(index="date", columns="residue", values="count").fillna(0).astype(np.int64)
+
+
+# number of sequences with a collection date per MSA record and date bin: the duplicates
+# clusters are joined with the dates of the metadata, sequences without a cluster
+# represent themselves
+def record_weights(duplicates_path, metadata_path, acc_col, date_col, date_bin):
+    members = []
+    representatives = []
+    for representative, cluster in load_duplicates(duplicates_path).items():
+        members.extend(cluster)
+        representatives.extend([representative] * len(cluster))
+    df_clusters = pd.DataFrame({"accessions": members, "representative": representatives}).apply(lambda x: x.str.replace("_", "-"))
+    with open_input(metadata_path) as csv:
+        df_metadata = pd.read_csv(csv, usecols=[acc_col, date_col])
+    df_metadata = pd.DataFrame({
+        "accessions": df_metadata[acc_col].astype(str),
+        "date": pd.to_datetime(df_metadata[date_col], errors="coerce").dt.strftime(DATE_BINS[date_bin]),
+    }).dropna()
+    df = df_metadata.merge(df_clusters, on="accessions", how="left")
+    df["representative"] = df["representative"].fillna(df["accessions"])
+    weights = df.groupby(["representative", "date"]).size().rename("weight").reset_index()
+    dates = np.sort(weights["date"].unique())
+    weights["date"] = np.searchsorted(dates, weights["date"])
+    return weights, dates
+
+
+# (key, weight) of every residue of a block of MSA records, the key encodes column, date bin and residue
+def count_block(names, block, weights, n_columns, n_dates):
+    pairs = pd.DataFrame({"representative": names, "record": np.arange(len(names))}).merge(weights, on="representative")
+    if pairs.empty:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    matrix = np.array(block, dtype=f"S{n_columns}").view(np.uint8).reshape(len(block), n_columns)
+    codes = RESIDUE_INDEX[matrix]
+    keys = []
+    counts = []
+    step = max(1, CHUNK_CELLS // n_columns)
+    for start in range(0, len(pairs), step):
+        chunk = pairs.iloc[start:start+step]
+        residues = codes[chunk["record"].to_numpy()]
+        chunk_keys = (np.arange(n_columns, dtype=np.int64) * n_dates + chunk["date"].to_numpy()[:, None]) * len(RESIDUES) + residues
+        chunk_weights = np.broadcast_to(chunk["weight"].to_numpy()[:, None], residues.shape)
+        observed = residues >= 0
+        unique_keys, inverse = np.unique(chunk_keys[observed], return_inverse=True)
+        keys.append(unique_keys)
+        counts.append(np.bincount(inverse, weights=chunk_weights[observed], minlength=len(unique_keys)).astype(np.int64))
+    return np.concatenate(keys), np.concatenate(counts)
+
+
+# count every MSA column per date bin and residue in a single pass over the MSA
+def count_residues(msa_path, duplicates_path, metadata_path, coordinate_map, gene, output, acc_col="IMS_ID", date_col="DATE_DRAW", date_bin="day", block_size=2000, metrics=None):
+    weights, dates = record_weights(duplicates_path, metadata_path, acc_col, date_col, date_bin)
+    n_columns = len(coordinate_map)
+    keys = []
+    counts = []
+    names = []
+    block = []
+    records = 0
+    with open_input(msa_path) as msa:
+        for header, sequence in iter_fasta(msa):
+            names.append(record_name(header).replace("_", "-"))
+            block.append(sequence[:n_columns].encode())
+            if len(block) == block_size:
+                block_keys, block_counts = count_block(names, block, weights, n_columns, len(dates))
+                keys.append(block_keys)
+                counts.append(block_counts)
+                records += len(block)
+                names, block = [], []
+    if block:
+        block_keys, block_counts = count_block(names, block, weights, n_columns, len(dates))
+        keys.append(block_keys)
+        counts.append(block_counts)
+        records += len(block)
+    keys, inverse = np.unique(np.concatenate(keys) if keys else np.empty(0, dtype=np.int64), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(counts) if counts else None, minlength=len(keys)).astype(np.int64)
+    column = keys // (max(len(dates), 1) * len(RESIDUES))
+    np.savez(output,
+             column_offsets=np.searchsorted(column, np.arange(n_columns + 1)),
+             date=((keys // len(RESIDUES)) % max(len(dates), 1)).astype(np.int32),
+             residue=(keys % len(RESIDUES)).astype(np.uint8),
+             count=counts,
+             dates=np.array(dates, dtype=str),
+             residues=np.array(list(RESIDUES), dtype=str),
+             reference_codon=coordinate_map.msa_to_codon(np.arange(n_columns)),
+             reference_label=np.array(coordinate_map.reference_labels()[:n_columns], dtype=str),
+             gene=np.array(gene),
+             date_bin=np.array(date_bin))
+    if metrics is not None:
+        metrics.records_in = metrics.unique = records
+        metrics.total = int(weights["weight"].sum())
+        metrics.records_out = int(len(keys))
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Count the residues of every MSA column per collection date of a gene, weighted by the duplicates, into a sparse site x date x residue count cube (.npz)')
+    arguments.add_argument('-g', '--gene', help = 'Name of the gene', required = True, type = str)
+    arguments.add_argument('-m', '--msa', help = 'Protein MSA of the unique sequences', required = True, type = str)
+    arguments.add_argument('-d', '--duplicates', help = 'Duplicates of the protein sequences (JSON or binary duplicates store)', required = True, type = str)
+    arguments.add_argument('-c', '--metadata', help = 'Metadata of the sequences (optionally gzip/BGZF/zstd compressed)', required = True, type = str)
+    arguments.add_argument('-r', '--coordinate_map', help = 'Coordinate map (.npz) of the gene', required = True, type = str)
+    arguments.add_argument('-b', '--date_bin', help = 'Count per collection day or ISO week (day, week) [default: day]', default = "day", choices = list(DATE_BINS), type = str)
+    arguments.add_argument('-a', '--acc_col', help = 'Column name of the metadata file storing the accession numbers', default = "IMS_ID", type = str)
+    arguments.add_argument('-t', '--date_col', help = 'Column name of the metadata storing the sampling dates', default = "DATE_DRAW", type = str)
+    arguments.add_argument('-o', '--output', help = 'Output count cube (.npz)', required = True, type = str)
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("residue_counts", args.gene) if args.metrics else None
+    with open(args.output, "wb") as output:
+        count_residues(args.msa, args.duplicates, args.metadata, CoordinateMap.load(args.coordinate_map), args.gene, output,
+                       args.acc_col, args.date_col, args.date_bin, metrics=metrics)
+    if metrics is not None:
+        metrics.read(args.msa, args.duplicates, args.metadata)
+        metrics.wrote(args.output)
+        metrics.write(args.metrics)
\ No newline at end of file
@@ -0,0 +1,180 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from fasta_io import iter_fasta
+from result_cache import CACHE_HIT_MARKER
+
+# processes that get their resource requests from the cost model
+MODELLED_PROCESSES = ["BUILD_TREE", "FIT_GLOBAL_MODEL", "SLAC_ANALYSIS", "FEL_ANALYSIS", "MEME_ANALYSIS",
+                      "FUBAR_ANALYSIS", "FEL_BLOCK_ANALYSIS", "MEME_BLOCK_ANALYSIS"]
+# processes that only see one block of sites (--site_block_size)
+BLOCK_PROCESSES = ["FEL_BLOCK_ANALYSIS", "MEME_BLOCK_ANALYSIS"]
+HISTORY_COLUMNS = ["hash", "process", "gene", "haplotypes", "codons", "site_patterns", "tips", "cpus", "peak_rss_mb", "realtime_min", "cpu_min"]
+
+MIN_HISTORY = 3             # runs of a process needed before its requests are predicted
+MEMORY_MARGIN = 1.25        # on top of the largest underestimate in the history
+TIME_MARGIN = 1.5
+PARALLEL_EFFICIENCY = 0.7   # fraction of the requested CPUs that is actually used
+TARGET_WALLTIME_MIN = 8*60  # CPUs are requested so that a task takes about this long
+MAX_CPUS = 64
+MIN_MEMORY_MB = 1024
+MIN_TIME_MIN = 60
+
+
+# haplotype count, codon length, site pattern count and tip count of a codon alignment;
+# site patterns are counted from a rolling hash of every codon column, so only one
+# record is held in memory
+def measure_alignment(msa_handle):
+    import numpy as np
+    column_hashes = None
+    haplotypes = 0
+    for _, sequence in iter_fasta(msa_handle):
+        residues = np.frombuffer(sequence.upper().encode(), dtype=np.uint8)
+        residues = residues[:len(residues) - len(residues) % 3].reshape(-1, 3).astype(np.uint64)
+        codons = (residues[:, 0] << np.uint64(16)) | (residues[:, 1] << np.uint64(8)) | residues[:, 2]
+        if column_hashes is None:
+            column_hashes = np.zeros(len(codons), dtype=np.uint64)
+        column_hashes = column_hashes * np.uint64(1000003) ^ codons
+        haplotypes += 1
+    codons = 0 if column_hashes is None else len(column_hashes)
+    site_patterns = 0 if column_hashes is None else len(np.unique(column_hashes))
+    return {"haplotypes": haplotypes, "codons": codons, "site_patterns": site_patterns, "tips": haplotypes}
+
+
+# cost driver of a process: the pairwise distances of neighbour joining grow with the
+# square of the tips, the HyPhy likelihood with tips times site patterns
+def cost_feature(process, features):
+    if process == "BUILD_TREE":
+        return max(1, features["tips"])**2
+    return max(1, features["tips"]) * max(1, features["site_patterns"])
+
+
+# features of a single block of sites
+def block_features(features, block_size):
+    if not block_size or not features["codons"]:
+        return features
+    fraction = min(1, block_size / features["codons"])
+    return dict(features, codons=min(block_size, features["codons"]), site_patterns=max(1, round(features["site_patterns"]*fraction)))
+
+
+# least squares fit of log(y) = a + b*log(x), returns (a, b, largest positive residual)
+def fit_log_linear(points):
+    xs = [math.log(x) for x, _ in points]
+    ys = [math.log(y) for _, y in points]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    var_x = sum((x - mean_x)**2 for x in xs)
+    b = sum((x - mean_x)*(y - mean_y) for x, y in zip(xs, ys)) / var_x if var_x else 0
+    a = mean_y - b*mean_x
+    max_residual = max(0, max(y - (a + b*x) for x, y in zip(xs, ys)))
+    return a, b, max_residual
+
+
+def load_history(path):
+    if not path or not os.path.exists(path):
+        return []
+    with open(path) as handle:
+        return list(csv.DictReader(handle, delimiter="\t"))
+
+
+# predict cpus, memory (MB) and time (minutes) of a process from the history of
+# previous runs, None if there are not enough runs of the process yet
+def predict_requests(process, features, history):
+    rows = [row for row in history if row["process"] == process]
+    if len(rows) < MIN_HISTORY:
+        return None
+    row_features = lambda row: {k: int(row[k]) for k in ("haplotypes", "codons", "site_patterns", "tips")}
+    feature = math.log(cost_feature(process, features))
+
+    a, b, residual = fit_log_linear([(cost_feature(process, row_features(row)), max(1.0, float(row["peak_rss_mb"]))) for row in rows])
+    memory_mb = math.exp(a + b*feature + residual) * MEMORY_MARGIN
+    memory_mb = max(MIN_MEMORY_MB, int(math.ceil(memory_mb / 1024)) * 1024)
+
+    a, b, residual = fit_log_linear([(cost_feature(process, row_features(row)), max(0.1, float(row["cpu_min"]))) for row in rows])
+    cpu_min = math.exp(a + b*feature + residual)
+    cpus = min(MAX_CPUS, max(1, math.ceil(cpu_min / (TARGET_WALLTIME_MIN * PARALLEL_EFFICIENCY))))
+    cpus = min(MAX_CPUS, 2**math.ceil(math.log2(cpus)))
+    time_min = max(MIN_TIME_MIN, int(math.ceil(cpu_min / (cpus * PARALLEL_EFFICIENCY) * TIME_MARGIN)))
+    return {"cpus": cpus, "memory_mb": memory_mb, "time_min": time_min}
+
+
+# requests of all modelled processes that have enough history
+def predict_all(features, history, block_size=0):
+    requests = {}
+    for process in MODELLED_PROCESSES:
+        process_features = block_features(features, block_size) if process in BLOCK_PROCESSES else features
+        prediction = predict_requests(process, process_features, history)
+        if prediction:
+            requests[process] = prediction
+    return requests
+
+
+# parse a raw Nextflow trace file and append the completed tasks of the modelled
+# processes, joined with the measured features of their gene (tag), to the history;
+# tasks that are already recorded (same task hash) and hits of the result cache
+# (marker in the task directory) are skipped
+def record_trace(trace_path, features_dir, history_path):
+    recorded = {row["hash"] for row in load_history(history_path)}
+    features_by_gene = {}
+    for name in os.listdir(features_dir) if os.path.isdir(features_dir) else []:
+        if name.endswith("_resources.json"):
+            with open(os.path.join(features_dir, name)) as handle:
+                resources = json.load(handle)
+            features_by_gene[resources["gene"]] = resources
+    new_rows = []
+    with open(trace_path) as handle:
+        for task in csv.DictReader(handle, delimiter="\t"):
+            process = task["name"].split(" (")[0]
+            gene = task.get("tag", "")
+            if process not in MODELLED_PROCESSES or task.get("status") != "COMPLETED" or gene not in features_by_gene or task.get("hash") in recorded:
+                continue
+            if task.get("workdir") and os.path.exists(os.path.join(task["workdir"], CACHE_HIT_MARKER)):
+                continue
+            features = features_by_gene[gene]["features"]
+            if process in BLOCK_PROCESSES:
+                features = block_features(features, features_by_gene[gene].get("site_block_size", 0))
+            try:
+                realtime_min = float(task["realtime"]) / 60000
+                cpu_min = realtime_min * float(task["%cpu"].rstrip("%")) / 100
+                peak_rss_mb = float(task["peak_rss"]) / 1024**2
+            except (KeyError, ValueError):
+                continue
+            new_rows.append(dict(features, hash=task.get("hash", ""), process=process, gene=gene, cpus=task.get("cpus", ""), peak_rss_mb=f"{peak_rss_mb:.1f}",
+                                 realtime_min=f"{realtime_min:.2f}", cpu_min=f"{max(cpu_min, realtime_min):.2f}"))
+    if not new_rows:
+        return 0
+    write_header = not os.path.exists(history_path)
+    with open(history_path, "a") as handle:
+        writer = csv.DictWriter(handle, fieldnames=HISTORY_COLUMNS, delimiter="\t", extrasaction="ignore")
+        if write_header:
+            writer.writeheader()
+        writer.writerows(new_rows)
+    return len(new_rows)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Cost model for the resource requests of the tree and HyPhy processes')
+    subcommands = arguments.add_subparsers(dest='command', required=True)
+    measure = subcommands.add_parser('measure', help='measure a filtered codon alignment and predict the requests of its processes')
+    measure.add_argument('-g', '--gene', help = 'gene of the alignment', required = True, type = str)
+    measure.add_argument('-i', '--msa', help = 'filtered codon alignment', required = True, type = argparse.FileType('r'))
+    measure.add_argument('-H', '--history', help = 'resource history of previous runs (TSV)', required = False, type = str)
+    measure.add_argument('-b', '--site_block_size', help = 'codons per site block of the block processes [default: 0]', default = 0, type = int)
+    measure.add_argument('-o', '--output', help = 'write the features and requests (JSON) here', required = True, type = argparse.FileType('w'))
+    record = subcommands.add_parser('record', help='add the measured peak RSS and runtime of a finished run to the history')
+    record.add_argument('-t', '--trace', help = 'raw Nextflow trace file of the run', required = True, type = str)
+    record.add_argument('-f', '--features_dir', help = 'directory with the <gene>_resources.json files of the run', required = True, type = str)
+    record.add_argument('-H', '--history', help = 'resource history (TSV), created if missing', required = True, type = str)
+    args = arguments.parse_args()
+
+    if args.command == 'measure':
+        features = measure_alignment(args.msa)
+        requests = predict_all(features, load_history(args.history), args.site_block_size)
+        json.dump({"gene": args.gene, "features": features, "site_block_size": args.site_block_size, "requests": requests}, args.output, indent=4)
+    else:
+        if not os.path.exists(args.trace):
+            sys.exit(f"Trace file {args.trace} not found")
+        print(f"Recorded {record_trace(args.trace, args.features_dir, args.history)} tasks in {args.history}")
@@ -0,0 +1,125 @@
+import argparse
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# bump to invalidate all cached results, e.g. after changing how keys are computed
+CACHE_VERSION = "1"
+# written into the working directory (the Nextflow task directory) on a cache hit, so
+# the resource model does not record the task as a run of the method
+CACHE_HIT_MARKER = ".result_cache_hit"
+
+
+# content hash of the method, its arguments and the content (not the names) of the input files
+def cache_key(method, method_args, input_paths):
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION}\0{method}\0{method_args}\0".encode())
+    for path in input_paths:
+        file_digest = hashlib.sha256()
+        with open(path, "rb") as handle:
+            for block in iter(lambda: handle.read(1024**2), b""):
+                file_digest.update(block)
+        digest.update(file_digest.digest())
+    return digest.hexdigest()
+
+
+# Persistent, content-addressed cache of result files shared between runs and
+# work directories. Entries are plain files (cache_dir/ab/abcdef...); their
+# modification time is refreshed on every hit, so the least recently used
+# entries are evicted first once the cache grows beyond max_size bytes.
+class ResultCache:
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    # copy the cached result to output, returns False on a miss
+    def fetch(self, key, output):
+        entry = self.entry_path(key)
+        try:
+            shutil.copyfile(entry, output)
+        except FileNotFoundError:
+            return False
+        os.utime(entry)
+        return True
+
+    # add a result file to the cache (atomically, so concurrent readers never see partial entries)
+    def store(self, key, result):
+        entry = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=os.path.dirname(entry))
+        os.close(handle)
+        try:
+            shutil.copyfile(result, tmp_path)
+            os.replace(tmp_path, entry)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    # delete the least recently used entries until the cache fits into max_size
+    def evict(self):
+        with open(os.path.join(self.cache_dir, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = []
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.startswith("."):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+# return the cached output or run the command and cache its output
+def run_cached(cache, key, output, command):
+    if cache.fetch(key, output):
+        print(f"Cache hit ({key}), reusing the cached {output}")
+        with open(CACHE_HIT_MARKER, "w") as marker:
+            marker.write(key + "\n")
+        return 0
+    returncode = subprocess.call(command)
+    if returncode == 0:
+        cache.store(key, output)
+    return returncode
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Run a command through the persistent result cache: if the method, its arguments and the content of the inputs were seen before, the cached output is copied instead of running the command')
+    arguments.add_argument('-d', '--cache_dir', help = 'Cache directory; if empty the command is always run', default = "", type = str)
+    arguments.add_argument('-s', '--max_size', help = 'Maximal size of the cache in GB [default: 50]', default = 50, type = float)
+    arguments.add_argument('-m', '--method', help = 'Name of the method, part of the cache key', required = True, type = str)
+    arguments.add_argument('-a', '--args', help = 'Arguments of the method that change its result, part of the cache key', default = "", type = str)
+    arguments.add_argument('-i', '--inputs', help = 'Input files whose content is part of the cache key', required = True, type = str, nargs='+')
+    arguments.add_argument('-o', '--output', help = 'Output file of the command', required = True, type = str)
+    arguments.add_argument('command', help = 'Command to run on a cache miss (after --)', nargs = argparse.REMAINDER)
+    args = arguments.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        arguments.error("no command given")
+    if not args.cache_dir:
+        sys.exit(subprocess.call(command))
+
+    cache = ResultCache(args.cache_dir, int(args.max_size * 1024**3))
+    sys.exit(run_cached(cache, cache_key(args.method, args.args, args.inputs), args.output, command))
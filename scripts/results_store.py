@@ -0,0 +1,178 @@
+import argparse
+import json
+import numpy as np
+from coordinate_map import CoordinateMap
+from subfuctions import load_json_file
+from stage_metrics import StageMetrics
+
+# sections of the HyPhy results that are converted; everything else (e.g. the FUBAR
+# posteriors or the per-site codons of the SLAC branches) is left in the JSON file
+RESULT_SECTIONS = ["input", "MLE", "fits", "tested", "branch attributes", "grid"]
+
+
+# Columnar store of the HyPhy results (SLAC, FEL, MEME, FUBAR) of a gene, an
+# uncompressed .npz file with one array per column:
+#   sites/<column>     one row per site: site (1-based), msa_column, reference_codon,
+#                      genome_position (0-based, -1 for insertions or an unknown gene
+#                      start), reference_label (as in the position map table) and one
+#                      float64 column per MLE header; SLAC has the resolved counts here
+#                      and the averaged ones under sites_averaged/<column>
+#   branches/<column>  one row per branch: name, tested and its numeric and text attributes
+#   fits/<column>      one row per model fit: model, Log Likelihood, AIC-c, estimated parameters
+#   fits_json, tree, method, headers/name, headers/description, input/<value>
+# np.load reads single members of the archive, so a consumer only reads the columns
+# it asks for; each member is read and copied into memory, it is not memory-mapped.
+class ResultsStore:
+
+    def __init__(self, path):
+        self.data = np.load(path)
+        self.method = str(self.data["method"])
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def columns(self, table="sites"):
+        return [key[len(table) + 1:] for key in self.data.files if key.startswith(table + "/")]
+
+    # the named columns (all of them by default) of a table as {name: array}
+    def table(self, table="sites", columns=None):
+        return {column: self.data[f"{table}/{column}"] for column in (columns or self.columns(table))}
+
+    @property
+    def tree(self):
+        return str(self.data["tree"])
+
+    @property
+    def fits(self):
+        return json.loads(str(self.data["fits_json"]))
+
+
+# rows of every partition, in the order of the partitions, and the names of the columns
+def site_rows(mle):
+    rows = []
+    averaged = []
+    for partition in sorted(mle["content"], key=int):
+        content = mle["content"][partition]
+        if isinstance(content, dict):
+            rows.extend(content["by-site"]["RESOLVED"])
+            averaged.extend(content["by-site"]["AVERAGED"])
+        else:
+            rows.extend(content)
+    return [header[0] for header in mle["headers"]], rows, averaged
+
+
+# float64 columns of a list of rows, missing values (None, "") become NaN
+def float_columns(names, rows):
+    values = np.array([[np.nan if value is None or value == "" else value for value in row] for row in rows], dtype=np.float64).reshape(len(rows), len(names))
+    return {name: values[:, i].copy() for i, name in enumerate(names)}
+
+
+# branch table from the branch attributes of the first partition: numeric attributes
+# become float64, text attributes str columns; nested ones (codons per site) are skipped
+def branch_columns(results):
+    branches = results.get("branch attributes", {}).get("0", {})
+    tested = results.get("tested", {}).get("0", {})
+    names = list(branches)
+    columns = {"name": np.array(names, dtype=str), "tested": np.array([name in tested for name in names], dtype=bool)}
+    numeric = lambda value: isinstance(value, (int, float)) and not isinstance(value, bool)
+    attributes = {}
+    for attributes_of_branch in branches.values():
+        for attribute, value in attributes_of_branch.items():
+            if numeric(value) or isinstance(value, str) and attributes.get(attribute) is None:
+                attributes[attribute] = "float" if numeric(value) else "str"
+    for attribute, kind in attributes.items():
+        values = [branches[name].get(attribute) for name in names]
+        if kind == "float":
+            columns[attribute] = np.array([value if numeric(value) else np.nan for value in values], dtype=np.float64)
+        else:
+            columns[attribute] = np.array(["" if value is None else str(value) for value in values], dtype=str)
+    return columns
+
+
+# one row per model fit with its scalar statistics
+def fit_columns(fits):
+    models = list(fits)
+    columns = {"model": np.array(models, dtype=str)}
+    for statistic in ("Log Likelihood", "AIC-c", "estimated parameters"):
+        columns[statistic] = np.array([fits[model].get(statistic, np.nan) if isinstance(fits[model], dict) else np.nan for model in models], dtype=np.float64)
+    return columns
+
+
+# reference coordinates of the sites (= MSA columns), unknown without a coordinate map
+def coordinate_columns(n_sites, coordinate_map=None):
+    columns = np.arange(n_sites)
+    if coordinate_map is None:
+        unknown = np.full(n_sites, -1, dtype=np.int64)
+        return {"msa_column": columns, "reference_codon": unknown, "genome_position": unknown.copy(), "reference_label": np.array([""]*n_sites, dtype=str)}
+    if len(coordinate_map) != n_sites:
+        raise ValueError(f"the coordinate map has {len(coordinate_map)} MSA columns, the results have {n_sites} sites")
+    labels = coordinate_map.reference_labels()
+    return {"msa_column": columns, "reference_codon": coordinate_map.msa_to_codon(columns),
+            "genome_position": coordinate_map.msa_to_genome(columns), "reference_label": np.array(labels, dtype=str)}
+
+
+# convert a HyPhy results JSON into the columnar store, returns the number of sites
+def convert_results(results_handle, method, output, coordinate_map=None):
+    results = load_json_file(results_handle, RESULT_SECTIONS)
+    names, rows, averaged = site_rows(results["MLE"])
+    arrays = {"method": np.array(method), "tree": np.array(results.get("input", {}).get("trees", {}).get("0", "")),
+              "fits_json": np.array(json.dumps(results.get("fits", {}))),
+              "headers/name": np.array(names, dtype=str), "headers/description": np.array([header[1] for header in results["MLE"]["headers"]], dtype=str)}
+    sites = {"site": np.arange(1, len(rows) + 1)}
+    sites.update(coordinate_columns(len(rows), coordinate_map))
+    sites.update(float_columns(names, rows))
+    arrays.update({f"sites/{name}": values for name, values in sites.items()})
+    if averaged:
+        arrays.update({f"sites_averaged/{name}": values for name, values in float_columns(names, averaged).items()})
+    arrays.update({f"branches/{name}": values for name, values in branch_columns(results).items()})
+    arrays.update({f"fits/{name}": values for name, values in fit_columns(results.get("fits", {})).items()})
+    for key, value in results.get("input", {}).items():
+        if isinstance(value, (int, float)):
+            arrays[f"input/{key}"] = np.array(value)
+    if "grid" in results:
+        arrays["grid"] = np.array(results["grid"], dtype=np.float64)
+    np.savez(output, **arrays)
+    return len(rows)
+
+
+# the named columns of the site table from a results store (.npz) or, for results that
+# were not converted, from the HyPhy JSON; site is always included and columns the
+# results do not have (e.g. of another HyPhy version) are left out
+def load_site_columns(path, columns=None):
+    if path.endswith(".npz"):
+        with ResultsStore(path) as store:
+            available = store.columns("sites")
+            return store.table("sites", ["site"] + [column for column in (columns or available) if column in available and column != "site"])
+    with open(path) as handle:
+        names, rows, _ = site_rows(load_json_file(handle, ["MLE.content", "MLE.headers"])["MLE"])
+    table = {"site": np.arange(1, len(rows) + 1)}
+    table.update({name: values for name, values in float_columns(names, rows).items() if columns is None or name in columns})
+    return table
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Convert the HyPhy results (JSON) of a gene into a columnar results store (.npz) with the site, branch and fit tables')
+    arguments.add_argument('-i', '--input', help = 'HyPhy results in JSON format', required = True, type = argparse.FileType('r'))
+    arguments.add_argument('-m', '--method', help = 'Selection analysis method of the results (slac, fel, meme, fubar)', required = True, type = str)
+    arguments.add_argument('-c', '--coordinate_map', help = 'Coordinate map (.npz) of the gene, adds the reference and genome coordinates of the sites', required = False, type = str)
+    arguments.add_argument('-o', '--output', help = 'Output results store (.npz)', required = True, type = str)
+    arguments.add_argument('-g', '--gene', help = 'Gene of the results, recorded in the metrics', required = False, type = str)
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics(f"{args.method}_results_store", args.gene)
+    coordinate_map = CoordinateMap.load(args.coordinate_map) if args.coordinate_map else None
+    with open(args.output, "wb") as output:
+        n_sites = convert_results(args.input, args.method, output, coordinate_map)
+
+    if args.metrics:
+        metrics.records_in = metrics.records_out = n_sites
+        metrics.read(args.input.name, args.coordinate_map)
+        metrics.wrote(args.output)
+        metrics.write(args.metrics)
\ No newline at end of file
@@ -0,0 +1,50 @@
+import argparse
+from fasta_io import iter_fasta, open_fasta, record_name, write_fasta_record
+from stage_metrics import StageMetrics
+
+
+# load the sequence IDs of a previous run, one ID per line
+def load_sequence_ids(path):
+    with open(path) as handle:
+        return {line.rstrip("\n") for line in handle if line.strip()}
+
+
+# write the records whose ID was not processed before and list the IDs of all
+# records in the input
+def select_new_sequences(sequences_handle, known_ids, output, ids_output):
+    selected = 0
+    total = 0
+    for header, sequence in iter_fasta(sequences_handle):
+        name = record_name(header)
+        ids_output.write(name + "\n")
+        total += 1
+        if name not in known_ids:
+            if output:
+                write_fasta_record(output, header, sequence, width=0)
+            selected += 1
+    return selected, total
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Select the sequences that were not part of a previous run and list the IDs of all sequences')
+    arguments.add_argument('-i', '--input', required=True, help = 'FASTA file containing the genome sequences, optionally gzip/BGZF/zstd compressed ("-" for stdin)', type = str, metavar="PATH")
+    arguments.add_argument('-s', '--state_ids', required=False, help = 'File listing the sequence IDs of the previous run; without it all sequences are new', type = str)
+    arguments.add_argument('-o', '--output', required=False, help = 'Write the new sequences here', type = argparse.FileType('w'))
+    arguments.add_argument('-l', '--ids', required=True, help = 'Write the IDs of all input sequences here', type = argparse.FileType('w'))
+    arguments.add_argument('-t', '--threads', required=False, help = 'Number of threads used to decompress the input [default: 1]', default = 1, type = int)
+    arguments.add_argument('-m', '--metrics', required=False, help = 'Write the performance metrics of the stage (JSON) here', type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("select_new_sequences")
+
+    known_ids = load_sequence_ids(args.state_ids) if args.state_ids else set()
+    with open_fasta(args.input, args.threads) as sequences_handle:
+        selected, total = select_new_sequences(sequences_handle, known_ids, args.output, args.ids)
+    print(f"Selected {selected} new out of {total} sequences")
+
+    if args.metrics:
+        metrics.records_in = total
+        metrics.records_out = selected
+        metrics.read(args.input)
+        metrics.wrote(args.output.name if args.output else None)
+        metrics.write(args.metrics)
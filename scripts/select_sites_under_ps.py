@@ -0,0 +1,96 @@
+import argparse
+import csv
+import os
+import re
+import numpy as np
+from results_store import load_site_columns
+from stage_metrics import StageMetrics
+
+# results files as written by the pipeline: <gene>_<method>_results.npz (or the HyPhy JSON)
+RESULTS_NAME = re.compile(r"^(?P<gene>.+)_(?P<method>slac|fel|meme|fubar)_results\.(npz|json)$")
+# statistic that selects a site per method, whether small or large values select it and
+# the columns that are read; FEL also reports purifying selection, so beta > alpha is required
+SELECTION_STATISTICS = {
+    "fel": ("p-value", "max", ["alpha", "beta", "p-value"]),
+    "meme": ("p-value", "max", ["p-value"]),
+    "slac": ("P [dN/dS > 1]", "max", ["P [dN/dS > 1]"]),
+    "fubar": ("Prob[alpha<beta]", "min", ["Prob[alpha<beta]"]),
+}
+COORDINATE_COLUMNS = ["reference_codon", "reference_label", "genome_position"]
+TABLE_COLUMNS = ["gene", "method", "site", "reference_site", "reference_label", "genome_position", "statistic", "value"]
+SUMMARY_COLUMNS = ["gene", "method", "sites", "selected", "statistic", "threshold"]
+
+
+# gene and method of a results file
+def parse_results_name(path):
+    match = RESULTS_NAME.match(os.path.basename(path))
+    if match is None:
+        raise ValueError(f"Cannot determine gene and method of {path} (expected <gene>_<method>_results.npz)")
+    return match.group("gene"), match.group("method")
+
+# boolean mask of the sites under positive selection
+def select_sites(method, table, threshold):
+    statistic, bound, _ = SELECTION_STATISTICS[method]
+    values = table[statistic]
+    selected = values < threshold if bound == "max" else values > threshold
+    if method == "fel":
+        selected &= table["beta"] > table["alpha"]
+    return selected
+
+# rows of the selected sites in MSA and reference coordinates (1-based, empty for
+# columns inserted relative to the reference or unknown coordinates)
+def selected_rows(gene, method, table, selected):
+    statistic = SELECTION_STATISTICS[method][0]
+    n_sites = len(table["site"])
+    reference_codon = table.get("reference_codon", np.full(n_sites, -1))[selected]
+    genome_position = table.get("genome_position", np.full(n_sites, -1))[selected]
+    reference_label = table.get("reference_label", np.full(n_sites, ""))[selected]
+    for site, codon, label, position, value in zip(table["site"][selected].tolist(), reference_codon.tolist(), reference_label.tolist(),
+                                                   genome_position.tolist(), table[statistic][selected].tolist()):
+        yield [gene, method, site, codon + 1 if codon >= 0 else "", label, position + 1 if position >= 0 else "", statistic, f"{value:g}"]
+
+# write the selected sites of all results and their summary, returns the number of analysed and selected sites
+def select_sites_under_ps(paths, thresholds, table_path, summary_path):
+    analysed = n_selected = 0
+    results = sorted((parse_results_name(path) + (path,) for path in paths), key=lambda x: (x[0], list(SELECTION_STATISTICS).index(x[1])))
+    with open(table_path, "w", newline="") as table_file, open(summary_path, "w", newline="") as summary_file:
+        table_writer = csv.writer(table_file, delimiter="\t")
+        summary_writer = csv.writer(summary_file, delimiter="\t")
+        table_writer.writerow(TABLE_COLUMNS)
+        summary_writer.writerow(SUMMARY_COLUMNS)
+        for gene, method, path in results:
+            statistic, _, columns = SELECTION_STATISTICS[method]
+            table = load_site_columns(path, columns + COORDINATE_COLUMNS)
+            missing = [column for column in columns if column not in table]
+            if missing:
+                raise ValueError(f"{path} has no column {', '.join(missing)}")
+            selected = select_sites(method, table, thresholds[method])
+            table_writer.writerows(selected_rows(gene, method, table, selected))
+            summary_writer.writerow([gene, method, len(table["site"]), int(selected.sum()), statistic, thresholds[method]])
+            analysed += len(table["site"])
+            n_selected += int(selected.sum())
+    return analysed, n_selected
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Select the sites under positive selection of all genes and methods (SLAC, FEL, MEME, FUBAR) into one table')
+    arguments.add_argument('-r', '--results', help = 'Results stores (or HyPhy JSON) named <gene>_<method>_results.npz', required = True, type = str, nargs='+')
+    arguments.add_argument('--fel_pvalue', help = 'Maximal p-value of FEL sites with beta > alpha [default: 0.1]', default = 0.1, type = float)
+    arguments.add_argument('--meme_pvalue', help = 'Maximal p-value of MEME sites [default: 0.1]', default = 0.1, type = float)
+    arguments.add_argument('--slac_pvalue', help = 'Maximal p-value of SLAC sites (P [dN/dS > 1]) [default: 0.1]', default = 0.1, type = float)
+    arguments.add_argument('--fubar_posterior', help = 'Minimal posterior probability of FUBAR sites (Prob[alpha<beta]) [default: 0.9]', default = 0.9, type = float)
+    arguments.add_argument('-o', '--output', help = 'Table of the selected sites (TSV)', required = True, type = str)
+    arguments.add_argument('-s', '--summary', help = 'Number of analysed and selected sites per gene and method (TSV)', required = True, type = str)
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("select_sites_under_ps")
+    thresholds = {"fel": args.fel_pvalue, "meme": args.meme_pvalue, "slac": args.slac_pvalue, "fubar": args.fubar_posterior}
+    analysed, selected = select_sites_under_ps(args.results, thresholds, args.output, args.summary)
+
+    if args.metrics:
+        metrics.records_in, metrics.records_out = analysed, selected
+        metrics.extra["results"] = len(args.results)
+        metrics.read(*args.results)
+        metrics.wrote(args.output, args.summary)
+        metrics.write(args.metrics)
\ No newline at end of file
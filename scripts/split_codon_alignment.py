@@ -0,0 +1,49 @@
+import argparse
+from contextlib import ExitStack
+from fasta_io import iter_fasta, write_fasta_record
+from stage_metrics import StageMetrics
+
+
+# file name of a site block; the index is zero-padded so the blocks sort in alignment order
+def block_file_name(prefix, block):
+    return f"{prefix}_block_{block:04d}.fas"
+
+
+# split a codon alignment into blocks of block_size codons (the last block may be
+# shorter) in a single pass, every record is written to all blocks as it is read
+def split_codon_alignment(msa_handle, prefix, block_size):
+    with ExitStack() as stack:
+        outputs = None
+        records = 0
+        for header, sequence in iter_fasta(msa_handle):
+            if outputs is None:
+                n_codons = len(sequence) // 3
+                n_blocks = max(1, -(-n_codons // block_size))
+                outputs = [stack.enter_context(open(block_file_name(prefix, b), "w")) for b in range(n_blocks)]
+            for b, output in enumerate(outputs):
+                write_fasta_record(output, header, sequence[3*b*block_size:3*(b+1)*block_size])
+            records += 1
+    return len(outputs) if outputs else 0, records
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Split a codon alignment into blocks of sites that can be analysed independently')
+    arguments.add_argument('-i', '--input', help = 'codon alignment in FASTA format', required = True, type = argparse.FileType('r'))
+    arguments.add_argument('-p', '--prefix', help = 'prefix of the block files (<prefix>_block_<n>.fas)', required = True, type = str)
+    arguments.add_argument('-b', '--block_size', help = 'number of codons per block', required = True, type = int)
+    arguments.add_argument('-m', '--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    if args.block_size < 1:
+        arguments.error("--block_size has to be positive")
+    metrics = StageMetrics("split_codon_alignment")
+    n_blocks, records = split_codon_alignment(args.input, args.prefix, args.block_size)
+    print(f"Split {records} sequences into {n_blocks} blocks of {args.block_size} codons")
+
+    if args.metrics:
+        metrics.records_in = records
+        metrics.records_out = records * n_blocks
+        metrics.extra["blocks"] = n_blocks
+        metrics.read(args.input.name)
+        metrics.wrote(*[block_file_name(args.prefix, b) for b in range(n_blocks)])
+        metrics.write(args.metrics)
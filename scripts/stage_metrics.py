@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# Performance metrics of a pipeline stage (wall time, peak RSS, records and bytes
+# in and out, unique versus total sequences), written as a small JSON record
+# <gene>_<stage>_metrics.json that PIPELINE_REPORT aggregates per gene and run.
+class StageMetrics:
+
+    def __init__(self, stage, gene=None):
+        self.stage = stage
+        self.gene = gene
+        self.start = time.perf_counter()
+        self.records_in = None
+        self.records_out = None
+        self.unique = None
+        self.total = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.extra = {}
+
+    # add the size of input files (stdin and missing files are skipped)
+    def read(self, *paths):
+        self.bytes_read += sum(os.path.getsize(path) for path in paths if path and path != "-" and os.path.isfile(path))
+
+    # add the size of output files
+    def wrote(self, *paths):
+        self.bytes_written += sum(os.path.getsize(path) for path in paths if path and os.path.isfile(path))
+
+    def as_dict(self):
+        # ru_maxrss is in KB on Linux; children covers the tools a wrapper runs
+        peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        return dict({"stage": self.stage, "gene": self.gene, "wall_seconds": round(time.perf_counter() - self.start, 3),
+                     "peak_rss_mb": round(peak_rss / 1024, 1), "records_in": self.records_in, "records_out": self.records_out,
+                     "bytes_read": self.bytes_read, "bytes_written": self.bytes_written, "unique": self.unique, "total": self.total}, **self.extra)
+
+    def write(self, path):
+        with open(path, "w") as output:
+            json.dump(self.as_dict(), output, indent=4)
+
+
+# number of records of a FASTA file, counted from the header lines only
+def count_fasta_records(path):
+    records = 0
+    with open(path, "rb") as handle:
+        for line in handle:
+            if line.startswith(b">"):
+                records += 1
+    return records
+
+
+# number of records and of distinct sequences of a FASTA file
+def count_unique_records(path):
+    from fasta_io import iter_fasta
+    from compress_duplicates import sequence_digest
+    digests = set()
+    records = 0
+    with open(path) as handle:
+        for _, sequence in iter_fasta(handle):
+            digests.add(sequence_digest(sequence))
+            records += 1
+    return records, len(digests)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Write the metrics record of a stage that is not a Python script: counts the FASTA records and bytes of its inputs and outputs and, if a command is given (after --), runs it and measures its wall time and peak RSS')
+    arguments.add_argument('-s', '--stage', help = 'Name of the stage', required = True, type = str)
+    arguments.add_argument('-g', '--gene', help = 'Gene the stage ran for', required = False, type = str)
+    arguments.add_argument('-i', '--inputs', help = 'Input FASTA files (records in)', default = [], type = str, nargs='+')
+    arguments.add_argument('-o', '--outputs', help = 'Output FASTA files (records out)', default = [], type = str, nargs='+')
+    arguments.add_argument('-u', '--unique', help = 'Also count the distinct sequences of the outputs', action = 'store_true')
+    arguments.add_argument('-m', '--metrics', help = 'Write the metrics (JSON) here', required = True, type = str)
+    arguments.add_argument('command', help = 'Command of the stage (after --)', nargs = argparse.REMAINDER)
+    args = arguments.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    metrics = StageMetrics(args.stage, args.gene)
+    returncode = subprocess.call(command) if command else 0
+    if returncode == 0:
+        metrics.read(*args.inputs)
+        metrics.wrote(*args.outputs)
+        metrics.records_in = sum(count_fasta_records(path) for path in args.inputs)
+        if args.unique:
+            counts = [count_unique_records(path) for path in args.outputs]
+            metrics.records_out = metrics.total = sum(records for records, _ in counts)
+            metrics.unique = sum(unique for _, unique in counts)
+        else:
+            metrics.records_out = sum(count_fasta_records(path) for path in args.outputs)
+        metrics.write(args.metrics)
+    sys.exit(returncode)
@@ -1,19 +1,206 @@
-import sys 
+import sys
 import json
 import numpy as np
 import re
 
-# load FEL results
-def load_json_file(file_handle):
-    raw = re.sub(r'\binf\b', 'Infinity', file_handle.read())
+# end of a string or an escape inside it
+STRING_END = re.compile(rb'[\\"]')
+# escaped characters, replaced by two placeholders of the same length before the brackets are counted
+ESCAPE = re.compile(rb'\\.', re.DOTALL)
+WHITESPACE = re.compile(rb'\s*')
+SCALAR = re.compile(rb'[^\s,\]}]*')
+# HyPhy's bare inf values and the inf of strings; they are told apart by the quotes before them
+INF_TOKEN = re.compile(r'inf(?!\w)')
+ESCAPED_CHARACTER = re.compile(r'\\.', re.DOTALL)
+# quotes and brackets as 1 and the change of the nesting depth (+1, -1) they cause
+STRUCTURAL = np.zeros(256, dtype=bool)
+STRUCTURAL[list(b'"[]{}')] = True
+DEPTH_CHANGE = np.zeros(256, dtype=np.int8)
+DEPTH_CHANGE[list(b"[{")] = 1
+DEPTH_CHANGE[list(b"]}")] = -1
+CHUNK_SIZE = 1 << 20
+# the site table of FEL, MEME, SLAC and FUBAR results
+MLE_SECTIONS = ["MLE.content", "MLE.headers"]
+
+
+# parse JSON text with HyPhy's inf values, which become the Infinity of Python's json; an inf
+# is a value if an even number of unescaped quotes comes before it, i.e. it is outside of strings
+def parse_hyphy_json(text):
+    parts = []
+    end = 0
+    in_string = False
+    for match in INF_TOKEN.finditer(text):
+        segment = text[end:match.start()]
+        quotes = (ESCAPED_CHARACTER.sub("", segment) if "\\" in segment else segment).count('"')
+        in_string ^= quotes % 2 == 1
+        parts.append(segment)
+        parts.append(match.group() if in_string else "Infinity")
+        end = match.end()
+    parts.append(text[end:])
+    return json.loads("".join(parts))
+
+
+# Streaming reader of a (HyPhy) JSON file: the file is read in binary chunks and values
+# are either skipped or captured and parsed. Objects and arrays are skipped chunk by
+# chunk, counting the brackets outside of strings with numpy. Only the captured values
+# are held in memory, so sections like "branch attributes" of large MEME or SLAC
+# results are never materialised when they are not needed.
+class StreamingJsonReader:
+
+    def __init__(self, file_handle):
+        # the binary stream below a text file, text is encoded chunk by chunk otherwise (e.g. StringIO)
+        self.binary = getattr(file_handle, "buffer", None)
+        self.file_handle = file_handle
+        self.buffer = b""
+        self.pos = 0
+        self.eof = False
+        # start of the value being captured in the buffer and the bytes captured before it
+        self.capture_start = None
+        self.captured = []
+
+    # read the next chunk, the consumed part of the buffer is dropped; False at the end of the file
+    def more(self):
+        if self.eof:
+            return False
+        if self.capture_start is not None:
+            self.captured.append(self.buffer[self.capture_start:self.pos])
+            self.capture_start = 0
+        chunk = self.binary.read(CHUNK_SIZE) if self.binary is not None else self.file_handle.read(CHUNK_SIZE).encode()
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return not self.eof
+
+    # next non-whitespace character without consuming it, "" at the end of the file
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return chr(self.buffer[self.pos])
+            if not self.more():
+                return ""
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError(f"Expected '{character}' but found '{self.peek()}'")
+        self.pos += 1
+
+    # position after the string starting at pos
+    def skip_string(self):
+        self.pos += 1
+        while True:
+            match = STRING_END.search(self.buffer, self.pos)
+            if match is None or match.end() == len(self.buffer) and match.group() == b"\\":
+                self.pos = match.start() if match is not None else len(self.buffer)
+                if not self.more():
+                    raise ValueError("Unterminated string")
+            elif match.group() == b"\\":
+                self.pos = match.end() + 1
+            else:
+                self.pos = match.end()
+                return
+
+    # position after the object or array starting at pos
+    def skip_container(self):
+        depth, in_string = 0, False
+        while True:
+            segment = ESCAPE.sub(b"__", self.buffer[self.pos:])
+            # an unpaired backslash at the end escapes the first character of the next chunk
+            length = len(segment) - segment.endswith(b"\\")
+            codes = np.frombuffer(segment, dtype=np.uint8, count=length)
+            positions = np.flatnonzero(STRUCTURAL[codes])
+            characters = codes[positions]
+            # quotes seen so far, the brackets count while the number is even
+            quotes = np.cumsum(characters == ord('"')) + in_string
+            levels = depth + np.cumsum(DEPTH_CHANGE[characters] * (quotes % 2 == 0))
+            closed = np.flatnonzero(levels == 0)
+            if closed.size:
+                self.pos += int(positions[closed[0]]) + 1
+                return
+            if positions.size:
+                depth, in_string = int(levels[-1]), bool(quotes[-1] % 2)
+            self.pos += length
+            if not self.more():
+                raise ValueError("Unexpected end of the file")
+
+    # position after the number, literal, string, object or array starting at pos
+    def skip_value(self):
+        character = self.peek()
+        if character == '"':
+            self.skip_string()
+        elif character in ("[", "{"):
+            self.skip_container()
+        else:
+            while True:
+                end = SCALAR.match(self.buffer, self.pos).end()
+                if end < len(self.buffer) or not self.more():
+                    break
+            if end == self.pos:
+                raise ValueError(f"Unexpected '{character}'")
+            self.pos = end
+
+    # the value starting at pos, parsed
+    def read_value(self):
+        self.peek()
+        self.capture_start, self.captured = self.pos, []
+        self.skip_value()
+        self.captured.append(self.buffer[self.capture_start:self.pos])
+        self.capture_start = None
+        captured, self.captured = self.captured, []
+        return parse_hyphy_json(b"".join(captured).decode())
+
+    # the members of the object starting at pos that are in the selection, a nested
+    # dict of keys that is None where the whole value is wanted
+    def read_selected(self, selection):
+        result = {}
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return result
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            if key not in selection:
+                self.skip_value()
+            elif selection[key] is None or self.peek() != "{":
+                result[key] = self.read_value()
+            else:
+                result[key] = self.read_selected(selection[key])
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return result
+
+
+# nested selection of dotted section paths, e.g. ["MLE.content", "MLE.headers"]
+def selection_tree(sections):
+    tree = {}
+    for section in sections:
+        node = tree
+        keys = section.split(".")
+        for key in keys[:-1]:
+            if node.get(key, {}) is None:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = None
+    return tree
+
+# load HyPhy results (or any JSON file); with sections only these parts are read,
+# e.g. load_json_file(handle, ["MLE.content", "MLE.headers"]) skips the branch attributes
+def load_json_file(file_handle, sections=None):
     try:
-        json_dict = json.loads(raw)
+        if sections is None:
+            json_dict = parse_hyphy_json(file_handle.read())
+        else:
+            json_dict = StreamingJsonReader(file_handle).read_selected(selection_tree(sections))
         return json_dict
     except Exception as e:
         print(e)
         sys.exit(1)
-    
-    
+
+
 # create list of str when nargs='+' is used for arguments
 def convert_nargs_to_list(input):
     input_list = [x.replace("[","").replace("]","").replace(",","") for x in input]
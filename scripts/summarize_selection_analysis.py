@@ -26,6 +26,9 @@ import operator
 import collections
 import BioExt
 from   Bio import SeqIO
+from   duplicates_io import load_duplicates
+from   coordinate_map import CoordinateMap, aligned_to_ungapped
+import numpy as np
 
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
@@ -47,10 +50,11 @@ arguments.add_argument('-p', '--prime',  help = 'PRIME results file', required =
 arguments.add_argument('-u', '--fubar',  help = 'FUBAR results file', required = False, type = argparse.FileType('r'))
 arguments.add_argument('-P', '--pvalue',  help = 'p-value', required = False, type = float, default = 0.1)
 arguments.add_argument('-c', '--coordinates',  help = 'An alignment with reference sequence (assumed to start with NC)', required = True, type = argparse.FileType('r'))
+arguments.add_argument('-C', '--coordinate-map',  help = 'If provided, the coordinate map (.npz) of the gene is used instead of aligning the consensus to the reference genome', required = False, type = str)
 arguments.add_argument('-T', '--epitopes',  help = 'If provided, an epitope map in a JSON format', required = False, type = argparse.FileType('r'))
 arguments.add_argument('-B', '--rbd-affinity',  help = 'If provided, an rbd mutation map in a JSON format', required = False, type = argparse.FileType('r'))
 arguments.add_argument('-D', '--database', help ='Primary database record to extract sequence information from', required = True, type = argparse.FileType('r'))
-arguments.add_argument('-d', '--duplicates', help ='The JSON file recording compressed sequence duplicates', required = True, type = argparse.FileType('r'))
+arguments.add_argument('-d', '--duplicates', help ='The JSON file (or binary duplicates store) recording compressed sequence duplicates', required = True, type = argparse.FileType('r'))
 arguments.add_argument('-M', '--MAF', help ='Also include sites with hapoltype MAF >= this frequency', required = False, type = float, default = 0.2)
 arguments.add_argument('-E', '--evolutionary_annotation', help ='If provided use evolutionary likelihood annotation', required = False, type = argparse.FileType('r'))
 arguments.add_argument('-F', '--evolutionary_fragment', help ='Used in conjunction with evolutionary annotation to designate the fragment to look up', required = False, type = str)
@@ -65,7 +69,7 @@ arguments.add_argument('--frame_shift', help = 'Used in conjunction with annotat
 import_settings = arguments.parse_args()
 
 db = json.load (import_settings.database)
-dups = json.load (import_settings.duplicates)
+dups = load_duplicates (import_settings.duplicates).as_dict()
 date_parse_format = "%Y%m%d"
 gene_setting = import_settings.output.name.split('.')[-2]
 
@@ -282,49 +286,37 @@ for seq_record in SeqIO.parse(import_settings.coordinates, "fasta"):
 
 ref_seq = ''.join ([max(pos.items(), key=operator.itemgetter(1))[0] for pos in consensus ])
 
-aligned_str = None
+if import_settings.coordinate_map:
+    # reuse the coordinate map of the gene instead of aligning the consensus to the genome
+    coordinate_map = CoordinateMap.load(import_settings.coordinate_map)
+    ref_seq_map = coordinate_map.msa_to_genome(np.arange(len(aligned_to_ungapped(ref_seq, 3))))
+else:
+    aligned_str = None
 
-def output_record (x):
-    global aligned_str
-    l = list(x)
-    if len (l) == 1:
-        aligned_str = l[0]
+    def output_record (x):
+        global aligned_str
+        l = list(x)
+        if len (l) == 1:
+            aligned_str = l[0]
 
-def ignore_record (x):
-    pass
+    def ignore_record (x):
+        pass
 
-for s in ref_genes:
-    _align_par (SeqRecord(Seq(s[1]),id=s[0]),[SeqRecord(Seq(ref_seq),id="ref")],
-                score_matrix_,False,False,0.8, ignore_record, output_record)
-    if (aligned_str is not None):
-        break
+    for s in ref_genes:
+        _align_par (SeqRecord(Seq(s[1]),id=s[0]),[SeqRecord(Seq(ref_seq),id="ref")],
+                    score_matrix_,False,False,0.8, ignore_record, output_record)
+        if (aligned_str is not None):
+            break
 
-ref_map = aligned_str.seq.strip('-')
-c       = 0
-i       = 0
-map_to_genome = []
-while i < len (ref_map):
-    #ref_seq_map.append (c)
-    if ref_map[i:i+3] != '---':
-        map_to_genome.append (i)
-
-    i+=3
-
-
-i = 0
-c = 0
-while i < len (ref_seq):
-    #ref_seq_map.append (c)
-    if ref_seq[i:i+3] != '---':
-        #print (c)
-        ref_seq_map.append (map_to_genome[c//3] + aligned_str.annotations['position'])
-        c += 3
-    else:
-        ref_seq_map.append (-1)
-    i+=3
+    ref_map = str(aligned_str.seq.strip('-'))
+    map_to_genome = np.flatnonzero(aligned_to_ungapped(ref_map, 3) >= 0)*3
+
+    codon_map = aligned_to_ungapped(ref_seq, 3)
+    ref_seq_map = np.full(len(codon_map), -1)
+    ref_seq_map[codon_map >= 0] = map_to_genome[codon_map[codon_map >= 0]] + aligned_str.annotations['position']
 
 
-ref_seq_map = [(k - import_settings.offset)//3 for k in ref_seq_map]
+ref_seq_map = ((ref_seq_map - import_settings.offset)//3).tolist()
 
 
 if ref_seq_map is None:
@@ -5,13 +5,15 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.figure_factory as ff
-from subfuctions import load_json_file, convert_nargs_to_list
-from Bio import SeqIO
+from subfuctions import convert_nargs_to_list
+from duplicates_io import load_duplicates
+from fasta_io import iter_fasta, open_input, record_name
+from residue_counts import ResidueCounts
 
 
 def get_sample_dates(path, acc_col, date_col):
-    df = pd.read_csv(path)
-    df = df[[acc_col, date_col]]
+    with open_input(path) as csv:
+        df = pd.read_csv(csv, usecols=[acc_col, date_col])
     df.rename(columns={acc_col: "accessions", date_col: "date"}, inplace=True)
     df.set_index("accessions", inplace=True)
     return df
@@ -21,55 +23,75 @@ def get_file_for_gene(gene, paths_list):
     return [x for x in paths_list if x.split("/")[-1].startswith(gene+"_")][0]
 
 
-def create_site_subdict(site, gene, position, msa_paths, duplicates_paths):
-    sub_dict = {}
-    sub_dict["gene"] = gene
-    sub_dict["position"] = position
-    sub_dict["msa"] = get_file_for_gene(gene, msa_paths)
-    sub_dict["duplicates"] = get_file_for_gene(gene, duplicates_paths)
-    return sub_dict
-
-
-def create_sites_dict(genes, sites, msa_paths, duplicates_paths):
-    sites_dict = {}
+# positions of the sites per gene together with the files of the gene (MSA and duplicates
+# or residue counts), so that the files of a gene are read once for all of its sites
+def create_genes_dict(genes, sites, files):
+    genes_dict = {}
     for site in sites:
         splitted = site.split(":")
         gene = splitted[0]
         position = splitted[1]
         if gene in genes:
-            sub_dict = create_site_subdict(site, gene, position, msa_paths, duplicates_paths)
-            sites_dict[site] = sub_dict
+            if gene not in genes_dict:
+                genes_dict[gene] = {name: get_file_for_gene(gene, paths) for name, paths in files.items()}
+                genes_dict[gene]["positions"] = []
+            if position not in genes_dict[gene]["positions"]:
+                genes_dict[gene]["positions"].append(position)
         else:
             print('No graph could be generated for site "{}" since the gene {} was not analyzed by the pipeline. Change the config to add the gene {} to the pipeline.'.format(site, gene, gene))
-    return sites_dict
-
-
-def add_sites_from_msa(df, msa_path, position):
-    df[position] = np.nan
-    for record in SeqIO.parse(msa_path, "fasta"):
-        acc = record.id.replace("_", "-")
-        df.at[acc, position] = record.seq[int(position)-1]
-    return df
-
-
-def check_if_duplicates_exist(duplicates_dict, acc):
-    try:
-        test = duplicates_dict[acc]["1"]
-        return True
-    except KeyError:
-        return False
-
-
-def add_sites_for_duplicates(df, duplicates_path, position):
-    with open(duplicates_path, "r") as duplicates_file:
-        duplicates = load_json_file(duplicates_file)
-        for key, sub_dict in duplicates.items():
-            has_duplicates = True if len(sub_dict.keys()) > 1 else False
-            if has_duplicates:
-                for sub_key, value in sub_dict.items():
-                    if sub_key != "0":
-                        df.at[value.replace("_", "-"), position] = df.at[key.replace("_", "-"), position]
-    return df
+    return genes_dict
+
+
+# residues of every MSA record at the positions (one column per position, NaN beyond the
+# end of a sequence) in a single pass over the MSA; blocks of records are sliced as a
+# character matrix
+def get_msa_columns(msa_path, positions, block_size=10000):
+    columns = np.array([int(position) - 1 for position in positions])
+    width = columns.max() + 1
+    names = []
+    residues = []
+    block = []
+    with open_input(msa_path) as msa:
+        for header, sequence in iter_fasta(msa):
+            names.append(record_name(header).replace("_", "-"))
+            block.append(sequence.encode())
+            if len(block) == block_size:
+                residues.append(slice_columns(block, columns, width))
+                block = []
+    if block:
+        residues.append(slice_columns(block, columns, width))
+    residues = np.concatenate(residues) if residues else np.empty((0, len(columns)), dtype="S1")
+    df = pd.DataFrame(residues.astype(str), index=pd.Index(names, name="representative"), columns=positions)
+    return df.replace("", np.nan)
+
+
+# residues of a block of sequences at the columns (0-based), shorter sequences are padded with empty residues
+def slice_columns(block, columns, width):
+    matrix = np.array(block, dtype="S{}".format(max(width, max(len(sequence) for sequence in block))))
+    return matrix.view(np.uint8).reshape(len(block), -1)[:, columns].view("S1")
+
+
+# residues of every sequence with a sampling date: the duplicates get the residues of their
+# representative through one join of the clusters with the MSA columns and the metadata
+def expand_duplicates(df_residues, duplicates_path, df_metadata):
+    members = []
+    representatives = []
+    for representative, cluster in load_duplicates(duplicates_path).items():
+        members.extend(cluster)
+        representatives.extend([representative] * len(cluster))
+    df_clusters = pd.DataFrame({"accessions": members, "representative": representatives}).apply(lambda x: x.str.replace("_", "-"))
+    # sequences of the MSA without a duplicates cluster represent themselves
+    singletons = df_residues.index.difference(df_clusters["accessions"])
+    df_clusters = pd.concat([df_clusters, pd.DataFrame({"accessions": singletons, "representative": singletons})], ignore_index=True)
+    df = df_clusters.join(df_residues, on="representative", how="inner")
+    return df.join(df_metadata, on="accessions", how="inner")
+
+
+# counts per date and residue of a site from the residue counts of its gene (residue_counts.py),
+# the position is the reference position of the site
+def get_counts_df(counts, position):
+    df = counts.site_table(position)
+    return df[["date", "residue", "count"]].rename(columns={"residue": position})
 
 
 def get_grouped_df(df, position):
@@ -81,11 +103,11 @@ def create_figure(df, gene, position):
     fig = px.bar(df, x="date", y="count", color=position)
     fig.update_yaxes(
         title = "#Sequences with residue",
-        titlefont_size = 13,
+        title_font_size = 13,
     )
     fig.update_xaxes(
         title = "Collection date",
-        titlefont_size = 13,
+        title_font_size = 13,
     )
     fig.update(
         layout_title = "Temporal Evolution of {}:{}".format(gene, position),
@@ -101,27 +123,32 @@ if __name__ == "__main__":
     arguments = argparse.ArgumentParser(description='Create a temporal evolution plot')
     arguments.add_argument('-g', '--genes',  required=True, help = 'List of genes analyzed by the pipeline', type = str, nargs='+')
     arguments.add_argument('-s', '--sites',  required=True, help = 'List of codons to generate plots for', type = str, nargs='+')
-    arguments.add_argument('-m', '--msa',  required=True, help = 'Protein Multiple Sequence Alignment of the sequences', type = str, nargs='+')
-    arguments.add_argument('-c', '--metadata',  required=True, help = 'Metadata of the sequences', type = argparse.FileType('r'))
-    arguments.add_argument('-d', '--duplicates', required=True, help = 'Overview of duplicated sequences', type = str, nargs='+')
+    arguments.add_argument('-r', '--counts',  required=False, help = 'Residue counts of the genes (<gene>_residue_counts.npz); the sites are then reference positions and the MSA, metadata and duplicates are not needed', type = str, nargs='+')
+    arguments.add_argument('-m', '--msa',  required=False, help = 'Protein Multiple Sequence Alignment of the sequences', type = str, nargs='+')
+    arguments.add_argument('-c', '--metadata',  required=False, help = 'Metadata of the sequences (optionally gzip/BGZF/zstd compressed)', type = str)
+    arguments.add_argument('-d', '--duplicates', required=False, help = 'Overview of duplicated sequences', type = str, nargs='+')
     arguments.add_argument('-a', '--acc_col', required=False, help = 'Column name of the metadata file storing the accession numbers', type = str, default="IMS_ID")
     arguments.add_argument('-t', '--date_col', required=False, help = 'Column name of the metadata storing the sampling dates', type = str, default="DATE_DRAW")
     args = arguments.parse_args()
     
-    df_metadata = get_sample_dates(args.metadata, args.acc_col, args.date_col)
+    if not args.counts and not (args.msa and args.metadata and args.duplicates):
+        arguments.error("either --counts or --msa, --metadata and --duplicates are required")
     
     sites = convert_nargs_to_list(args.sites)
     genes = convert_nargs_to_list(args.genes)
-    msa_paths = convert_nargs_to_list(args.msa)
-    duplicates_paths = convert_nargs_to_list(args.duplicates)
-    
-    sites_dict = create_sites_dict(genes, sites, msa_paths, duplicates_paths)
     
-    for site, sub_dict in sites_dict.items():
-        df_tmp = df_metadata.copy()
-        df_site = add_sites_from_msa(df_tmp, sub_dict["msa"], sub_dict["position"])
-        df_site = add_sites_for_duplicates(df_site, sub_dict["duplicates"], sub_dict["position"])
-        df_site = df_site.dropna() # samples with NaN-values here were filtered out in previous pipeline steps
-        df_site = get_grouped_df(df_site, sub_dict["position"])
-        create_figure(df_site, sub_dict["gene"], sub_dict["position"])
-    
\ No newline at end of file
+    if args.counts:
+        genes_dict = create_genes_dict(genes, sites, {"counts": convert_nargs_to_list(args.counts)})
+        for gene, sub_dict in genes_dict.items():
+            with ResidueCounts(sub_dict["counts"]) as counts:
+                for position in sub_dict["positions"]:
+                    create_figure(get_counts_df(counts, position), gene, position)
+    else:
+        df_metadata = get_sample_dates(args.metadata, args.acc_col, args.date_col)
+        genes_dict = create_genes_dict(genes, sites, {"msa": convert_nargs_to_list(args.msa), "duplicates": convert_nargs_to_list(args.duplicates)})
+        for gene, sub_dict in genes_dict.items():
+            df_residues = get_msa_columns(sub_dict["msa"], sub_dict["positions"])
+            df_gene = expand_duplicates(df_residues, sub_dict["duplicates"], df_metadata)
+            for position in sub_dict["positions"]:
+                df_site = get_grouped_df(df_gene, position) # samples with NaN-values here were filtered out in previous pipeline steps
+                create_figure(df_site, gene, position)
\ No newline at end of file
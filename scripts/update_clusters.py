@@ -0,0 +1,100 @@
+import argparse
+import shutil
+from compress_duplicates import sequence_digest
+from duplicates_io import load_duplicates, write_duplicates
+from fasta_io import FastaIndex, iter_fasta, record_name, write_fasta_record
+from stage_metrics import StageMetrics
+
+
+# digest of the sequence of every cluster; the sequences are read from a compressed
+# FASTA file whose records are named after members of the clusters
+def index_clusters(duplicates, sequences_path):
+    index = {}
+    with open(sequences_path) as handle:
+        for header, sequence in iter_fasta(handle):
+            index.setdefault(sequence_digest(sequence), duplicates.cluster_of(record_name(header)))
+    return index
+
+
+# add the clusters of the new sequences to the stored clusters: new clusters with a
+# stored sequence are merged into the stored cluster, the others are appended;
+# returns all clusters and the (name, sequence) of the appended ones
+def update_clusters(stored_dups, stored_sequences_path, new_dups, new_sequences_path):
+    stored_index = index_clusters(stored_dups, stored_sequences_path)
+    clusters = [(representative, list(members)) for representative, members in stored_dups.items()]
+    added = []
+    seen = set()
+    with open(new_sequences_path) as handle:
+        for header, sequence in iter_fasta(handle):
+            new_cluster = new_dups.cluster_of(record_name(header))
+            if new_cluster in seen:
+                continue
+            seen.add(new_cluster)
+            members = new_dups.members(new_cluster)
+            stored_cluster = stored_index.get(sequence_digest(sequence))
+            if stored_cluster is None:
+                clusters.append((members[0], members))
+                added.append((record_name(header), sequence))
+            else:
+                clusters[stored_cluster][1].extend(members)
+    return clusters, added
+
+
+# copy the stored FASTA file and append the given records
+def extend_fasta(stored_path, records, output_path):
+    with open(output_path, "w") as output:
+        with open(stored_path) as stored:
+            shutil.copyfileobj(stored, output)
+        for name, sequence in records:
+            write_fasta_record(output, name, sequence)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Add the compressed new sequences of an incremental run to the stored unique haplotypes and duplicates of the previous run')
+    arguments.add_argument('--stored-protein-duplicates', help = 'protein duplicates of the previous run', required = True, type = str)
+    arguments.add_argument('--stored-nuc-duplicates', help = 'nucleotide duplicates of the previous run', required = True, type = str)
+    arguments.add_argument('--stored-protein-sequences', help = 'compressed protein fasta of the previous run', required = True, type = str)
+    arguments.add_argument('--stored-nuc-sequences', help = 'compressed nucleotide fasta of the previous run', required = True, type = str)
+    arguments.add_argument('--protein-duplicates', help = 'protein duplicates of the new sequences', required = True, type = str)
+    arguments.add_argument('--nuc-duplicates', help = 'nucleotide duplicates of the new sequences', required = True, type = str)
+    arguments.add_argument('--protein-sequences', help = 'compressed protein fasta of the new sequences', required = True, type = str)
+    arguments.add_argument('--nuc-sequences', help = 'compressed nucleotide fasta of the new sequences', required = True, type = str)
+    arguments.add_argument('--protein-output', help = 'compressed protein fasta output file of all sequences', required = True, type = str)
+    arguments.add_argument('--nuc-output', help = 'compressed nucleotide fasta output file of all sequences', required = True, type = str)
+    arguments.add_argument('--protein-duplicates-output', help = 'protein duplicates output file of all sequences (JSON if it ends with .json, binary duplicates store otherwise)', required = True, type = str)
+    arguments.add_argument('--nuc-duplicates-output', help = 'nucleotide duplicates output file of all sequences (JSON if it ends with .json, binary duplicates store otherwise)', required = True, type = str)
+    arguments.add_argument('--added-proteins', help = 'write the protein sequences of the new nucleotide haplotypes here', required = True, type = str)
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
+    args = arguments.parse_args()
+
+    metrics = StageMetrics("update_clusters")
+
+    protein_clusters, _ = update_clusters(load_duplicates(args.stored_protein_duplicates), args.stored_protein_sequences,
+                                          load_duplicates(args.protein_duplicates), args.protein_sequences)
+    write_duplicates(args.protein_duplicates_output, protein_clusters)
+    del protein_clusters
+
+    new_nuc_dups = load_duplicates(args.nuc_duplicates)
+    nuc_clusters, added = update_clusters(load_duplicates(args.stored_nuc_duplicates), args.stored_nuc_sequences,
+                                          new_nuc_dups, args.nuc_sequences)
+    write_duplicates(args.nuc_duplicates_output, nuc_clusters)
+    metrics.records_in = sum(new_nuc_dups.cluster_sizes())
+    metrics.total = sum(len(members) for _, members in nuc_clusters)
+    metrics.unique = len(nuc_clusters)
+    metrics.records_out = len(added)
+    del nuc_clusters
+
+    # the protein MSA holds the protein sequence of every unique nucleotide haplotype
+    with FastaIndex(args.protein_sequences) as protein_index:
+        added_proteins = [(name, protein_index.fetch(name)) for name, _ in added]
+    extend_fasta(args.stored_nuc_sequences, added, args.nuc_output)
+    extend_fasta(args.stored_protein_sequences, added_proteins, args.protein_output)
+    with open(args.added_proteins, "w") as output:
+        for name, sequence in added_proteins:
+            write_fasta_record(output, name, sequence)
+    print(f"Added {len(added)} new nucleotide haplotypes")
+
+    if args.metrics:
+        metrics.read(args.stored_protein_sequences, args.stored_nuc_sequences, args.protein_sequences, args.nuc_sequences)
+        metrics.wrote(args.protein_output, args.nuc_output, args.protein_duplicates_output, args.nuc_duplicates_output, args.added_proteins)
+        metrics.write(args.metrics)
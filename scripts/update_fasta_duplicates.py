@@ -1,24 +1,23 @@
 import json
 import argparse
-from Bio import SeqIO
+from fasta_io import iter_fasta, record_name, write_fasta_record
 
-arguments = argparse.ArgumentParser(description='Report which dates have full report')
-arguments.add_argument('-f', '--fasta-file',   help = 'fasta to overwrite', required = True, type = argparse.FileType('r'))
-arguments.add_argument('-m', '--map-file',   help = 'fasta to filter duplicates', required = True, type = argparse.FileType('r'))
-arguments.add_argument('-o', '--output', help = 'write updated fasta here', required = True, type = argparse.FileType('w'))
-args = arguments.parse_args()
+# Fix FASTA headers while streaming the records
+def rename_fasta_records(fasta_file, output, name_map):
+    for header, sequence in iter_fasta(fasta_file):
+        write_fasta_record(output, name_map[record_name(header)], sequence)
 
-# If one fails, then copy the other to the output. If both fail, then throw an error
-map_json = json.load(args.map_file)
-seqs = list(SeqIO.parse(args.fasta_file, 'fasta'))
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description='Report which dates have full report')
+    arguments.add_argument('-f', '--fasta-file',   help = 'fasta to overwrite', required = True, type = argparse.FileType('r'))
+    arguments.add_argument('-m', '--map-file',   help = 'fasta to filter duplicates', required = True, type = argparse.FileType('r'))
+    arguments.add_argument('-o', '--output', help = 'write updated fasta here', required = True, type = argparse.FileType('w'))
+    args = arguments.parse_args()
 
-# Fix FASTA headers
-for seq in seqs:
-    old_id = seq.id
-    seq.id = map_json[old_id]
-    seq.description = map_json[old_id]
+    # If one fails, then copy the other to the output. If both fail, then throw an error
+    map_json = json.load(args.map_file)
 
-args.fasta_file.close()
+    rename_fasta_records(args.fasta_file, args.output, map_json)
 
-SeqIO.write(seqs, args.output, "fasta")
-args.output.close()
\ No newline at end of file
+    args.fasta_file.close()
+    args.output.close()
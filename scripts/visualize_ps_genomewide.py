@@ -1,26 +1,42 @@
 import argparse
+import csv
 import json
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.figure_factory as ff
-from subfuctions import load_json_file, convert_nargs_to_list
+from subfuctions import load_json_file
+from stage_metrics import StageMetrics
 
     
-def preprocessing(paths_ps, paths_total):
+# selected sites (MSA and reference coordinates) with the value of the selection statistic and
+# number of analysed sites per gene of a method from the tables of select_sites_under_ps.py
+def preprocessing(sites_path, summary_path, method):
     sites_under_ps = {}
     total_sites = {}
-    for p in paths_ps:
-        with open(p, "r") as f:
-            gene = p.split("/")[-1].split("_")[0]
-            ps = [int(x.replace("\n","")) for x in f.readlines()]
-            sites_under_ps[gene] = ps
-    for p in paths_total:
-        with open(p, "r") as f:
-            gene = p.split("/")[-1].split("_")[0]
-            total = int(f.readline())
-            total_sites[gene] = total
+    with open(summary_path, "r") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            if row["method"] == method:
+                sites_under_ps[row["gene"]] = {"site": [], "reference_site": [], "value": [], "statistic": row["statistic"]}
+                total_sites[row["gene"]] = int(row["sites"])
+    with open(sites_path, "r") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            if row["method"] == method:
+                sites = sites_under_ps[row["gene"]]
+                sites["site"].append(int(row["site"]))
+                sites["reference_site"].append(float(row["reference_site"]) if row["reference_site"] else np.nan)
+                sites["value"].append(float(row["value"]))
     return sites_under_ps, total_sites
+
+# vertical line from y0 to y1 at every x as one trace: the segments are separated by gaps and
+# every point carries the hover data of its site
+def site_lines(x, y0, y1, customdata):
+    n = len(x)
+    line_x = np.repeat(np.asarray(x, dtype=float), 3)
+    line_x[2::3] = np.nan
+    line_y = np.tile([y0, y1, np.nan], n)
+    return line_x, line_y, np.repeat(customdata, 3, axis=0)
     
 def create_figure(sites_under_ps, total_sites, gene_lengths):
     fig = px.bar()
@@ -28,10 +44,9 @@ def create_figure(sites_under_ps, total_sites, gene_lengths):
     box_height = 5.5
     elevation = 0.5
     gene_starts = {}
-    elevated = {}
     # setup every 2nd gene to be elevated for better visualization
-    for gene_name in gene_lengths.keys():
-        elevated[gene_name] = True if list(gene_lengths.keys()).index(gene_name) % 2 else False
+    elevated = {gene_name: bool(i % 2) for i, gene_name in enumerate(gene_lengths)}
+    label_x, label_y, labels = [], [], []
     # add the shape for each gene to the plot
     for gene_name, ref_gene_length in gene_lengths.items():
         num_codons = total_sites[gene_name] if gene_name in total_sites else ref_gene_length
@@ -45,25 +60,37 @@ def create_figure(sites_under_ps, total_sites, gene_lengths):
                     opacity=1 if gene_name in sites_under_ps.keys() else 0.4,
                     fillcolor="white" if gene_name in sites_under_ps.keys() else "ghostwhite",
                     )
-        fig.add_trace(go.Scatter(
-            x=[start_pos+num_codons*0.5],
-            y=[box_height+elevation+0.5] if elevated[gene_name] else [-0.5],
-            text=[gene_name],
-            mode="text",
-        ))
+        label_x.append(start_pos+num_codons*0.5)
+        label_y.append(box_height+elevation+0.5 if elevated[gene_name] else -0.5)
+        labels.append(gene_name)
         gene_starts[gene_name] = start_pos
         start_pos = start_pos + num_codons
-    # mark the positive selected sites for every analyzed gene
+    # gene labels
+    fig.add_trace(go.Scatter(
+        x=label_x,
+        y=label_y,
+        text=labels,
+        mode="text",
+        hoverinfo="skip",
+    ))
+    # mark the positive selected sites, one WebGL trace per analyzed gene
     for gene_name, sites in sites_under_ps.items():
-        for s in sites:
-            fig.add_shape(type="line",
-                          x0=gene_starts[gene_name]+s,
-                          x1=gene_starts[gene_name]+s,
-                          y0=0.7 if elevated[gene_name] else 0.2,
-                          y1=box_height+elevation-0.2 if elevated[gene_name] else box_height-0.2,
-                          line=dict(color="red",
-                                    width=0.5)
-                          )
+        if gene_name not in gene_starts or not sites["site"]:
+            continue
+        customdata = np.column_stack([sites["site"], sites["reference_site"], sites["value"]])
+        x, y, customdata = site_lines(gene_starts[gene_name] + np.asarray(sites["site"]),
+                                      0.7 if elevated[gene_name] else 0.2,
+                                      box_height+elevation-0.2 if elevated[gene_name] else box_height-0.2,
+                                      customdata)
+        fig.add_trace(go.Scattergl(
+            x=x,
+            y=y,
+            customdata=customdata,
+            mode="lines",
+            line=dict(color="red", width=0.5),
+            name=gene_name,
+            hovertemplate="MSA site %{customdata[0]}<br>Reference site %{customdata[1]}<br>" + sites["statistic"] + " = %{customdata[2]:.3g}",
+        ))
     # add a custom legend entry
     fig.add_shape(type="rect",
                   x0=start_pos*0.8,
@@ -78,7 +105,8 @@ def create_figure(sites_under_ps, total_sites, gene_lengths):
         text=[" = Positively selected"],
         mode="text",
         textposition="middle left",
-        textfont=dict(size=15)
+        textfont=dict(size=15),
+        hoverinfo="skip",
     ))
     fig.update_yaxes(
         range=[-2,10],
@@ -86,7 +114,7 @@ def create_figure(sites_under_ps, total_sites, gene_lengths):
     )
     fig.update_xaxes(
         title = "Codons",
-        titlefont_size = 13,
+        title_font_size = 13,
     )
     fig.update(
         layout_title = "Genomewide Positive Selection",
@@ -94,25 +122,34 @@ def create_figure(sites_under_ps, total_sites, gene_lengths):
         layout_title_x = 0.5,
         layout_font=dict(size=10), # size of gene labels
         layout_showlegend = False,
+        layout_hovermode = "closest",
         )
     # fig.show()
     return fig
 
-def save_figure(fig):
-    fig.write_html("fel_genomewide_positive_selection.html")
+def save_figure(fig, method):
+    fig.write_html(method + "_genomewide_positive_selection.html")
+    return method + "_genomewide_positive_selection.html"
 
 
 if __name__ == "__main__":
     arguments = argparse.ArgumentParser(description='Create plot to visualize positively selected sites in the entire genome')
-    arguments.add_argument('-p', '--sites_ps', required=True, help = 'One or more files with sites under positive selection for a gene', type = str, nargs='+')
-    arguments.add_argument('-t', '--sites_total', required=True, help = 'One or more files with the number of total sites of a gene', type = str, nargs='+')
+    arguments.add_argument('-s', '--sites', required=True, help = 'Table of the sites under positive selection of all genes and methods', type = str)
+    arguments.add_argument('-t', '--summary', required=True, help = 'Table of the number of analysed sites per gene and method', type = str)
+    arguments.add_argument('-m', '--method', help = 'Selection analysis method to show (slac, fel, meme, fubar) [default: fel]', default = "fel", type = str)
     arguments.add_argument('-l', '--gene_lengths', required=True, help = 'JSON file containing gene lengths', type = argparse.FileType('r'))
+    arguments.add_argument('--metrics', required=False, help = 'Write the performance metrics of the stage (JSON) here', type = str)
     args = arguments.parse_args()
     
-    paths_ps = convert_nargs_to_list(args.sites_ps)
-    paths_total = convert_nargs_to_list(args.sites_total)
-    
+    metrics = StageMetrics("visualize_ps_genomewide")
     gene_lengths = load_json_file(args.gene_lengths)
-    sites_under_ps, total_sites = preprocessing(paths_ps, paths_total)
+    sites_under_ps, total_sites = preprocessing(args.sites, args.summary, args.method)
     fig = create_figure(sites_under_ps, total_sites, gene_lengths)
-    save_figure(fig)
\ No newline at end of file
+    figure_path = save_figure(fig, args.method)
+
+    if args.metrics:
+        metrics.records_in = sum(len(sites["site"]) for sites in sites_under_ps.values())
+        metrics.records_out = 1
+        metrics.read(args.sites, args.summary, args.gene_lengths.name)
+        metrics.wrote(figure_path)
+        metrics.write(args.metrics)
\ No newline at end of file
@@ -1,5 +1,5 @@
 import argparse
-import math
+import json
 import sys
 import pandas as pd
 import numpy as np
@@ -7,7 +7,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.figure_factory as ff
-from subfuctions import load_json_file
+from results_store import load_site_columns
+from stage_metrics import StageMetrics
 
 
 # CSS color names for classes
@@ -38,52 +39,39 @@ def get_super(x):
     res = x.maketrans(''.join(normal), ''.join(super_s))
     return x.translate(res)
 
-# censor values at 10 such that values >10 are replaced by 10      
-def censoring_at_10(value):
-    if value == np.nan:
-        return np.nan
-    elif value <= 10:
-        return value
-    else:
-        return 10
+# censor values at 10 such that values >10 are replaced by 10 (NaN stays NaN)
+def censoring_at_10(values):
+    return np.minimum(values, 10)
     
 def get_position_map_table(path):
     df_pos_map = pd.read_csv(path, sep="\t")#, dtype={'reference': str})
     df_pos_map.rename(columns={'reference': 'site_reference', 'msa': 'site'}, inplace=True)
     return df_pos_map
+
+# class of every site: invariable (p-value 1), neutral (p-value > 0.1) or purifying/diversifying
+def classify_sites(df):
+    conditions = [df["p-value"] == 1, df["p-value"] > 0.1, df["alpha"] > df["beta"], df["beta"] > df["alpha"]]
+    classes = np.select(conditions, ["Invariable", "Neutral", "Purifying", "Diversifying"], default="unassigned")
+    if (classes == "unassigned").any():
+        print("Class cannot be determined for sites:", df["site"][classes == "unassigned"].tolist())
+    return classes
         
-# preprocess FEL data
-def preprocessing_fel(json_dict, df_pos_map):
-    df = pd.DataFrame(data=json_dict["MLE"]["content"]["0"])
-    df.columns = [x[0] for x in json_dict["MLE"]["headers"]]
-    df.insert(loc=0, column="site", value=df.index+1)
-    df["class"] = "unassigned"
-    for index, row in df.iterrows():
-        if row["p-value"] == 1:
-            df.at[index, "class"] = "Invariable"
-        elif row["p-value"] > 0.1:
-            df.at[index, "class"] = "Neutral"
-        elif row["alpha"] > row["beta"]:
-            df.at[index, "class"] = "Purifying"
-        elif row["beta"] > row["alpha"]:
-            df.at[index, "class"] = "Diversifying"
-        else:
-            print("Class cannot be determined for:\n", row) 
-    df["alpha=beta_base"] = df["alpha=beta"].apply(lambda x: x/-2)
-    df["alpha_censored"] = df["alpha"].apply(lambda x: censoring_at_10(x))
-    df["beta_censored"] = df["beta"].apply(lambda x: censoring_at_10(x))
-    df["dNdS"] = df["beta"] / df["alpha"]
-    df["dNdS"].replace([np.inf, -np.inf], np.nan, inplace=True) # inf occurs when diving x by 0
-    df["dNdS_censored"] = df["dNdS"].apply(lambda x: censoring_at_10(x))
-    df["alpha"] = df["alpha"].apply(lambda x: x*-1)
+# preprocess FEL data, reading only the columns needed from the results store (or the HyPhy JSON)
+def preprocessing_fel(path, df_pos_map):
+    df = pd.DataFrame(load_site_columns(path, ["alpha", "beta", "alpha=beta", "LRT", "p-value", "Total branch length", "p-asmp"]))
+    df["class"] = classify_sites(df)
+    df["alpha=beta_base"] = df["alpha=beta"] / -2
+    df["alpha_censored"] = censoring_at_10(df["alpha"])
+    df["beta_censored"] = censoring_at_10(df["beta"])
+    df["dNdS"] = (df["beta"] / df["alpha"]).replace([np.inf, -np.inf], np.nan) # inf occurs when diving x by 0
+    df["dNdS_censored"] = censoring_at_10(df["dNdS"])
+    df["alpha"] = df["alpha"] * -1
     df_merged = pd.merge(df, df_pos_map, on="site", how="left")
     return df_merged
 
 # preprocess MEME data
-def preprocessing_meme(json_dict):
-    df = pd.DataFrame(data=json_dict["MLE"]["content"]["0"])
-    df.columns = [x[0] for x in json_dict["MLE"]["headers"]]
-    df.insert(loc=0, column="site", value=df.index+1)
+def preprocessing_meme(path):
+    df = pd.DataFrame(load_site_columns(path, ['&alpha;', '&beta;<sup>-</sup>', 'p<sup>-</sup>', '&beta;<sup>+</sup>', 'p<sup>+</sup>', 'LRT', 'p-value', '# branches under selection', 'Total branch length']))
     df.rename(columns = {
         '&alpha;': 'α',
         '&beta;<sup>-</sup>': 'β{}'.format(get_super('-')),
@@ -93,27 +81,15 @@ def preprocessing_meme(json_dict):
         }, inplace = True)
     return df
 
-# initialize desired subplots for MLE figure
-def setup_subplots_mle(df, codons_per_subplot):
-    codons = df.shape[0]
-    number_subplots = math.ceil(codons/codons_per_subplot)
-    fig = make_subplots(rows=number_subplots, cols=1)
-    return fig, codons, number_subplots
-
-# create individual subset
-def create_subset(df, i, codons, number_subplots, codons_per_subplot):
-    if i == number_subplots:
-        start = (i-1)*codons_per_subplot+1
-        end = codons-1
-    else:
-        start = (i-1)*codons_per_subplot
-        end = i*codons_per_subplot
-    df_subset = df[start:end] 
-    return df_subset
-
-# assign colors to class values
-def assign_colors(key):
-    return classes_color_dict[key]
+# show the first codons_per_view codons and a range slider over the whole gene instead
+# of one subplot per block of codons; every series is a single trace
+def add_range_slider(fig, df, site_column, codons_per_view):
+    first = df[site_column].min() if len(df) else 0
+    fig.update_xaxes(
+        range = [first - 0.5, first + codons_per_view - 0.5],
+        rangeslider = dict(visible = True, thickness = 0.08),
+    )
+    return fig
     
 # manually setup legend for each class in the MLE figure
 def setup_mle_legend(fig, classes_color_dict):
@@ -127,47 +103,46 @@ def setup_mle_legend(fig, classes_color_dict):
     return fig
     
 # create figure for MLE visualization of FEL results
-def create_mle_figure(df, fig, codons, number_subplots, codons_per_subplot, site_column):
-    for i in range(1, number_subplots+1):
-        df_subset = create_subset(df, i, codons, number_subplots, codons_per_subplot)
-        # MLE synonymous rate (α) and non-synonymous rate (β)
-        for col in ["alpha", "beta"]:
-            fig.add_trace(
-                go.Bar(
-                    x=df_subset[site_column],
-                    y=df_subset[col],
-                    marker_color=list(map(assign_colors, df_subset["class"])),
-                    showlegend=False,
-                ),
-                row=i, col=1,
-            )
-        # Estimates under the null model (α=β)
+def create_mle_figure(df, codons_per_view, site_column):
+    fig = go.Figure()
+    colors = df["class"].map(classes_color_dict).fillna("black").tolist()
+    # MLE synonymous rate (α) and non-synonymous rate (β)
+    for col in ["alpha", "beta"]:
         fig.add_trace(
             go.Bar(
-                x=df_subset[site_column],
-                y=df_subset["alpha=beta"],
-                base=df_subset["alpha=beta_base"],
-                marker_color='dimgray',
-                name='alpha=beta',
-                width=0.2,
+                x=df[site_column],
+                y=df[col],
+                marker_color=colors,
+                name=col,
                 showlegend=False,
-            ),
-            row=i, col=1,
+            )
+        )
+    # Estimates under the null model (α=β)
+    fig.add_trace(
+        go.Bar(
+            x=df[site_column],
+            y=df["alpha=beta"],
+            base=df["alpha=beta_base"],
+            marker_color='dimgray',
+            name='alpha=beta',
+            width=0.2,
+            showlegend=False,
         )
+    )
     # initialize legend
     fig = setup_mle_legend(fig, classes_color_dict)
+    fig = add_range_slider(fig, df, site_column, codons_per_view)
     # x-axis customizations
     fig.update_xaxes(
-        title = "Codon",
-        titlefont_size = 13,
-        dtick = 1,
+        title_text = "Codon",
+        title_font_size = 13,
         tickfont_size = 9,
         tickangle = 270,
     )
     # y-axis customization
     fig.update_yaxes(
-        title = "Rate estimate",
-        titlefont_size = 13,
+        title_text = "Rate estimate",
+        title_font_size = 13,
         range = [-10,10],
         tickvals = [-10, -5, 0, 5, 10],
         ticktext = ["α=10", "α=5", "0", "β=5", "β=10"],
@@ -182,36 +157,37 @@ def create_mle_figure(df, fig, codons, number_subplots, codons_per_subplot, site
         layout_title_font_size = 24,
         layout_title_x = 0.5,
         layout_autosize = True,
-        layout_height = 250*number_subplots,
+        layout_height = 500,
         )
     return fig
 
 # add subplot for specific substitution rate into rate density figure
 def add_rd_subplot(fig, df, col, name, subplot_position):
-    tmp_fig = ff.create_distplot([df[col].values], [name])
+    values = df[col].dropna().values
+    tmp_fig = ff.create_distplot([values], [name], show_hist=False, show_rug=False)
     fig.add_trace(
         go.Scatter(
-            tmp_fig["data"][1],
+            tmp_fig["data"][0],
             line=dict(color='dimgray'),
             fill='tozeroy',
             ),
         row=subplot_position, col=1,
     )
-    mean = abs(np.mean(df[col.replace("_censored","")])) # unconsored 
+    mean = abs(np.nanmean(df[col.replace("_censored","")])) # unconsored 
     #mean2 = abs(np.mean(df[col])) #censored
     fig.add_shape(go.layout.Shape(type="line", x0=mean, x1=mean, y0=0, y1=1, line=dict(color="firebrick")), row=subplot_position, col=1)
     fig.add_annotation(x=mean+0.1, y=0.92, text=str(round(mean,2)), font=dict(size=9, color="gray"), showarrow=False, row=subplot_position, col=1)
     fig.update_xaxes(
-        title = name,
-        titlefont_size = 13,
+        title_text = name,
+        title_font_size = 13,
         dtick = 0.5,
         tickfont_size = 9,
         row = subplot_position,
         col = 1,
     )
     fig.update_yaxes(
-        title = "Density",
-        titlefont_size = 13,
+        title_text = "Density",
+        title_font_size = 13,
         tickfont_size = 9,
         dtick = 0.2,
     )
@@ -233,29 +209,27 @@ def create_rd_figure(df):
     return fig 
 
 # create histogram figure for one specific variable
-def create_histogram_figure(df, fig, variable, codons, number_subplots, codons_per_subplot):
-    for i in range(1, number_subplots+1):
-        df_subset = create_subset(df, i, codons, number_subplots, codons_per_subplot)
-        fig.add_trace(
-            go.Bar(
-                x=df_subset["site"],
-                y=df_subset[variable],
-                marker_color="cornflowerblue",
-                showlegend=False,
-            ),
-            row=i, col=1,
+def create_histogram_figure(df, variable, codons_per_view):
+    fig = go.Figure()
+    fig.add_trace(
+        go.Bar(
+            x=df["site"],
+            y=df[variable],
+            marker_color="cornflowerblue",
+            showlegend=False,
         )
+    )
+    fig = add_range_slider(fig, df, "site", codons_per_view)
     # x-axis customizations
     fig.update_xaxes(
-        title = "Codon",
-        titlefont_size = 13,
-        dtick = 50,
+        title_text = "Codon",
+        title_font_size = 13,
         tickfont_size = 9,
     )
     # y-axis customization
     fig.update_yaxes(
-        title = variable,
-        titlefont_size = 13,
+        title_text = variable,
+        title_font_size = 13,
         tickfont_size = 9,
     )
     # general layout customizations
@@ -264,7 +238,7 @@ def create_histogram_figure(df, fig, variable, codons, number_subplots, codons_p
         layout_title_font_size = 24,
         layout_title_x = 0.5,
         layout_autosize = True,
-        layout_height = 250*number_subplots,
+        layout_height = 500,
         )
     return fig 
 
@@ -272,56 +246,91 @@ def create_histogram_figure(df, fig, variable, codons, number_subplots, codons_p
 def save_fel_df(df, gene):
     columns_to_keep = ["site", "site_reference", "alpha", "beta", "alpha=beta", "LRT",
                        "p-value", "Total branch length", "p-asmp", "class"]
-    df = df[columns_to_keep]
-    df["alpha"] = df["alpha"].apply(lambda x: x*-1)
+    df = df[columns_to_keep].copy()
+    df["alpha"] = df["alpha"] * -1
     df.to_csv(gene+"_FEL.tsv", sep="\t", index=False)
+    return gene+"_FEL.tsv"
+
+# save figure into an HTML file or, with site_figures, keep it for the data file of the results site;
+# returns the HTML file, if one was written
+def write_figure(fig, gene, name, site_figures=None):
+    if site_figures is None:
+        fig.write_html(gene+"_"+name+".html")
+        return gene+"_"+name+".html"
+    site_figures[name] = fig
+    return None
 
 # create MLE plot and save it into HTML file            
-def save_mle_figure(df, codons_per_subplot, gene):
+def save_mle_figure(df, codons_per_view, gene, site_figures=None):
     # create figure with MSA positions
-    fig, codons, number_subplots = setup_subplots_mle(df, codons_per_subplot)
-    fig = create_mle_figure(df, fig, codons, number_subplots, codons_per_subplot, "site")
-    fig.write_html(gene+"_FEL_mle.html")
+    fig = create_mle_figure(df, codons_per_view, "site")
+    paths = [write_figure(fig, gene, "FEL_mle", site_figures)]
     # create figure only with reference_positions
-    df.drop(df[df["site_reference"] % 1 != 0].index, inplace=True)
-    df = df.astype({'site_reference':'int'})
-    fig, codons, number_subplots = setup_subplots_mle(df, codons_per_subplot)
-    fig = create_mle_figure(df, fig, codons, number_subplots, codons_per_subplot, "site_reference")
-    fig.write_html(gene+"_FEL_mle_with_ref_positions.html")
+    df = df[df["site_reference"] % 1 == 0].astype({'site_reference':'int'})
+    fig = create_mle_figure(df, codons_per_view, "site_reference")
+    paths.append(write_figure(fig, gene, "FEL_mle_with_ref_positions", site_figures))
+    return paths
     
 # create rate density plot and save it into HTML file    
-def save_rd_figure(df, gene):
+def save_rd_figure(df, gene, site_figures=None):
     fig = create_rd_figure(df)
-    fig.write_html(gene+"_FEL_rate_densities.html")
+    return [write_figure(fig, gene, "FEL_rate_densities", site_figures)]
     
 # create a histogram for each desired variable and sve it into HTML file
-def save_meme_figures(df, codons_per_subplot, gene):
+def save_meme_figures(df, codons_per_view, gene, site_figures=None):
     desired_variables = ['α', 'β⁻', 'p⁻', 'β⁺', 'p⁺', 'LRT', 'p-value','# branches under selection', 'Total branch length']
+    paths = []
     for var in desired_variables:
-        fig, codons, number_subplots = setup_subplots_mle(df, codons_per_subplot)
-        fig = create_histogram_figure(df, fig, var, codons, number_subplots, codons_per_subplot)
-        fig.write_html(gene+"_MEME_" + var + ".html")
+        fig = create_histogram_figure(df, var, codons_per_view)
+        paths.append(write_figure(fig, gene, "MEME_" + var, site_figures))
+    return paths
+
+# data file of the gene for the results site (build_results_site.py), a script that adds the
+# figures of the gene to the site; the plotly template is left out, the site has it once
+def save_site_data(site_figures, gene, path):
+    with open(path, "w") as handle:
+        handle.write("resultsSite.addGene(" + json.dumps(gene) + ", [")
+        for i, (name, fig) in enumerate(site_figures.items()):
+            fig.layout.template = None
+            handle.write(("," if i else "") + '{"name":' + json.dumps(name) + ',"figure":' + fig.to_json() + "}")
+        handle.write("]);\n")
      
 
 if __name__ == "__main__":
     arguments = argparse.ArgumentParser(description='Create plot(s) based on selection analysis results')
     arguments.add_argument('-g', '--gene',   help = 'Name of the gene', type = str,)
-    arguments.add_argument('-f', '--fel',   help = 'FEL analysis results in JSON format', type = argparse.FileType('r'))
-    arguments.add_argument('-m', '--meme',   help = 'MEME analysis results in JSON format', type = argparse.FileType('r'))
+    arguments.add_argument('-f', '--fel',   help = 'FEL analysis results as results store (.npz) or in JSON format', type = str)
+    arguments.add_argument('-m', '--meme',   help = 'MEME analysis results as results store (.npz) or in JSON format', type = str)
     arguments.add_argument('-p', '--position_map',   help = 'Mapping of MSA to reference postitions', type = argparse.FileType('r'))
+    arguments.add_argument('-s', '--site_data',   help = 'Write the figures into this data file of the results site instead of one HTML file per figure', type = str)
+    arguments.add_argument('--metrics', help = 'Write the performance metrics of the stage (JSON) here', required = False, type = str)
     args = arguments.parse_args()
+    site_figures = {} if args.site_data else None
+    metrics = StageMetrics("visualize_results", args.gene)
+    sites = 0
+    outputs = []
     
     if args.fel:
-        json_dict = load_json_file(args.fel)
         df_pos_map = get_position_map_table(args.position_map)
-        df = preprocessing_fel(json_dict, df_pos_map)
-        save_fel_df(df, args.gene)
-        codons_per_subplot = 100
-        save_mle_figure(df, codons_per_subplot, args.gene)
-        save_rd_figure(df, args.gene)
+        df = preprocessing_fel(args.fel, df_pos_map)
+        sites += len(df)
+        outputs.append(save_fel_df(df, args.gene))
+        codons_per_view = 100
+        outputs += save_mle_figure(df, codons_per_view, args.gene, site_figures)
+        outputs += save_rd_figure(df, args.gene, site_figures)
         
     if args.meme:
-        json_dict = load_json_file(args.meme)
-        df = preprocessing_meme(json_dict)
-        codons_per_subplot = 500
-        save_meme_figures(df, codons_per_subplot, args.gene)
\ No newline at end of file
+        df = preprocessing_meme(args.meme)
+        sites += len(df)
+        codons_per_view = 500
+        outputs += save_meme_figures(df, codons_per_view, args.gene, site_figures)
+
+    if args.site_data:
+        save_site_data(site_figures, args.gene, args.site_data)
+
+    if args.metrics:
+        metrics.records_in = sites
+        metrics.records_out = len(site_figures) if args.site_data else len([path for path in outputs if path and path.endswith(".html")])
+        metrics.read(args.fel, args.meme, args.position_map.name if args.position_map else None)
+        metrics.wrote(args.site_data, *outputs)
+        metrics.write(args.metrics)
\ No newline at end of file